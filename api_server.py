@@ -0,0 +1,173 @@
+"""
+RAG 查询 HTTP 服务
+
+在单独的进程中加载嵌入模型并执行查询流程（rag_service.RAGService），多个 Streamlit
+进程设置 RAG_API_URL 后作为瘦客户端调用本服务（见 rag_client.py），不再各自加载模型。
+
+接口:
+    GET  /health       服务状态和 Ollama 排队数
+    GET  /ready        预热状态（见 warmup.py），全部就绪前返回 503
+    GET  /api/courses  {"courses": [{"id", "title", "collection"}, ...]}
+    POST /api/search   {"question": ..., "course": null} → {"hits": [...]}
+    POST /api/query    {"question": ..., "kg": true, "course": null} → text/event-stream
+                       事件依次为 stage、courses、hits、token（多次）、answer、kg、done，出错时为 error
+course 为课程ID，省略时按问题选择课程（见 courses.py）。
+
+请求头 X-Request-ID 会作为追踪记录的 request_id，便于与客户端的记录关联。
+
+用法: python api_server.py [--host 0.0.0.0] [--port 8000]
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+from typing import Dict
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from ask_llm import OllamaAPI
+from courses import load_courses
+from rag_service import RAGService
+from tracing import finish_trace, start_trace
+from warmup import WarmUp, service_tasks
+
+load_dotenv()
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+
+def sse_event(event: str, data) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+async def read_body(request: web.Request) -> Dict:
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="请求体必须为JSON")
+    body["question"] = str(body.get("question", "")).strip()
+    if not body["question"]:
+        raise web.HTTPBadRequest(text="缺少 question")
+    body["course"] = body.get("course") or None
+    if body["course"] is not None and body["course"] not in request.app["service"].courses:
+        raise web.HTTPBadRequest(text=f"未知课程: {body['course']}")
+    return body
+
+async def health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok", "ollama_in_flight": OllamaAPI.in_flight()})
+
+async def ready(request: web.Request) -> web.Response:
+    status = request.app["warm_up"].status()
+    return web.json_response(status, status=200 if status["ready"] else 503)
+
+async def courses(request: web.Request) -> web.Response:
+    return web.json_response({"courses": request.app["service"].course_list()})
+
+async def search(request: web.Request) -> web.Response:
+    service: RAGService = request.app["service"]
+    body = await read_body(request)
+    question = body["question"]
+    trace = start_trace(request.headers.get("X-Request-ID"), question_chars=len(question), source="api")
+    try:
+        hits = await service.aretrieve(question, body["course"])
+    except Exception as e:
+        finish_trace(trace, status="error", error=str(e))
+        raise
+    finish_trace(trace)
+    return web.json_response({"hits": hits})
+
+async def query(request: web.Request) -> web.StreamResponse:
+    """以 server-sent events 流式返回查询过程"""
+    service: RAGService = request.app["service"]
+    body = await read_body(request)
+    question, with_kg, course = body["question"], bool(body.get("kg", True)), body["course"]
+    trace = start_trace(request.headers.get("X-Request-ID"), question_chars=len(question), source="api")
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    await response.prepare(request)
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def produce() -> None:
+        # 查询流程是阻塞的同步代码，在线程池中执行，事件通过队列交回事件循环
+        events = service.query_events(question, with_kg, course=course)
+        try:
+            for event in events:
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", {"message": str(e)}))
+        finally:
+            # 客户端断开时关闭生成器，同时关闭与 Ollama 的流式连接
+            events.close()
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    context = contextvars.copy_context()
+    producer = loop.run_in_executor(service.executor, context.run, produce)
+    error = None
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            event, data = item
+            if event == "token":
+                data = {"content": data}
+            elif event == "error":
+                error = data["message"]
+            await response.write(sse_event(event, data))
+        request_id = trace.request_id if trace else None
+        if error is None:
+            await response.write(sse_event("done", {"request_id": request_id}))
+    except ConnectionResetError:
+        cancelled.set()
+        error = "客户端断开连接"
+    except asyncio.CancelledError:
+        cancelled.set()
+        error = "客户端断开连接"
+        raise
+    finally:
+        await asyncio.shield(producer)
+        finish_trace(trace, status="error" if error else "ok", error=error)
+    return response
+
+def create_app(service: RAGService, warm_up: WarmUp) -> web.Application:
+    app = web.Application()
+    app["service"] = service
+    app["warm_up"] = warm_up
+    app.router.add_get("/health", health)
+    app.router.add_get("/ready", ready)
+    app.router.add_get("/api/courses", courses)
+    app.router.add_post("/api/search", search)
+    app.router.add_post("/api/query", query)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG查询HTTP服务")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        filename='rag_system.log',
+        level=logging.INFO,
+        format='%(asctime)s - %(message)s',
+        encoding='utf-8'
+    )
+    from encoder import emb_text, get_embedding_cache
+    service = RAGService(embed=emb_text, embed_cache=get_embedding_cache(), courses=load_courses())
+    # 预热在后台进行，服务立即开始监听，客户端通过 /ready 等待
+    warm_up = WarmUp(service_tasks(service), status_path=None, source="api").start()
+    web.run_app(create_app(service, warm_up), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
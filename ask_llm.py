@@ -1,25 +1,81 @@
 import requests
 import json
+import os
 import streamlit as st
 import re
 import logging
+import threading
 import time
 from typing import List, Dict
 
+from dotenv import load_dotenv
+
+from tracing import incr, set_max
+
+load_dotenv()
+# 模型在最后一次请求后保留在显存中的时间，过期后下一次请求需要重新加载模型
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
 class OllamaAPI:
+    # 本进程内正在等待 Ollama 的请求数（所有会话共享），流式请求读完后才减少
+    _in_flight = 0
+    _in_flight_lock = threading.Lock()
+
     def __init__(self, base_url: str = "http://localhost:11434"):
         self.base_url = base_url
+
+    @classmethod
+    def in_flight(cls) -> int:
+        return cls._in_flight
+
+    @classmethod
+    def _enter(cls) -> int:
+        with cls._in_flight_lock:
+            cls._in_flight += 1
+            return cls._in_flight
+
+    @classmethod
+    def _leave(cls) -> None:
+        with cls._in_flight_lock:
+            cls._in_flight -= 1
+
+    def _iter_stream(self, response):
+        try:
+            yield from response.iter_lines()
+        finally:
+            self._leave()
         
     def chat(self, messages: List[Dict], stream: bool = False) -> Dict:
         url = f"{self.base_url}/api/chat"
         payload = {
             "model": "qwen2.5",
             "messages": messages,
-            "stream": stream
+            "stream": stream,
+            "keep_alive": OLLAMA_KEEP_ALIVE
         }
         
-        response = requests.post(url, json=payload, stream=stream)
-        return response.iter_lines() if stream else response.json()
+        set_max("ollama_in_flight", self._enter())
+        try:
+            response = requests.post(url, json=payload, stream=stream)
+        except Exception:
+            self._leave()
+            raise
+        if not stream:
+            try:
+                return response.json()
+            finally:
+                self._leave()
+        return self._iter_stream(response)
+
+    def preload(self, timeout: float = 300) -> Dict:
+        """不带消息的请求只加载模型，返回的 load_duration 为加载耗时（纳秒）"""
+        response = requests.post(
+            f"{self.base_url}/api/chat",
+            json={"model": "qwen2.5", "messages": [], "keep_alive": OLLAMA_KEEP_ALIVE},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        return response.json()
 
 DEFAULT_MODEL = "qwen2.5"
 
@@ -160,9 +216,11 @@ def extract_kg_from_text(client: OllamaAPI, text: str) -> dict:
         except Exception as e:
             logging.error(f"知识图谱提取尝试 {attempt + 1}/{max_retries} 失败: {str(e)}")
             if attempt < max_retries - 1:
+                incr("kg_retries")
                 time.sleep(retry_delay)
                 continue
             else:
+                incr("kg_failures")
                 st.error(f"知识图谱提取失败: {str(e)}")
                 return {"entities": [], "relations": []}
 
@@ -0,0 +1,118 @@
+"""
+流式导入基准测试
+
+把 wz.md 复制为 N 份文档（第一份保持原样，其余打乱行的顺序，互不重复）作为文档目录，向量化使用按文本
+哈希生成的随机单位向量（不加载嵌入模型），插入的数据直接丢弃（Milvus Lite 在本进程内
+运行，其内存会计入结果），只测量导入流程本身。分别测量原先的一次性载入（全部分块和向量
+在内存中，一次插入）和流式导入（insert.ingest）的 Python 内存峰值（tracemalloc）和耗时。流式导入的峰值应与文档规模基本无关（去重时随保留的文档块数
+缓慢增长，见 dedup.py）。
+
+用法: python benchmarks/bench_ingest.py [--scales 1 4 16]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+
+import insert
+from compact_vectors import normalize
+from insert import get_text, ingest, list_documents
+from kg_build import iter_lines
+from milvus_utils import create_collection
+
+DIM = 1024
+COLLECTION_NAME = "bench_ingest"
+
+class NullClient:
+    """只记录插入数量的 Milvus 客户端"""
+
+    def __init__(self):
+        self.collections = set()
+
+    def has_collection(self, collection_name):
+        return collection_name in self.collections
+
+    def drop_collection(self, collection_name):
+        self.collections.discard(collection_name)
+
+    def create_collection(self, collection_name, **kwargs):
+        self.collections.add(collection_name)
+
+    def delete(self, collection_name, filter):
+        return {"delete_count": 0}
+
+    def insert(self, collection_name, data):
+        return {"insert_count": len(data)}
+
+def embed_texts(texts):
+    return [
+        normalize(np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(DIM))[0].tolist()
+        for text in texts
+    ]
+
+def make_documents(directory, scale):
+    lines = list(iter_lines(os.path.join(ROOT_DIR, "wz.md")))
+    rng = np.random.default_rng(0)
+    for copy in range(scale):
+        order = rng.permutation(len(lines)) if copy else range(len(lines))
+        with open(os.path.join(directory, f"doc{copy:04d}.md"), "w", encoding="utf-8") as f:
+            f.writelines(f"{lines[i]}\n" for i in order)
+
+def ingest_at_once(client, sources):
+    """原先的方式：全部分块、向量化后一次插入"""
+    if client.has_collection(COLLECTION_NAME):
+        client.drop_collection(COLLECTION_NAME)
+    create_collection(milvus_client=client, collection_name=COLLECTION_NAME, dim=DIM)
+    chunks = [chunk for path in sources for chunk in get_text(path)]
+    data = [
+        {"vector": embed_texts([chunk])[0], "text": chunk, "chunk": i}
+        for i, chunk in enumerate(chunks)
+    ]
+    return client.insert(collection_name=COLLECTION_NAME, data=data)["insert_count"]
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, peak, elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    # 基准测试不写入项目的质心和去重报告
+    insert.save_centroid = lambda *args, **kwargs: None
+    insert.write_report = lambda collection_name, report: "（未保存）"
+
+    print(f"{'倍数':>6} {'文档块':>8} {'方式':<12} {'内存峰值(MB)':>12} {'耗时(s)':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client = NullClient()
+        for scale in args.scales:
+            docs_dir = os.path.join(tmp_dir, f"docs-{scale}")
+            os.makedirs(docs_dir)
+            make_documents(docs_dir, scale)
+            sources = list_documents(docs_dir)
+            methods = [
+                ("一次性载入", lambda: ingest_at_once(client, sources)),
+                ("流式", lambda: ingest(client, COLLECTION_NAME, sources, embed_texts, DIM, restart=True)),
+                ("流式不去重", lambda: ingest(client, COLLECTION_NAME, sources, embed_texts, DIM,
+                                          dedup=False, restart=True)),
+            ]
+            for name, fn in methods:
+                count, peak, elapsed = measure(fn)
+                print(f"{scale:>6} {count:>8} {name:<12} {peak / 2**20:>12.1f} {elapsed:>10.2f}")
+
+if __name__ == "__main__":
+    main()
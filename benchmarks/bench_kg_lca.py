@@ -0,0 +1,115 @@
+"""
+知识图谱路径高亮基准测试
+
+将 pages/kg_data.json 复制扩展到 10k+ 节点，对比原先逐对深度优先搜索的实现
+与 HierarchyIndex（父指针 + 倍增LCA）的耗时。
+
+用法: python benchmarks/bench_kg_lca.py [--copies 25] [--selected 2 5 10 20]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from kg_index import HierarchyIndex
+
+def scale_graph(kg_data, copies):
+    """复制课程根节点以下的所有节点，得到更大的层级图"""
+    root = next(e["id"] for e in kg_data["entities"] if e["type"] == "课程")
+    entities = [e for e in kg_data["entities"] if e["id"] == root]
+    relations = []
+    for copy in range(copies):
+        rename = lambda node: node if node == root else f"{node}#{copy}"
+        entities.extend(
+            {**e, "id": rename(e["id"])} for e in kg_data["entities"] if e["id"] != root
+        )
+        relations.extend(
+            {**r, "from": rename(r["from"]), "to": rename(r["to"])} for r in kg_data["relations"]
+        )
+    return {"entities": entities, "relations": relations}
+
+def legacy_find_path(graph, start, end, path=None):
+    if path is None:
+        path = []
+    path = path + [start]
+    if start == end:
+        return path
+    if start not in graph:
+        return None
+    for node in graph[start]:
+        if node not in path:
+            newpath = legacy_find_path(graph, node, end, path)
+            if newpath:
+                return newpath
+    return None
+
+def legacy_highlight(kg_data, edges, selected):
+    """原 visualize_knowledge_graph 中的高亮逻辑"""
+    graph = {}
+    for relation in kg_data["relations"]:
+        graph.setdefault(relation["from"], []).append(relation["to"])
+    root_node = next(e["id"] for e in kg_data["entities"] if e["type"] == "课程")
+
+    complete_path = []
+    for i in range(len(selected)):
+        for j in range(i + 1, len(selected)):
+            path1 = legacy_find_path(graph, root_node, selected[i])
+            path2 = legacy_find_path(graph, root_node, selected[j])
+            if path1 and path2:
+                common_ancestor = next((n1 for n1 in path1 if n1 in path2), None)
+                if common_ancestor:
+                    complete_path.extend(path1[path1.index(common_ancestor):])
+                    complete_path.extend(path2[path2.index(common_ancestor):])
+
+    highlighted = 0
+    for i in range(len(complete_path) - 1):
+        for edge in edges:
+            if (edge["from"] == complete_path[i] and edge["to"] == complete_path[i + 1]) or \
+               (edge["from"] == complete_path[i + 1] and edge["to"] == complete_path[i]):
+                highlighted += 1
+    return highlighted
+
+def indexed_highlight(index, edges, selected):
+    """新实现：一次遍历边列表，按集合判断是否高亮"""
+    targets = index.highlight_edges(selected)
+    return sum(1 for edge in edges if (edge["from"], edge["to"]) in targets)
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--copies", type=int, default=25)
+    parser.add_argument("--selected", type=int, nargs="+", default=[2, 5, 10, 20])
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT_DIR, "pages", "kg_data.json"), "r", encoding="utf-8") as f:
+        kg_data = scale_graph(json.load(f), args.copies)
+    edges = [{"from": r["from"], "to": r["to"]} for r in kg_data["relations"]]
+    print(f"节点数: {len(kg_data['entities'])}, 边数: {len(edges)}")
+
+    build_ms = timed(lambda: HierarchyIndex(kg_data))
+    index = HierarchyIndex(kg_data)
+    print(f"索引构建: {build_ms:.2f} ms（每个会话一次）")
+
+    rng = random.Random(0)
+    topics = [e["id"] for e in kg_data["entities"] if e["type"] == "知识点"]
+    print(f"{'选中数':>6} {'原实现(ms)':>12} {'索引(ms)':>10} {'加速比':>8}")
+    for k in args.selected:
+        selected = rng.sample(topics, k)
+        legacy_ms = timed(lambda: legacy_highlight(kg_data, edges, selected), repeat=1)
+        indexed_ms = timed(lambda: indexed_highlight(index, edges, selected))
+        print(f"{k:>6} {legacy_ms:>12.2f} {indexed_ms:>10.2f} {legacy_ms / indexed_ms:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+检索结果渲染基准测试
+
+从 wz.md 中取图片最多的 10 个文档块（约 MAX_CHUNK_SIZE 字符）作为一页检索结果，对比：
+- 原实现：每次渲染都用未编译的正则 re.split，再交替输出文本和图片
+- 首次解析后缓存：按文本缓存切分好的渲染片段，渲染时直接遍历
+
+文本通过 Streamlit 的 st.markdown 在裸模式下生成元素（包含消息序列化），
+图片只计数，不计入耗时（图片本身的开销见 image_cache.py）。
+
+用法: python benchmarks/bench_render.py [--rounds 200]
+"""
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import streamlit as st
+
+import render
+from render import cached_segments
+
+CHUNK_SIZE = 2000
+PAGE_SIZE = 10
+
+def load_page(content_path):
+    with open(content_path, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    chunks, current, length = [], [], 0
+    for line in lines:
+        if length + len(line) > CHUNK_SIZE and current:
+            chunks.append("\n".join(current))
+            current, length = [], 0
+        current.append(line)
+        length += len(line)
+    if current:
+        chunks.append("\n".join(current))
+    chunks.sort(key=lambda chunk: chunk.count("!["), reverse=True)
+    return chunks[:PAGE_SIZE]
+
+def old_render(text, images):
+    pattern = r'!\[(.*?)\]\((images/.*?)\)'
+    parts = re.split(pattern, text)
+    for i in range(0, len(parts), 3):
+        if parts[i]:
+            st.write(parts[i])
+        if i + 2 < len(parts):
+            images.append(parts[i + 2])
+
+def new_render(segments, images):
+    for segment in segments:
+        if segment["type"] == "text":
+            st.markdown(segment["text"])
+        else:
+            images.append(segment["path"])
+
+def measure(fn, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    page = load_page(os.path.join(ROOT_DIR, "wz.md"))
+    images = []
+
+    def run_old():
+        for chunk in page:
+            old_render(chunk, images)
+
+    def run_cached():
+        for chunk in page:
+            new_render(cached_segments(chunk), images)
+
+    def parse_old():
+        for chunk in page:
+            re.split(r'!\[(.*?)\]\((images/.*?)\)', chunk)
+
+    def parse_cached():
+        for chunk in page:
+            cached_segments(chunk)
+
+    print(f"一页 {len(page)} 个文档块，{sum(len(c) for c in page)} 字符，"
+          f"{sum(chunk.count('![') for chunk in page)} 张图片")
+    print(f"{'':>14} {'p50(ms)':>10} {'p95(ms)':>10}")
+    for name, fn in (
+        ("解析-原实现", parse_old),
+        ("解析-缓存", parse_cached),
+        ("渲染-原实现", run_old),
+        ("渲染-缓存", run_cached),
+    ):
+        timings = sorted(measure(fn, args.rounds))
+        print(f"{name:>14} {statistics.median(timings):>10.3f} "
+              f"{timings[int(len(timings) * 0.95)]:>10.3f}")
+    print(f"片段缓存: {render.cached_segments.cache_info()}")
+
+if __name__ == "__main__":
+    main()
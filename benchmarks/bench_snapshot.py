@@ -0,0 +1,74 @@
+"""
+快照冷启动基准测试
+
+用 wz.md 按 insert.py 的方式分块（向量为随机单位向量，加载耗时与向量取值无关），
+分别以原语料和 100 倍合成语料生成快照，测量写入、读取（解压和解析）以及导入 Milvus 的耗时。
+导入需要 --uri，可以是 Milvus 服务地址或 Milvus Lite 本地文件。
+
+用法: python benchmarks/bench_snapshot.py [--scales 1 100] [--uri ./bench.db]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+
+from insert import get_text
+from milvus_utils import get_milvus_client
+from snapshot import import_snapshot, read_snapshot, write_snapshot
+
+DIM = 1024
+
+def make_corpus(chunks, scale, rng):
+    """按倍数复制文档块，每份加上编号使文本互不相同"""
+    records = []
+    for copy in range(scale):
+        for chunk in chunks:
+            text = chunk if copy == 0 else f"（副本{copy}）{chunk}"
+            records.append({"text": text})
+    vectors = rng.standard_normal((len(records), DIM)).astype(np.float32)
+    return records, vectors
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 100])
+    parser.add_argument("--uri", help="Milvus 地址或 Milvus Lite 本地文件，指定时测量导入耗时")
+    args = parser.parse_args()
+
+    chunks = get_text(os.path.join(ROOT_DIR, "wz.md"))
+    rng = np.random.default_rng(0)
+    client = get_milvus_client(uri=args.uri) if args.uri else None
+
+    print(f"{'倍数':>6} {'文档块':>8} {'快照(MB)':>10} {'写入(s)':>10} {'读取(s)':>10} {'导入(s)':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in args.scales:
+            records, vectors = make_corpus(chunks, scale, rng)
+            path = os.path.join(tmp_dir, f"bench-{scale}.zip")
+
+            start = time.perf_counter()
+            write_snapshot(path, records, vectors, "bench_snapshot")
+            write_s = time.perf_counter() - start
+            count = len(records)
+            del records, vectors
+
+            start = time.perf_counter()
+            read_snapshot(path)
+            read_s = time.perf_counter() - start
+
+            import_s = float("nan")
+            if client is not None:
+                start = time.perf_counter()
+                import_snapshot(client, path, collection_name="bench_snapshot", vector_mode="float")
+                import_s = time.perf_counter() - start
+                client.drop_collection("bench_snapshot")
+
+            print(f"{scale:>6} {count:>8} {os.path.getsize(path) / 2**20:>10.1f} "
+                  f"{write_s:>10.2f} {read_s:>10.2f} {import_s:>10.2f}")
+
+if __name__ == "__main__":
+    main()
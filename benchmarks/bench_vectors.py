@@ -0,0 +1,176 @@
+"""
+紧凑向量存储基准测试
+
+对比三种 VECTOR_MODE（见 compact_vectors.py）的内存占用、检索耗时和 recall@3，
+以全精度向量精确检索的前 3 条为标准答案：
+- float：原有 FLOAT_VECTOR
+- float16：FLOAT16_VECTOR，可选全精度重排
+- binary：按符号量化后用汉明距离取 RERANK_CANDIDATES 个候选，再全精度重排
+
+默认在本进程内用 numpy 精确扫描模拟各种编码（量化带来的召回损失与索引无关），
+指定 --uri 时另在 Milvus 中建集合，测量实际索引（HNSW / BIN_IVF_FLAT）的检索耗时和召回。
+向量默认为带公共偏移的聚类合成数据，也可用 --vectors 指定真实嵌入（.npy，如
+insert.py 在紧凑模式下保存的全精度向量）。
+
+用法: python benchmarks/bench_vectors.py [--size 20000] [--vectors path.npy] [--uri http://localhost:19530]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+
+from compact_vectors import RERANK_CANDIDATES, FullVectorStore, encode_vector, normalize
+from milvus_utils import create_collection, get_milvus_client, get_search_results
+
+TOP_K = 3
+HNSW_M = 16
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def synthesize(size, dim, rng):
+    """聚类合成向量；句向量通常有公共方向，加入公共偏移使符号量化不至于过于乐观"""
+    shared = rng.standard_normal(dim)
+    centers = rng.standard_normal((max(size // 100, 1), dim))
+    labels = rng.integers(len(centers), size=size)
+    vectors = 0.6 * shared + centers[labels] + 0.8 * rng.standard_normal((size, dim))
+    return normalize(vectors)
+
+def make_queries(vectors, count, rng):
+    """在已有向量附近取查询，模拟与某些文档块相关的问题"""
+    base = vectors[rng.integers(len(vectors), size=count)]
+    return normalize(base + 0.05 * rng.standard_normal(base.shape))
+
+def exact_top_k(vectors, query, k):
+    similarities = vectors @ query
+    top = np.argpartition(-similarities, k)[:k]
+    return top[np.argsort(-similarities[top])]
+
+def hamming_top_k(codes, query_code, k):
+    distances = POPCOUNT[np.bitwise_xor(codes, query_code)].sum(axis=1, dtype=np.int32)
+    top = np.argpartition(distances, k)[:k]
+    return top[np.argsort(distances[top])]
+
+def recall(found, truth):
+    return len(set(found) & set(truth)) / len(truth)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def memory_estimate(size, dim):
+    """索引常驻内存估算（字节）：向量本身 + HNSW 第0层 2M 个邻居 / IVF 倒排中的 id"""
+    graph = size * HNSW_M * 2 * 4
+    return {
+        "float": size * dim * 4 + graph,
+        "float16": size * dim * 2 + graph,
+        "binary": size * dim // 8 + size * 8,
+    }
+
+def run_offline(vectors, queries, truths, full_vectors):
+    """numpy 精确扫描：各编码只影响召回，耗时为单线程扫描加重排的参考值"""
+    # numpy 的 float16 矩阵乘法没有 BLAS 加速，与 Milvus 一样转回 float32 计算，只保留精度损失
+    halves = vectors.astype(np.float16).astype(np.float32)
+    to_half = lambda q: q.astype(np.float16).astype(np.float32)
+    codes = np.packbits(vectors > 0, axis=1)
+    results = {}
+
+    def measure(name, search):
+        latencies, recalls = [], []
+        for query, truth in zip(queries, truths):
+            start = time.perf_counter()
+            found = search(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls.append(recall(found, truth))
+        results[name] = (latencies, recalls)
+
+    def rerank(query, candidates):
+        hits = [{"id": int(row), "entity": {"row": int(row)}} for row in candidates]
+        return [hit["id"] for hit in full_vectors.rerank(query, hits, TOP_K)]
+
+    measure("float", lambda q: exact_top_k(vectors, q, TOP_K))
+    measure("float16", lambda q: exact_top_k(halves, to_half(q), TOP_K))
+    measure("float16+重排", lambda q: rerank(q, exact_top_k(halves, to_half(q), RERANK_CANDIDATES)))
+    measure("binary", lambda q: hamming_top_k(codes, np.packbits(q > 0), TOP_K))
+    measure("binary+重排", lambda q: rerank(q, hamming_top_k(codes, np.packbits(q > 0), RERANK_CANDIDATES)))
+    return results
+
+def run_milvus(uri, vectors, queries, truths, full_vectors):
+    """在 Milvus 中为每种模式建临时集合，通过 get_search_results 检索"""
+    client = get_milvus_client(uri=uri)
+    results = {}
+    for mode in ("float", "float16", "binary"):
+        collection_name = f"bench_vectors_{mode}"
+        try:
+            create_collection(client, collection_name, vectors.shape[1], vector_mode=mode)
+        except Exception as e:
+            print(f"{mode}: 当前 Milvus 不支持（{e}）")
+            continue
+        try:
+            for start in range(0, len(vectors), 1000):
+                batch = []
+                for row in range(start, min(start + 1000, len(vectors))):
+                    vector = vectors[row].tolist() if mode == "float" else encode_vector(vectors[row], mode)
+                    batch.append({"vector": vector, "row": row})
+                client.insert(collection_name=collection_name, data=batch)
+            client.load_collection(collection_name)
+            variants = [(mode, None)] if mode == "float" else [(mode, None), (f"{mode}+重排", full_vectors)]
+            for name, rerank_store in variants:
+                latencies, recalls = [], []
+                for query, truth in zip(queries, truths):
+                    start = time.perf_counter()
+                    hits = get_search_results(client, collection_name, query.tolist(), ["row"],
+                                              vector_mode=mode, full_vectors=rerank_store)[0]
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    recalls.append(recall([hit["entity"]["row"] for hit in hits], truth))
+                results[name] = (latencies, recalls)
+        finally:
+            client.drop_collection(collection_name)
+    return results
+
+def print_results(title, results, memory):
+    print(f"\n{title}")
+    print(f"{'':>14} {'内存(MB)':>10} {'p50(ms)':>10} {'p95(ms)':>10} {'p99(ms)':>10} {'recall@3':>10}")
+    for name, (latencies, recalls) in results.items():
+        mode = name.split("+")[0]
+        print(f"{name:>14} {memory[mode] / 2**20:>10.1f} {statistics.median(latencies):>10.3f} "
+              f"{percentile(latencies, 0.95):>10.3f} {percentile(latencies, 0.99):>10.3f} "
+              f"{statistics.mean(recalls):>10.3f}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--vectors", help="真实嵌入向量 .npy，指定时忽略 --size/--dim")
+    parser.add_argument("--uri", help="Milvus 地址，指定时测量实际索引")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.vectors:
+        vectors = normalize(np.load(args.vectors))
+    else:
+        vectors = synthesize(args.size, args.dim, rng)
+    queries = make_queries(vectors, args.queries, rng)
+    truths = [exact_top_k(vectors, query, TOP_K) for query in queries]
+    size, dim = vectors.shape
+    memory = memory_estimate(size, dim)
+    print(f"向量数量: {size}，维度: {dim}，查询: {len(queries)}，重排候选: {RERANK_CANDIDATES}")
+    print(f"全精度向量（磁盘，按需映射）: {size * dim * 4 / 2**20:.1f} MB")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        full_vectors = FullVectorStore(os.path.join(tmp_dir, "vectors.npy"))
+        FullVectorStore.write(full_vectors.path, vectors)
+        print_results("本进程精确扫描（内存为对应 Milvus 索引的估算值）",
+                      run_offline(vectors, queries, truths, full_vectors), memory)
+        if args.uri:
+            print_results(f"Milvus 索引（{args.uri}）",
+                          run_milvus(args.uri, vectors, queries, truths, full_vectors), memory)
+
+if __name__ == "__main__":
+    main()
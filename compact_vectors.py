@@ -0,0 +1,160 @@
+"""
+紧凑向量存储
+
+VECTOR_MODE 决定向量在 Milvus 中的存储方式（1024 维 bge-large-zh-v1.5）:
+    float    FLOAT_VECTOR + HNSW/COSINE，每个向量 4 KB（默认，原有方式）
+    float16  FLOAT16_VECTOR + HNSW/COSINE，每个向量 2 KB，需要 Milvus 2.4 及以上
+    binary   按符号量化的 BINARY_VECTOR + BIN_IVF_FLAT/HAMMING，每个向量 128 B
+
+紧凑模式下检索先按量化向量取较宽的候选集（RERANK_CANDIDATES），再用磁盘上的全精度
+向量精确计算余弦相似度重排。全精度向量按入库顺序保存为 .npy（行号存入 row 字段），
+以内存映射方式读取，只有被检索到的行才会读入内存。入库时按批追加写入（FullVectorWriter），
+不在内存中累积全部向量。
+"""
+import os
+import shutil
+from typing import Dict, List, Optional
+
+import numpy as np
+
+VECTOR_MODES = ("float", "float16", "binary")
+FULL_VECTORS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "vectors")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "100"))
+
+def vector_bytes(dim: int, vector_mode: str) -> int:
+    """每个向量在 Milvus 中占用的字节数（不含索引结构）"""
+    return {"float": dim * 4, "float16": dim * 2, "binary": dim // 8}[vector_mode]
+
+def full_vectors_path(collection_name: str) -> str:
+    return os.path.join(FULL_VECTORS_DIR, f"{collection_name}.npy")
+
+def normalize(vectors) -> np.ndarray:
+    """转为 float32 并按行归一化，内积即余弦相似度"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+def hamming_similarity(distance: float, dim: int) -> float:
+    """按符号量化向量的汉明距离估计余弦相似度：两向量的夹角约为 π × 距离 / 维数"""
+    return float(np.cos(np.pi * distance / dim))
+
+def to_binary(vector) -> bytes:
+    """按符号量化，每维1位"""
+    return np.packbits(np.asarray(vector) > 0).tobytes()
+
+def encode_vector(vector, vector_mode: str):
+    """转为 Milvus 对应向量字段接受的格式"""
+    if vector_mode == "float16":
+        return np.asarray(vector, dtype=np.float16)
+    if vector_mode == "binary":
+        return to_binary(vector)
+    return vector
+
+class FullVectorStore:
+    """磁盘上的全精度向量，用于对紧凑向量的检索结果重排"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._vectors = None
+        self._mtime = None
+
+    @staticmethod
+    def write(path: str, vectors) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, normalize(vectors))
+        os.replace(tmp_path, path)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def vectors(self) -> np.ndarray:
+        # 重新入库后文件被替换，按修改时间重新映射
+        mtime = os.path.getmtime(self.path)
+        if self._vectors is None or mtime != self._mtime:
+            self._vectors = np.load(self.path, mmap_mode="r")
+            self._mtime = mtime
+        return self._vectors
+
+    def rerank(self, query_vector, hits: List[Dict], limit: int) -> List[Dict]:
+        """
+        按全精度余弦相似度重排候选结果
+
+        Args:
+            hits: Milvus 检索结果，entity 中需包含 row
+        Returns:
+            与 Milvus 检索结果格式相同的前 limit 条，distance 为余弦相似度
+        """
+        if not hits:
+            return []
+        rows = np.array([hit["entity"]["row"] for hit in hits])
+        # 内存映射按行号升序读取更快
+        order = np.argsort(rows)
+        candidates = np.empty((len(rows), self.vectors().shape[1]), dtype=np.float32)
+        candidates[order] = self.vectors()[rows[order]]
+        similarities = candidates @ normalize(query_vector)[0]
+        top = np.argsort(-similarities)[:limit]
+        return [
+            {
+                "id": hits[i]["id"],
+                "distance": float(similarities[i]),
+                "entity": hits[i]["entity"],
+            }
+            for i in top
+        ]
+
+class FullVectorWriter:
+    """
+    按批追加全精度向量到 <path>.part，finish 时加上 .npy 文件头替换 path
+
+    中断后以检查点记录的行数 rows 重新打开，多写的行被截掉，之后继续追加。
+    """
+
+    def __init__(self, path: str, dim: int, rows: int = 0):
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.dim = dim
+        self.rows = rows
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if rows:
+            row_bytes = dim * np.dtype(np.float32).itemsize
+            if not os.path.exists(self.part_path) or os.path.getsize(self.part_path) < rows * row_bytes:
+                raise ValueError(f"{self.part_path} 不足 {rows} 行，无法继续写入，请重新导入")
+            self._file = open(self.part_path, "r+b")
+            self._file.truncate(rows * row_bytes)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(self.part_path, "wb")
+
+    def append(self, vectors) -> int:
+        """追加一批向量并写入磁盘，返回第一行的行号"""
+        first = self.rows
+        vectors = normalize(vectors)
+        self._file.write(vectors.tobytes())
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.rows += len(vectors)
+        return first
+
+    def finish(self) -> None:
+        self._file.close()
+        tmp_path = f"{self.path}.tmp"
+        header = {"descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                  "fortran_order": False, "shape": (self.rows, self.dim)}
+        with open(tmp_path, "wb") as f, open(self.part_path, "rb") as part:
+            np.lib.format.write_array_header_1_0(f, header)
+            shutil.copyfileobj(part, f)
+        os.replace(tmp_path, self.path)
+        os.remove(self.part_path)
+
+    def close(self) -> None:
+        self._file.close()
+
+def open_full_vectors(collection_name: str, vector_mode: str) -> Optional[FullVectorStore]:
+    """紧凑模式下返回该集合的全精度向量，文件不存在时返回 None（不重排）"""
+    if vector_mode == "float":
+        return None
+    store = FullVectorStore(full_vectors_path(collection_name))
+    return store if store.exists() else None
@@ -0,0 +1,114 @@
+"""
+正文知识点偏移索引
+
+预先扫描 wz.md，记录每个 "#### 知识点" 标题对应正文在文件中的字节区间，
+索引以源文件哈希为键保存在 .cache/ 下。查询时对内存映射的文件切片，
+无需把整篇文档读入内存，也无需对全文做正则搜索。
+
+用法: python content_index.py [--content wz.md]
+"""
+import argparse
+import json
+import mmap
+import os
+from typing import Dict, Optional, Tuple
+
+from kg_build import DEFAULT_CONTENT_PATH, PROJECT_DIR, source_fingerprint
+from kg_layout import write_json_atomic
+
+CACHE_DIR = os.path.join(PROJECT_DIR, ".cache")
+HEADING = b"#### "
+
+def index_path_for(content_path: str) -> str:
+    # 按相对项目目录的路径命名，各课程的 content.md 不会共用同一个索引文件
+    relative = os.path.relpath(os.path.abspath(content_path), PROJECT_DIR)
+    name = os.path.splitext(relative)[0].replace(os.sep, "_").replace("..", "_")
+    return os.path.join(CACHE_DIR, f"{name}.offsets.json")
+
+def scan_offsets(content_path: str) -> Dict[str, Tuple[int, int]]:
+    """
+    逐行扫描正文，得到每个知识点正文的字节区间
+
+    区间从标题行之后开始，到下一个 #### 标题之前结束，与原先
+    rf"#### {label}(.*?)(?=\\n#### |\\Z)" 的匹配范围一致；同名知识点取第一次出现的位置。
+    """
+    spans: Dict[str, Tuple[int, int]] = {}
+    current: Optional[str] = None
+    start = 0
+    offset = 0
+    with open(content_path, "rb") as f:
+        for line in f:
+            if line.startswith(HEADING):
+                if current is not None and current not in spans:
+                    spans[current] = (start, offset)
+                current = line[len(HEADING):].decode("utf-8").strip()
+                start = offset + len(line)
+            offset += len(line)
+    if current is not None and current not in spans:
+        spans[current] = (start, offset)
+    return spans
+
+def load_or_build_index(content_path: str = DEFAULT_CONTENT_PATH) -> Dict[str, Tuple[int, int]]:
+    """读取已保存的索引，源文件内容变化时重新扫描"""
+    index_path = index_path_for(content_path)
+    stat = os.stat(content_path)
+    saved = None
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = None
+
+    if saved:
+        source = saved["source"]
+        if source["mtime"] == stat.st_mtime and source["size"] == stat.st_size:
+            return {label: tuple(span) for label, span in saved["spans"].items()}
+
+    fingerprint = source_fingerprint(content_path)
+    if saved and saved["source"]["sha256"] == fingerprint["sha256"]:
+        spans = {label: tuple(span) for label, span in saved["spans"].items()}
+    else:
+        spans = scan_offsets(content_path)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    write_json_atomic(index_path, {"source": fingerprint, "spans": spans})
+    return spans
+
+class ContentIndex:
+    """基于内存映射文件的知识点正文查询，单次查询为一次字典查找加一次切片"""
+
+    def __init__(self, content_path: str = DEFAULT_CONTENT_PATH):
+        self.content_path = content_path
+        self.spans = load_or_build_index(content_path)
+        self._file = open(content_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._stat = os.fstat(self._file.fileno())
+
+    def __contains__(self, label: str) -> bool:
+        return label in self.spans
+
+    def get(self, label: str) -> Optional[str]:
+        span = self.spans.get(label)
+        if span is None:
+            return None
+        return self._mmap[span[0]:span[1]].decode("utf-8").strip()
+
+    def is_stale(self) -> bool:
+        stat = os.stat(self.content_path)
+        return stat.st_mtime != self._stat.st_mtime or stat.st_size != self._stat.st_size
+
+    def close(self) -> None:
+        self._mmap.close()
+        self._file.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="构建正文知识点偏移索引")
+    parser.add_argument("--content", default=DEFAULT_CONTENT_PATH, help="课程正文markdown")
+    args = parser.parse_args()
+
+    spans = load_or_build_index(args.content)
+    print(f"知识点数量: {len(spans)}，索引文件: {index_path_for(args.content)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+课程知识图谱的共享数据
+
+实体索引、层级索引和发送到前端的图视图与会话无关，按课程的 kg_data.json 路径和修改时间缓存，
+所有会话共享，只构建一次。启动预热（warmup.py）时提前构建初始视图，首次打开
+知识图谱页面无需等待。
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import streamlit as st
+
+from courses import MAX_CACHED_COURSES
+from kg_component import GraphView
+from kg_index import HierarchyIndex
+from kg_layout import DEFAULT_KG_PATH, has_layout
+
+COLORS = {
+    "课程": "#9467bd",
+    "部分": "#ff7f0e",
+    "章节": "#1f77b4",
+    "小节": "#2ca02c",
+    "知识点": "#d62728"
+}
+
+DEFAULT_EDGE_STYLE = {
+    "color": "#cccccc",
+    "highlight": "#ff0000",
+    "width": 1,
+    "physics": True,
+    "length": 200
+}
+
+HIGHLIGHTED_EDGE_STYLE = {
+    "color": "#ff0000",
+    "highlight": "#ff0000",
+    "width": 3
+}
+
+# 分层显示时单次渲染的节点上限
+MAX_RENDERED_NODES = int(os.getenv("KG_MAX_RENDERED_NODES", "500"))
+# 缓存的分层视图数量（不同的展开/选中组合）
+LOD_VIEW_CACHE_SIZE = 64
+
+def build_graph_view(
+    entities: List[Dict],
+    relations: List[Dict],
+    fixed_layout: bool,
+    collapsed: Optional[Dict[str, int]] = None
+) -> GraphView:
+    """
+    构建发送到前端的图数据
+
+    Args:
+        entities: 需要渲染的实体
+        relations: 需要渲染的关系，两端都应在 entities 中
+        fixed_layout: 是否使用离线布局的固定坐标并关闭物理模拟
+        collapsed: 分层显示时尚未展开的节点及其隐藏的子节点数
+    """
+    collapsed = collapsed or {}
+    nodes = []
+    for entity in entities:
+        node = {
+            "id": entity["id"],
+            "label": entity["label"],
+            "title": f"类型: {entity['type']}",
+            "font": {"size": 14},
+            "color": COLORS[entity["type"]],
+            "margin": 20
+        }
+        if entity["id"] in collapsed:
+            node["label"] = f"{entity['label']} [+{collapsed[entity['id']]}]"
+            node["title"] += "（点击展开）"
+        if fixed_layout:
+            node.update(x=entity["x"], y=entity["y"], physics=False)
+        nodes.append(node)
+    edges = [
+        {
+            "from": relation["from"],
+            "to": relation["to"],
+            "label": relation["label"],
+            "arrows": "to",
+            "font": {"size": 12},
+            "color": {"color": "#cccccc", "highlight": "#ff0000"}
+        }
+        for relation in relations
+    ]
+    options = {
+        "physics": {
+            "enabled": not fixed_layout,
+            "stabilization": {
+                "enabled": True,
+                "iterations": 75,
+                "updateInterval": 10
+            }
+        }
+    }
+    default_edge_style = {
+        "color": {"color": DEFAULT_EDGE_STYLE["color"], "highlight": DEFAULT_EDGE_STYLE["highlight"]},
+        "width": DEFAULT_EDGE_STYLE["width"]
+    }
+    highlight_edge_style = {
+        "color": {"color": HIGHLIGHTED_EDGE_STYLE["color"], "highlight": HIGHLIGHTED_EDGE_STYLE["highlight"]},
+        "width": HIGHLIGHTED_EDGE_STYLE["width"]
+    }
+    return GraphView(nodes, edges, options, default_edge_style, highlight_edge_style)
+
+class CourseGraph:
+    """一份 kg_data.json 对应的实体索引、层级索引和图视图（只读，可在会话间共享）"""
+
+    def __init__(self, kg_data: Dict):
+        self.kg_data = kg_data
+        self.version = kg_data.get("layout", {}).get("graph_hash")
+        self.entity_map = {e["id"]: e for e in kg_data["entities"]}
+        self.out_relations: Dict[str, List[Dict]] = {}
+        for relation in kg_data["relations"]:
+            self.out_relations.setdefault(relation["from"], []).append(relation)
+        self.fixed_layout = has_layout(kg_data)
+        self.hierarchy = HierarchyIndex(kg_data)
+        self._full_view: Optional[GraphView] = None
+        self._lod_views: "OrderedDict[Tuple[str, ...], GraphView]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def lod_default(self) -> bool:
+        """节点数超过渲染上限时默认分层显示"""
+        return len(self.kg_data["entities"]) > MAX_RENDERED_NODES
+
+    def full_view(self) -> GraphView:
+        with self._lock:
+            if self._full_view is None:
+                self._full_view = build_graph_view(
+                    self.kg_data["entities"], self.kg_data["relations"], self.fixed_layout
+                )
+            return self._full_view
+
+    def lod_view(self, visible: List[str]) -> GraphView:
+        """只包含可见节点及其之间关系的分层视图"""
+        key = tuple(visible)
+        with self._lock:
+            if key in self._lod_views:
+                self._lod_views.move_to_end(key)
+                return self._lod_views[key]
+        visible_set = set(visible)
+        relations = [
+            relation
+            for node in visible
+            for relation in self.out_relations.get(node, ())
+            if relation["to"] in visible_set
+        ]
+        collapsed = {}
+        for node in visible:
+            hidden = sum(1 for r in self.out_relations.get(node, ()) if r["to"] not in visible_set)
+            if hidden:
+                collapsed[node] = hidden
+        view = build_graph_view(
+            [self.entity_map[node] for node in visible], relations, self.fixed_layout, collapsed
+        )
+        with self._lock:
+            self._lod_views[key] = view
+            while len(self._lod_views) > LOD_VIEW_CACHE_SIZE:
+                self._lod_views.popitem(last=False)
+        return view
+
+    def initial_view(self) -> GraphView:
+        """页面首次打开（未选中、未展开节点）时渲染的视图"""
+        if self.lod_default:
+            return self.lod_view(self.hierarchy.visible_nodes(max_nodes=MAX_RENDERED_NODES))
+        return self.full_view()
+
+@st.cache_resource(max_entries=MAX_CACHED_COURSES)
+def load_course_graph(kg_path: str, mtime: float) -> CourseGraph:
+    """按文件路径和修改时间缓存，文件重新构建后自动失效"""
+    with open(kg_path, "r", encoding="utf-8") as f:
+        return CourseGraph(json.load(f))
+
+def get_course_graph(kg_path: str = DEFAULT_KG_PATH) -> CourseGraph:
+    return load_course_graph(kg_path, os.path.getmtime(kg_path))
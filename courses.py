@@ -0,0 +1,218 @@
+"""
+多课程注册表与查询路由
+
+课程目录 COURSES_DIR（默认 courses/）下每个子目录为一门课程，目录名即课程ID（字母、数字、下划线）:
+    content.md    课程正文（格式同 wz.md，#### 为知识点）
+    index.md      课程目录（格式同 index.md）
+    course.json   可选，{"title": "课程名称"}
+课程图片放在项目的 images/ 下（建议按课程分子目录）。原有的 wz.md、index.md 和
+pages/kg_data.json 作为默认课程（DEFAULT_COURSE_ID），集合仍为 COLLECTION_NAME。
+
+每门课程有独立的 Milvus 集合（<COLLECTION_NAME>_<课程ID>）、知识图谱（与正文同目录的
+kg_data.json）和正文偏移索引。一次检索只查询选中课程的集合，耗时取决于该课程的规模，
+与课程总数无关。
+
+页面未指定课程时，按问题向量与各课程质心（入库时计算的文档块向量均值，见 insert.py）的
+余弦相似度选择课程；与最高分相差不超过 COURSE_ROUTE_MARGIN 的课程一并检索。
+
+用法:
+    python courses.py          列出课程及其集合、知识图谱和质心
+    python courses.py build    为各课程构建知识图谱和正文偏移索引（内容未变化时跳过）
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+import kg_build
+from compact_vectors import normalize
+from content_index import load_or_build_index
+from kg_build import DEFAULT_CONTENT_PATH, DEFAULT_INDEX_PATH, PROJECT_DIR
+from kg_layout import DEFAULT_KG_PATH, write_json_atomic
+
+load_dotenv()
+COLLECTION_NAME = os.getenv("COLLECTION_NAME")
+COURSES_DIR = os.getenv("COURSES_DIR", os.path.join(PROJECT_DIR, "courses"))
+DEFAULT_COURSE_ID = os.getenv("DEFAULT_COURSE_ID", "default")
+COURSE_ROUTE_MARGIN = float(os.getenv("COURSE_ROUTE_MARGIN", "0.02"))
+CENTROIDS_PATH = os.path.join(PROJECT_DIR, ".cache", "centroids.json")
+# 页面按课程缓存图谱和索引的数量
+MAX_CACHED_COURSES = 8
+
+# 课程ID 用于拼接集合名称，Milvus 集合名称只能包含字母、数字和下划线
+COURSE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_]+$")
+
+class Course:
+    """一门课程的源文件、知识图谱和向量集合"""
+
+    def __init__(self, course_id: str, title: str, content_path: str, index_path: str,
+                 kg_path: str, collection_name: str):
+        self.id = course_id
+        self.title = title
+        self.content_path = content_path
+        self.index_path = index_path
+        self.kg_path = kg_path
+        self.collection_name = collection_name
+
+    def to_dict(self) -> Dict:
+        return {"id": self.id, "title": self.title, "collection": self.collection_name}
+
+def default_course(collection_name: Optional[str] = COLLECTION_NAME) -> Course:
+    """原有的单课程配置"""
+    return Course(DEFAULT_COURSE_ID, kg_build.COURSE_TITLE, DEFAULT_CONTENT_PATH,
+                  DEFAULT_INDEX_PATH, DEFAULT_KG_PATH, collection_name)
+
+def load_course_dir(path: str) -> Course:
+    course_id = os.path.basename(os.path.normpath(path))
+    title = course_id
+    meta_path = os.path.join(path, "course.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            title = json.load(f).get("title") or course_id
+    return Course(
+        course_id, title,
+        content_path=os.path.join(path, "content.md"),
+        index_path=os.path.join(path, "index.md"),
+        kg_path=os.path.join(path, "kg_data.json"),
+        collection_name=f"{COLLECTION_NAME}_{course_id}"
+    )
+
+def load_courses(courses_dir: str = COURSES_DIR) -> Dict[str, Course]:
+    """默认课程（wz.md 存在时）在前，其余按目录名排序"""
+    courses: Dict[str, Course] = {}
+    if os.path.exists(DEFAULT_CONTENT_PATH):
+        courses[DEFAULT_COURSE_ID] = default_course()
+    if not os.path.isdir(courses_dir):
+        return courses
+    for name in sorted(os.listdir(courses_dir)):
+        path = os.path.join(courses_dir, name)
+        if not os.path.isdir(path):
+            continue
+        if not COURSE_ID_PATTERN.match(name) or name in courses:
+            logging.warning(f"跳过课程目录 {path}：课程ID只能包含字母、数字和下划线且不能重复")
+            continue
+        if not (os.path.exists(os.path.join(path, "content.md")) and os.path.exists(os.path.join(path, "index.md"))):
+            logging.warning(f"跳过课程目录 {path}：缺少 content.md 或 index.md")
+            continue
+        courses[name] = load_course_dir(path)
+    return courses
+
+def load_centroids(path: str = CENTROIDS_PATH) -> Dict[str, Dict]:
+    """集合名称到质心记录（centroid、count、updated_at）的映射"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_centroid(collection_name: str, centroid, count: int, path: str = CENTROIDS_PATH) -> None:
+    """记录集合的质心，重新入库后覆盖"""
+    centroids = load_centroids(path)
+    centroids[collection_name] = {
+        "centroid": normalize(centroid)[0].round(6).tolist(),
+        "count": count,
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_json_atomic(path, centroids)
+
+class CourseRouter:
+    """按问题向量与课程质心的余弦相似度选择课程，质心文件更新后自动重新加载"""
+
+    def __init__(self, courses: Dict[str, Course], centroids_path: str = CENTROIDS_PATH,
+                 margin: float = COURSE_ROUTE_MARGIN):
+        self.courses = courses
+        self.centroids_path = centroids_path
+        self.margin = margin
+        self._loaded = False
+        self._mtime: Optional[float] = None
+        self._course_ids: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> None:
+        mtime = os.path.getmtime(self.centroids_path) if os.path.exists(self.centroids_path) else None
+        with self._lock:
+            if self._loaded and mtime == self._mtime:
+                return
+            centroids = load_centroids(self.centroids_path)
+            course_ids = [
+                course_id for course_id, course in self.courses.items()
+                if course.collection_name in centroids
+            ]
+            missing = set(self.courses) - set(course_ids)
+            if missing:
+                logging.warning(f"课程 {sorted(missing)} 没有质心，请运行 insert.py 重新入库")
+            self._course_ids = course_ids
+            self._matrix = normalize(
+                [centroids[self.courses[course_id].collection_name]["centroid"] for course_id in course_ids]
+            ) if course_ids else None
+            self._mtime = mtime
+            self._loaded = True
+
+    def scores(self, query_vector) -> Dict[str, float]:
+        self._load()
+        if self._matrix is None:
+            return {}
+        similarities = self._matrix @ normalize(query_vector)[0]
+        return dict(zip(self._course_ids, similarities.tolist()))
+
+    def route(self, query_vector) -> List[str]:
+        """
+        Returns:
+            按相似度降序的课程ID，包含最相似的课程及与其相差不超过 margin 的课程；
+            没有质心时返回空列表
+        """
+        scores = self.scores(query_vector)
+        if not scores:
+            return []
+        best = max(scores.values())
+        return sorted(
+            (course_id for course_id, score in scores.items() if score >= best - self.margin),
+            key=lambda course_id: -scores[course_id]
+        )
+
+def build_course(course: Course, force: bool = False) -> bool:
+    """构建课程的知识图谱和正文偏移索引，返回知识图谱是否重新构建"""
+    rebuilt = kg_build.build(course.kg_path, course.index_path, course.content_path,
+                             title=course.title, force=force)
+    load_or_build_index(course.content_path)
+    return rebuilt
+
+def main():
+    parser = argparse.ArgumentParser(description="多课程注册表")
+    parser.add_argument("command", nargs="?", choices=["list", "build"], default="list")
+    parser.add_argument("--course", action="append", help="只处理指定课程，可重复")
+    parser.add_argument("--force", action="store_true", help="忽略源文件指纹强制重新构建知识图谱")
+    args = parser.parse_args()
+
+    courses = load_courses()
+    if args.course:
+        unknown = set(args.course) - set(courses)
+        if unknown:
+            raise SystemExit(f"未知课程: {', '.join(sorted(unknown))}")
+        courses = {course_id: courses[course_id] for course_id in args.course}
+
+    if args.command == "build":
+        for course in courses.values():
+            rebuilt = build_course(course, force=args.force)
+            print(f"{course.id}: 知识图谱{'已重新构建' if rebuilt else '未变化'}，{course.kg_path}")
+        return
+
+    centroids = load_centroids()
+    for course in courses.values():
+        centroid = centroids.get(course.collection_name)
+        kg_state = "已构建" if os.path.exists(course.kg_path) else "未构建"
+        centroid_state = f"质心 {centroid['count']} 个文档块" if centroid else "无质心"
+        print(f"{course.id:<16} {course.title:<20} 集合 {course.collection_name}  "
+              f"知识图谱{kg_state}  {centroid_state}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+入库前的近重复文档块去重
+
+教材正文中的模板段落、图注和复习段落会在多个文档块中重复出现，重复的文档块浪费向量化时间、
+索引内存，还会在检索结果的前几条中重复占用提示词。入库前按字符 k-gram（shingle）计算
+MinHash 签名，用 LSH 分桶找出候选，再以签名估计的 Jaccard 相似度确认：与之前保留的文档块
+相似度不低于 DEDUP_THRESHOLD 的文档块不再向量化和入库，其序号记录在保留的文档块（代表）的
+duplicates 字段中，完整的重复簇写入 .cache/dedup/<集合名>.json。
+
+去重是流式的：只保存保留的文档块的签名和分桶（每块约 2 KB），不保存文本，
+大规模导入时内存随保留的文档块数缓慢增长，不需要去重时用 insert.py --no-dedup 关闭。
+
+用法: python dedup.py [--content wz.md] [--threshold 0.8]   只分析重复情况，不导入
+"""
+import argparse
+import os
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from compact_vectors import vector_bytes
+from kg_build import DEFAULT_CONTENT_PATH, PROJECT_DIR
+from kg_layout import write_json_atomic
+
+load_dotenv()
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+DEDUP_DIR = os.path.join(PROJECT_DIR, ".cache", "dedup")
+SHINGLE_SIZE = 5
+# 20 段 × 每段 6 行：相似度 0.8 的文档块成为候选的概率约 99.8%，0.5 的约 27%
+LSH_BANDS = 20
+LSH_ROWS = 6
+NUM_PERM = LSH_BANDS * LSH_ROWS
+# 哈希取模的素数，a * h 不超过 2^62，uint64 运算不会溢出
+MERSENNE_PRIME = (1 << 31) - 1
+
+def shingle_set(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """忽略空白差异的字符 k-gram 集合，不足 k 个字符的文本整体作为一个 k-gram"""
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+class MinHasher:
+    """NUM_PERM 个形如 (a * h + b) mod p 的哈希函数，签名为每个函数在集合上的最小值"""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def signature(self, shingles: Set[str]) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+        ) % MERSENNE_PRIME
+        # 取值小于 2^31，按 uint32 保存
+        return ((np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME).min(axis=0).astype(np.uint32)
+
+class Deduplicator:
+    """
+    按文档顺序逐个加入文档块，与之前保留的文档块相似度不低于 threshold 的视为重复
+
+    只与保留的文档块（代表）比较，相似关系不会沿链传递，代表始终是簇中最先出现的文档块。
+    只保存代表的签名、LSH 分桶和开头的预览，不保存文本，相似度为签名中对应位置相等的比例
+    （Jaccard 相似度的估计，标准差约 0.04）。
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, shingle_size: int = SHINGLE_SIZE):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher()
+        self.buckets: List[Dict[int, List[int]]] = [{} for _ in range(LSH_BANDS)]
+        self.signatures: Dict[int, np.ndarray] = {}
+        self.previews: Dict[int, str] = {}
+        # 重复文档块序号到（代表序号，相似度）的映射
+        self.duplicates: Dict[int, Tuple[int, float]] = {}
+        self.chunks = 0
+        self.text_bytes_saved = 0
+
+    def add(self, chunk: str) -> Optional[Tuple[int, float]]:
+        """加入下一个文档块，重复时返回（代表序号，相似度）"""
+        i = self.chunks
+        self.chunks += 1
+        signature = self.hasher.signature(shingle_set(chunk, self.shingle_size))
+        keys = [hash(band.tobytes()) for band in signature.reshape(LSH_BANDS, LSH_ROWS)]
+        candidates = {rep for band, key in zip(self.buckets, keys) for rep in band.get(key, ())}
+        best, best_similarity = None, 0.0
+        for rep in sorted(candidates):
+            similarity = float(np.mean(signature == self.signatures[rep]))
+            if similarity > best_similarity:
+                best, best_similarity = rep, similarity
+        if best is not None and best_similarity >= self.threshold:
+            self.duplicates[i] = (best, round(best_similarity, 4))
+            self.text_bytes_saved += len(chunk.encode("utf-8"))
+            return self.duplicates[i]
+        self.signatures[i] = signature
+        self.previews[i] = chunk[:80]
+        for band, key in zip(self.buckets, keys):
+            band.setdefault(key, []).append(i)
+        return None
+
+    def report(self, dim: int, vector_mode: str = "float") -> Dict:
+        """统计节省的文档块、向量和字节数，并列出各重复簇"""
+        removed = len(self.duplicates)
+        per_vector = vector_bytes(dim, vector_mode)
+        if vector_mode != "float":
+            # 紧凑模式另有磁盘上的全精度向量
+            per_vector += vector_bytes(dim, "float")
+        return {
+            "threshold": self.threshold,
+            "chunks": self.chunks,
+            "kept": self.chunks - removed,
+            "removed": removed,
+            "text_bytes_saved": self.text_bytes_saved,
+            "vector_bytes_saved": removed * per_vector,
+            "clusters": [
+                {
+                    "representative": rep,
+                    "preview": self.previews[rep],
+                    "duplicates": [{"chunk": i, "similarity": self.duplicates[i][1]} for i in members],
+                }
+                for rep, members in back_references(self.duplicates).items()
+            ],
+        }
+
+def find_duplicates(chunks: Iterable[str], threshold: float = DEDUP_THRESHOLD,
+                    shingle_size: int = SHINGLE_SIZE) -> Dict[int, Tuple[int, float]]:
+    """
+    Returns:
+        重复文档块序号到（代表序号，相似度）的映射
+    """
+    deduplicator = Deduplicator(threshold, shingle_size)
+    for chunk in chunks:
+        deduplicator.add(chunk)
+    return deduplicator.duplicates
+
+def back_references(duplicates: Dict[int, Tuple[int, float]]) -> Dict[int, List[int]]:
+    """代表序号到其重复文档块序号的映射"""
+    references: Dict[int, List[int]] = {}
+    for i, (rep, _) in sorted(duplicates.items()):
+        references.setdefault(rep, []).append(i)
+    return references
+
+def format_report(report: Dict) -> str:
+    return (f"去重：{report['chunks']} 个文档块中有 {report['removed']} 个近重复（相似度 ≥ {report['threshold']}），"
+            f"保留 {report['kept']} 个；少向量化 {report['removed']} 次，"
+            f"节省向量 {report['vector_bytes_saved'] / 1024:.1f} KB、文本 {report['text_bytes_saved'] / 1024:.1f} KB")
+
+def write_report(collection_name: str, report: Dict) -> str:
+    path = os.path.join(DEDUP_DIR, f"{collection_name}.json")
+    os.makedirs(DEDUP_DIR, exist_ok=True)
+    write_json_atomic(path, report)
+    return path
+
+def main():
+    # 在此导入，避免与 insert.py 循环导入
+    from insert import iter_file_chunks
+
+    parser = argparse.ArgumentParser(description="分析课程正文中的近重复文档块")
+    parser.add_argument("--content", default=DEFAULT_CONTENT_PATH, help="课程正文markdown")
+    parser.add_argument("--threshold", type=float, default=DEDUP_THRESHOLD)
+    parser.add_argument("--dim", type=int, default=1024, help="向量维度，用于估算节省的字节数")
+    args = parser.parse_args()
+
+    deduplicator = Deduplicator(args.threshold)
+    for chunk in iter_file_chunks(args.content):
+        deduplicator.add(chunk)
+    report = deduplicator.report(args.dim)
+    print(format_report(report))
+    for cluster in report["clusters"]:
+        members = ", ".join(f"#{d['chunk']}({d['similarity']:.2f})" for d in cluster["duplicates"])
+        print(f"  #{cluster['representative']} {cluster['preview']!r} ← {members}")
+
+if __name__ == "__main__":
+    main()
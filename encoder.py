@@ -1,12 +1,21 @@
-from sentence_transformers import SentenceTransformer
-import torch
+import os
 import streamlit as st
 from typing import List
 
+from dotenv import load_dotenv
+
+load_dotenv()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-zh-v1.5")
+# 模型仓库的提交版本，未设置时使用最新版本
+EMBEDDING_MODEL_REVISION = os.getenv("EMBEDDING_MODEL_REVISION") or None
+
 @st.cache_resource
-def get_embedding_model() -> SentenceTransformer:
+def get_embedding_model():
+    # 在此导入，只读取模型配置（如 snapshot.py）时无需加载 torch
+    import torch
+    from sentence_transformers import SentenceTransformer
     device = "cuda" if torch.cuda.is_available() else "cpu"
-    return SentenceTransformer('BAAI/bge-large-zh-v1.5', device=device)
+    return SentenceTransformer(EMBEDDING_MODEL, revision=EMBEDDING_MODEL_REVISION, device=device)
 
 @st.cache_resource
 def get_embedding_cache() -> dict:
@@ -18,9 +27,18 @@ def emb_text(text: str) -> List[float]:
     if text in embedding_cache:
         return embedding_cache[text]
     else:
+        import torch
+        # 模型在首次编码时才加载，只导入本模块（或替换向量化函数压测）时不占用显存
+        model = get_embedding_model()
         with torch.inference_mode():
             embedding = model.encode(text, normalize_embeddings=True)
             embedding_cache[text] = embedding.tolist()
-            return embedding
+            return embedding_cache[text]
 
-model = get_embedding_model()
+def emb_texts(texts: List[str], batch_size: int = 32) -> List[List[float]]:
+    """批量编码，不写入缓存（入库时每个文档块只编码一次，缓存只会占用内存）"""
+    import torch
+    model = get_embedding_model()
+    with torch.inference_mode():
+        embeddings = model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    return embeddings.tolist()
@@ -1,12 +1,8 @@
 import os
 import streamlit as st
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
 import time
-import json
-import re
 import logging
-from typing import Dict, List
+from datetime import datetime
 
 st.set_page_config(
     layout="wide",
@@ -16,22 +12,36 @@ st.set_page_config(
 from pyvis.network import Network
 import streamlit.components.v1 as components
 from dotenv import load_dotenv
-from encoder import emb_text
-from milvus_utils import get_milvus_client, get_search_results
-from ask_llm import OllamaAPI, stream_llm_answer, extract_kg_from_text
+from kg_store import SessionKnowledgeGraph
+from kg_db import KnowledgeGraphDB
+from kg_layout import place_new_nodes
+from render import display_content_with_images
+from courses import load_courses
+from rag_service import RAGService
+from rag_client import RemoteRAGService
+from tracing import TRACE_QUESTIONS, start_trace, finish_trace, span
+from warmup import WARM_UP_TIMEOUT, WarmUp, service_tasks, warm_course_graph
 
 load_dotenv()
-COLLECTION_NAME = os.getenv("COLLECTION_NAME")
-MILVUS_ENDPOINT = os.getenv("MILVUS_ENDPOINT")
-MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
+KG_SESSION_MAX_NODES = int(os.getenv("KG_SESSION_MAX_NODES", "300"))
+KG_SESSION_EVICTION = os.getenv("KG_SESSION_EVICTION", "oldest")
+KG_DB_PATH = os.getenv("KG_DB_PATH", "kg_history.db")
+# 设置后页面作为瘦客户端调用 api_server.py，不在本进程加载嵌入模型
+RAG_API_URL = os.getenv("RAG_API_URL")
+# 预热失败后重新执行的最短间隔（秒）
+WARM_UP_RETRY_INTERVAL = float(os.getenv("WARM_UP_RETRY_INTERVAL", "60"))
+
+# 查询各阶段对应的进度
+QUERY_STAGES = {
+    "embed": (0.2, "正在进行语义向量化..."),
+    "search": (0.4, "正在检索相关内容..."),
+    "answer": (0.6, "检索完成，正在生成回答..."),
+    "kg": (0.8, "回答完成，正在生成知识图谱..."),
+}
 
 if 'retrieved_lines_with_distances' not in st.session_state:
     st.session_state.retrieved_lines_with_distances = []
 
-executor = ThreadPoolExecutor(max_workers=8)
-milvus_client = get_milvus_client(uri=MILVUS_ENDPOINT, token=MILVUS_TOKEN)
-ollama_client = OllamaAPI()
-
 logging.basicConfig(
     filename='rag_system.log',
     level=logging.INFO,
@@ -40,134 +50,167 @@ logging.basicConfig(
 )
 
 @st.cache_resource
-def warm_up_cache() -> bool:
-    """系统预热"""
-    try:
+def get_warm_up() -> WarmUp:
+    """系统预热在所有会话间只执行一次，各项任务在后台线程中并行执行"""
+    service = get_rag_service()
+    if RAG_API_URL:
+        # 瘦客户端模式下模型和后端由查询服务预热，这里等待它就绪
+        tasks = {"service": lambda: service.warm_up(WARM_UP_TIMEOUT)}
+    else:
+        tasks = service_tasks(service)
+    tasks["graph"] = warm_course_graph
+    tasks["pyvis"] = warm_pyvis
+    return WarmUp(tasks, source="home").start()
+
+def wait_for_warm_up() -> None:
+    """
+    会话首次打开页面时等待预热完成，首个查询不再承担加载模型、集合和模板的开销；之后的重跑不再等待。
+    预热失败后超过 WARM_UP_RETRY_INTERVAL 秒时重新执行（如 Milvus 或 Ollama 后来才启动）
+    """
+    warm_up = get_warm_up()
+    if (warm_up.done and warm_up.failed()
+            and (datetime.now() - datetime.fromisoformat(warm_up.finished_at)).total_seconds() >= WARM_UP_RETRY_INTERVAL):
+        # 预热对象在进程内缓存，不清除会一直保留失败状态；已加载的模型等在各自的缓存中，不会重复加载
+        get_warm_up.clear()
+        warm_up = get_warm_up()
+    if not warm_up.done and not st.session_state.get("warm_up_waited"):
         with st.spinner('正在初始化...'):
-            _ = emb_text("测试")
-            return True
-    except Exception as e:
-        st.error(f"初始化失败: {str(e)}")
-        return False
+            warm_up.wait(WARM_UP_TIMEOUT)
+    st.session_state.warm_up_waited = True
+    failed = warm_up.failed()
+    if failed:
+        st.error("初始化失败: " + "；".join(f"{name}: {error}" for name, error in failed.items())
+                 + f"（{WARM_UP_RETRY_INTERVAL:.0f} 秒后刷新页面时重试）")
+    elif not warm_up.done:
+        st.warning("初始化尚未完成，首次查询可能较慢")
 
 @st.cache_resource
-def get_cached_knowledge_graph():
-    """缓存知识图谱数据"""
-    return []
+def get_cached_knowledge_graph() -> KnowledgeGraphDB:
+    """跨会话持久化的知识图谱存储"""
+    return KnowledgeGraphDB(KG_DB_PATH)
 
-def display_content_with_images(text: str) -> None:
-    """显示包含图片的文本内容"""
-    pattern = r'!\[(.*?)\]\((images/.*?)\)'
-    parts = re.split(pattern, text)
-    
-    for i in range(0, len(parts), 3):
-        if parts[i]:
-            st.write(parts[i])
-        if i + 2 < len(parts):
-            image_path = parts[i + 2]
-            if os.path.exists(image_path):
-                st.image(image_path, caption=parts[i + 1])
+@st.cache_resource
+def get_rag_service():
+    """查询流程（Milvus、Ollama客户端和线程池）在所有会话间共享；设置 RAG_API_URL 时调用独立的查询服务"""
+    if RAG_API_URL:
+        return RemoteRAGService(RAG_API_URL)
+    from encoder import emb_text, get_embedding_cache
+    return RAGService(embed=emb_text, embed_cache=get_embedding_cache(), kg_db=get_cached_knowledge_graph(),
+                      courses=load_courses())
+
+@st.cache_data(ttl=60)
+def get_course_options() -> dict:
+    """课程ID到课程名称，瘦客户端模式下由查询服务提供"""
+    return {course["id"]: course["title"] for course in get_rag_service().course_list()}
+
+def get_session_graph() -> SessionKnowledgeGraph:
+    """获取当前会话的知识图谱存储"""
+    if 'kg_store' not in st.session_state:
+        st.session_state.kg_store = SessionKnowledgeGraph(
+            max_nodes=KG_SESSION_MAX_NODES,
+            eviction=KG_SESSION_EVICTION
+        )
+    return st.session_state.kg_store
 
 def update_knowledge_graph(kg_data: dict):
     """更新知识图谱数据"""
-    if 'kg_data' not in st.session_state:
-        st.session_state.kg_data = {"entities": [], "relations": []}
+    get_session_graph().merge(kg_data)
+
+def build_graph_html(kg_store: SessionKnowledgeGraph) -> str:
+    """根据会话图谱生成pyvis HTML"""
+    net = Network(
+        height="500px", 
+        width="100%", 
+        notebook=False, 
+        directed=True,
+        bgcolor="#ffffff",
+        font_color="#000000"
+    )
     
-    for entity in kg_data["entities"]:
-        if entity not in st.session_state.kg_data["entities"]:
-            st.session_state.kg_data["entities"].append(entity)
+    # 只为新节点分配坐标，已有节点保持原位，关闭物理模拟避免每次渲染重新布局
+    unplaced = [node_id for node_id, node in kg_store.nodes.items() if "x" not in node]
+    place_new_nodes(kg_store.nodes, {
+        node_id: [key[2] if key[0] == node_id else key[0] for key in kg_store.adjacency[node_id]]
+        for node_id in unplaced
+    })
     
-    for relation in kg_data["relations"]:
-        if relation not in st.session_state.kg_data["relations"]:
-            st.session_state.kg_data["relations"].append(relation)
+    for entity in kg_store.nodes.values():
+        net.add_node(
+            entity["id"],
+            label=entity["label"],
+            title=f"类型: {entity['type']}",
+            font={"size": 14},
+            x=entity["x"],
+            y=entity["y"],
+            physics=False
+        )
+    
+    for relation in kg_store.relations.values():
+        net.add_edge(
+            relation["from"],
+            relation["to"],
+            label=relation["label"],
+            arrows="to",
+            font={"size": 12}
+        )
+    
+    net.set_options("""
+    {
+        "nodes": {
+            "shape": "dot",
+            "size": 20,
+            "font": {
+                "size": 14
+            },
+            "borderWidth": 2
+        },
+        "edges": {
+            "arrows": "to",
+            "width": 2,
+            "font": {
+                "size": 12
+            },
+            "smooth": {
+                "type": "cubicBezier",
+                "forceDirection": "horizontal"
+            }
+        },
+        "physics": {
+            "enabled": false
+        },
+        "interaction": {
+            "hover": true,
+            "tooltipDelay": 200,
+            "navigationButtons": false
+        }
+    }
+    """)
+    
+    return net.generate_html()
+
+def warm_pyvis() -> str:
+    """首次生成 pyvis HTML 需要加载模板"""
+    build_graph_html(SessionKnowledgeGraph())
+    return "pyvis 模板已加载"
 
 def display_knowledge_graph():
     """显示知识图谱"""
-    if 'kg_data' not in st.session_state:
+    if 'kg_store' not in st.session_state:
         st.warning("暂无知识图谱数据")
         return
     
     try:
-        entity_count = len(st.session_state.kg_data["entities"])
-        relation_count = len(st.session_state.kg_data["relations"])
-        
-        net = Network(
-            height="500px", 
-            width="100%", 
-            notebook=False, 
-            directed=True,
-            bgcolor="#ffffff",
-            font_color="#000000"
-        )
-        
-        for entity in st.session_state.kg_data["entities"]:
-            if not isinstance(entity, dict):
-                continue
-            net.add_node(
-                entity.get("id", ""),
-                label=entity.get("label", "未命名实体"),
-                title=f"类型: {entity.get('type', '未知类型')}",
-                font={"size": 14}
-            )
-        
-        for relation in st.session_state.kg_data["relations"]:
-            if not isinstance(relation, dict):
-                continue
-            if relation.get("from") and relation.get("to"):
-                net.add_edge(
-                    relation["from"],
-                    relation["to"],
-                    label=relation.get("label", "未知关系"),
-                    arrows="to",
-                    font={"size": 12}
-                )
-        
-        net.set_options("""
-        {
-            "nodes": {
-                "shape": "dot",
-                "size": 20,
-                "font": {
-                    "size": 14
-                },
-                "borderWidth": 2
-            },
-            "edges": {
-                "arrows": "to",
-                "width": 2,
-                "font": {
-                    "size": 12
-                },
-                "smooth": {
-                    "type": "cubicBezier",
-                    "forceDirection": "horizontal"
-                }
-            },
-            "physics": {
-                "enabled": true,
-                "stabilization": {
-                    "enabled": true,
-                    "iterations": 100,
-                    "updateInterval": 10
-                },
-                "barnesHut": {
-                    "gravitationalConstant": -2000,
-                    "centralGravity": 0.3,
-                    "springLength": 95,
-                    "springConstant": 0.04,
-                    "damping": 0.09,
-                    "avoidOverlap": 0.1
-                }
-            },
-            "interaction": {
-                "hover": true,
-                "tooltipDelay": 200,
-                "navigationButtons": false
-            }
-        }
-        """)
+        kg_store = get_session_graph()
+        entity_count = len(kg_store.nodes)
+        relation_count = len(kg_store.relations)
         
-        html_content = net.generate_html()
+        # 图谱未变化时直接复用上次生成的HTML
+        cached = st.session_state.get('kg_html')
+        if cached and cached[0] == kg_store.version:
+            html_content = cached[1]
+        else:
+            html_content = build_graph_html(kg_store)
+            st.session_state.kg_html = (kg_store.version, html_content)
         components.html(html_content, height=550, scrolling=False)
         
         st.markdown(f"""
@@ -179,28 +222,12 @@ def display_knowledge_graph():
     except Exception as e:
         st.error(f"渲染知识图谱时出错: {str(e)}")
 
-async def async_process_query(question: str, progress_bar) -> List[Dict]:
-    """异步处理查询"""
-    loop = asyncio.get_event_loop()
-    
-    progress_bar.progress(0.2, text="正在进行语义向量化...")
-    query_vector = await loop.run_in_executor(executor, emb_text, question)
-    
-    progress_bar.progress(0.4, text="正在检索相关内容...")
-    results = await loop.run_in_executor(
-        executor,
-        lambda: get_search_results(milvus_client, COLLECTION_NAME, query_vector, ["text"])
-    )
-    
-    progress_bar.progress(0.6, text="检索完成，正在生成回答...")
-    return results
-
 def load_css():
     with open('static/styles.css', 'r', encoding='utf-8') as f:
         st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
 
 load_css()
-warm_up_cache()
+wait_for_warm_up()
 
 header = st.container()
 with header:
@@ -223,6 +250,14 @@ with left_col:
 
 with middle_col:
     with st.form("my_form"):
+        course_options = get_course_options()
+        course = None
+        if len(course_options) > 1:
+            # 未选择课程时按问题自动选择（见 courses.py）
+            course = st.selectbox(
+                "课程", [None] + list(course_options),
+                format_func=lambda c: "自动识别" if c is None else course_options[c]
+            )
         question = st.text_area("请输入您的问题:")
         cols = st.columns([7, 2])
         with cols[1]:
@@ -237,10 +272,10 @@ with right_col:
     graph_title = st.empty()
     graph_container = st.container()
 
-def log_user_query(question, kg_data):
+def log_user_query(question, kg_data, request_id=None):
     """记录用户查询和知识图谱生成情况"""
     try:
-        logging.info(f"用户问题: {question}")
+        logging.info(f"[{request_id}] 用户问题: {question}" if request_id else f"用户问题: {question}")
         
         if kg_data and kg_data["entities"]:
             entity_count = len(kg_data["entities"])
@@ -252,6 +287,7 @@ def log_user_query(question, kg_data):
         logging.error(f"日志记录失败: {str(e)}")
 
 if question and submitted:
+    trace = start_trace(question_chars=len(question), **({"question": question} if TRACE_QUESTIONS else {}))
     try:
         retrieval_title.markdown("<h3 style='text-align: center; font-size: 24px;'>向量检索</h3>", unsafe_allow_html=True)
         graph_title.markdown("<h3 style='text-align: center; font-size: 24px;'>知识图谱</h3>", unsafe_allow_html=True)
@@ -261,66 +297,65 @@ if question and submitted:
         with graph_container:
             phase1 = st.info("等待回答完成...")
             
-            results = asyncio.run(async_process_query(question, progress_bar))
-            retrieved_lines_with_distances = [
-                (res["entity"]["text"], res["distance"]) 
-                for res in results[0]
-            ]
-            
-            with retrieval_container:
-                for idx, (text, distance) in enumerate(retrieved_lines_with_distances, 1):
-                    st.markdown("---")
-                    st.markdown(f"**结果 {idx}:**")
-                    display_content_with_images(text)
-                    st.markdown(f"*相似度: {1-distance:.4f}*")
-            
-            with chat_container:
-                st.chat_message("user").write(question)
-                assistant_msg = st.chat_message("assistant")
-                message_placeholder = assistant_msg.empty()
+            service = get_rag_service()
+            full_response = ""
+            kg_data = {"entities": [], "relations": []}
+            events = service.query_events(question, request_id=trace.request_id if trace else None,
+                                          course=course)
+            for event, data in events:
+                if event == "stage":
+                    progress_bar.progress(QUERY_STAGES[data][0], text=QUERY_STAGES[data][1])
                 
-                context = "\n\n".join([
-                    f"相关内容 {i+1}：\n{line[0]}" 
-                    for i, line in enumerate(retrieved_lines_with_distances)
-                ])
+                elif event == "courses":
+                    if len(course_options) > 1:
+                        retrieval_container.caption("检索课程：" + "、".join(c["title"] for c in data))
                 
-                full_response = ""
-                for line in stream_llm_answer(ollama_client, context, question):
-                    try:
-                        response_data = json.loads(line)
-                        if "message" in response_data:
-                            content = response_data["message"]["content"]
-                            if content:
-                                full_response += content
-                                message_placeholder.markdown(full_response + "▌")
-                    except Exception as e:
-                        continue
+                elif event == "hits":
+                    with retrieval_container, span("render_retrieval"):
+                        for idx, hit in enumerate(data, 1):
+                            st.markdown("---")
+                            st.markdown(f"**结果 {idx}:**")
+                            display_content_with_images(hit["text"])
+                            st.markdown(f"*相似度: {hit['similarity']:.4f}*")
+                    
+                    with chat_container:
+                        st.chat_message("user").write(question)
+                        assistant_msg = st.chat_message("assistant")
+                        message_placeholder = assistant_msg.empty()
                 
-                message_placeholder.markdown(full_response)
-
-            progress_bar.progress(0.8, text="回答完成，正在生成知识图谱...")
-            phase1.empty()
-            
-            phase2 = st.info("图谱生成中...")
+                elif event == "token":
+                    full_response += data
+                    message_placeholder.markdown(full_response + "▌")
+                
+                elif event == "answer":
+                    full_response = data
+                    message_placeholder.markdown(full_response)
+                    phase1.empty()
+                    phase2 = st.info("图谱生成中...")
+                
+                elif event == "kg":
+                    kg_data = data
             
-            kg_data = extract_kg_from_text(ollama_client, full_response)
             update_knowledge_graph(kg_data)
 
-            log_user_query(question, kg_data)
+            log_user_query(question, kg_data, trace.request_id if trace else None)
             phase2.empty()
             
             if kg_data["entities"]:
                 st.success("图谱生成完成")
-                display_knowledge_graph()
+                with span("render_graph"):
+                    display_knowledge_graph()
             else:
                 st.warning("图谱生成失败，未提取到有效实体和关系")
             st.empty()
         
         progress_bar.progress(1.0, text="处理完成")
+        finish_trace(trace)
         time.sleep(0.5)
         progress_placeholder.empty()
         
     except Exception as e:
+        finish_trace(trace, status="error", error=str(e))
         logging.error(f"处理查询时出错: {str(e)}")
         progress_placeholder.empty()
         st.error(f"处理查询时出错: {str(e)}")
@@ -0,0 +1,221 @@
+"""
+知识库图片派生缓存
+
+构建时扫描 images/（含子目录，如按课程分的 images/<课程ID>/），为每张图片记录内容哈希、尺寸和
+文件大小（manifest，以相对项目目录的路径为键），并预先生成：
+- 缩略图 WebP：页面中直接展示，经 Streamlit 传输的数据量只有原图的一小部分
+- 原尺寸 WebP：放在 static/images/ 下由 Streamlit 静态文件服务提供，点击缩略图下的链接才加载
+
+派生文件以内容哈希命名，图片未变化（修改时间和大小相同）时跳过重新生成。只扫描某个子目录
+（--images images/<课程ID>）时只更新该目录下的图片，manifest 中其他目录的记录和派生文件保留。
+运行时 ImageCache 在内存中保留一个按字节数限制大小的 LRU，重复渲染不再读盘。
+
+用法: python image_cache.py [--images images] [--force]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from kg_build import PROJECT_DIR, file_sha256
+from kg_layout import write_json_atomic
+
+DEFAULT_IMAGE_DIR = os.path.join(PROJECT_DIR, "images")
+DERIVED_DIR = os.path.join(PROJECT_DIR, "static", "images")
+MANIFEST_PATH = os.path.join(PROJECT_DIR, ".cache", "images.manifest.json")
+# Streamlit 开启 server.enableStaticServing 后，static/ 目录映射到 app/static/
+STATIC_URL = "app/static/images"
+
+THUMB_MAX_WIDTH = 480
+THUMB_QUALITY = 70
+FULL_QUALITY = 85
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+def thumb_name(sha256: str) -> str:
+    return f"{sha256[:32]}_thumb.webp"
+
+def full_name(sha256: str) -> str:
+    return f"{sha256[:32]}.webp"
+
+def load_manifest(manifest_path: str = MANIFEST_PATH) -> Dict[str, Dict]:
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)["images"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+def make_derivatives(path: str, sha256: str, derived_dir: str) -> Dict:
+    """生成缩略图与原尺寸 WebP，返回图片尺寸和派生文件信息"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        width, height = image.size
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        full_path = os.path.join(derived_dir, full_name(sha256))
+        image.save(full_path, "WEBP", quality=FULL_QUALITY, method=4)
+
+        thumb = image.copy()
+        if width > THUMB_MAX_WIDTH:
+            thumb = thumb.resize(
+                (THUMB_MAX_WIDTH, max(1, round(height * THUMB_MAX_WIDTH / width))),
+                Image.LANCZOS
+            )
+        thumb_path = os.path.join(derived_dir, thumb_name(sha256))
+        thumb.save(thumb_path, "WEBP", quality=THUMB_QUALITY, method=4)
+
+    return {
+        "width": width,
+        "height": height,
+        "thumb": {
+            "file": thumb_name(sha256),
+            "width": thumb.size[0],
+            "height": thumb.size[1],
+            "size": os.path.getsize(thumb_path)
+        },
+        "full": {"file": full_name(sha256), "size": os.path.getsize(full_path)}
+    }
+
+def build_manifest(
+    image_dir: str = DEFAULT_IMAGE_DIR,
+    derived_dir: str = DERIVED_DIR,
+    manifest_path: str = MANIFEST_PATH,
+    force: bool = False,
+    workers: int = 4,
+    root: str = PROJECT_DIR
+) -> Dict[str, Dict]:
+    """
+    增量构建 image_dir 及其子目录下图片的 manifest 和派生文件
+
+    Args:
+        root: 图片路径相对的目录，与正文中的图片引用（如 images/课程ID/xxx.jpg）一致
+    Returns:
+        以相对 root 的图片路径为键的完整 manifest（含其他目录的记录）
+    """
+    os.makedirs(derived_dir, exist_ok=True)
+    previous = load_manifest(manifest_path)
+    prefix = os.path.relpath(os.path.abspath(image_dir), root).replace(os.sep, "/") + "/"
+    # 本次只负责 image_dir 下的记录，其他目录的记录原样保留
+    owned = {key: entry for key, entry in previous.items() if key.startswith(prefix)}
+    reusable = {} if force else owned
+
+    def process(path: str) -> Tuple[str, Optional[Dict]]:
+        key = os.path.relpath(os.path.abspath(path), root).replace(os.sep, "/")
+        stat = os.stat(path)
+        entry = reusable.get(key)
+        if (entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size
+                and os.path.exists(os.path.join(derived_dir, entry["thumb"]["file"]))
+                and os.path.exists(os.path.join(derived_dir, entry["full"]["file"]))):
+            return key, entry
+        sha256 = file_sha256(path)
+        try:
+            entry = make_derivatives(path, sha256, derived_dir)
+        except Exception as e:
+            logging.warning(f"生成图片派生文件失败 {path}: {str(e)}")
+            return key, None
+        entry.update(sha256=sha256, mtime=stat.st_mtime, size=stat.st_size)
+        return key, entry
+
+    paths = sorted(
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(image_dir)
+        for name in names if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    manifest = {key: entry for key, entry in previous.items() if key not in owned}
+    # Pillow 编码时释放GIL，线程池即可并行
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        manifest.update((key, entry) for key, entry in pool.map(process, paths) if entry)
+
+    # 清理本次负责的记录中已不再被引用的派生文件（内容相同的图片共用派生文件）
+    used = {entry[variant]["file"] for entry in manifest.values() for variant in ("thumb", "full")}
+    for entry in owned.values():
+        for variant in ("thumb", "full"):
+            name = entry[variant]["file"]
+            if name not in used and os.path.exists(os.path.join(derived_dir, name)):
+                os.remove(os.path.join(derived_dir, name))
+
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    write_json_atomic(manifest_path, {"thumb_max_width": THUMB_MAX_WIDTH, "images": manifest})
+    return manifest
+
+class ImageCache:
+    """按 manifest 读取缩略图字节，最近使用的图片保留在内存中，总字节数不超过 max_bytes"""
+
+    def __init__(
+        self,
+        manifest_path: str = MANIFEST_PATH,
+        derived_dir: str = DERIVED_DIR,
+        max_bytes: int = 32 * 1024 * 1024
+    ):
+        self.manifest = load_manifest(manifest_path)
+        self.derived_dir = derived_dir
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._lru: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, image_path: str) -> bool:
+        return self._key(image_path) in self.manifest
+
+    @staticmethod
+    def _key(image_path: str) -> str:
+        return os.path.normpath(image_path).replace("\\", "/")
+
+    def info(self, image_path: str) -> Optional[Dict]:
+        return self.manifest.get(self._key(image_path))
+
+    def thumbnail(self, image_path: str) -> Optional[Tuple[bytes, Dict]]:
+        """返回缩略图字节和 manifest 记录；图片未登记或派生文件缺失时返回 None"""
+        entry = self.info(image_path)
+        if entry is None:
+            return None
+        name = entry["thumb"]["file"]
+        with self._lock:
+            data = self._lru.get(name)
+            if data is not None:
+                self._lru.move_to_end(name)
+                return data, entry
+        try:
+            with open(os.path.join(self.derived_dir, name), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            if name not in self._lru:
+                self._lru[name] = data
+                self.current_bytes += len(data)
+                while self.current_bytes > self.max_bytes and len(self._lru) > 1:
+                    _, evicted = self._lru.popitem(last=False)
+                    self.current_bytes -= len(evicted)
+        return data, entry
+
+    def full_url(self, image_path: str) -> Optional[str]:
+        """原尺寸 WebP 的静态文件地址"""
+        entry = self.info(image_path)
+        if entry is None:
+            return None
+        return f"{STATIC_URL}/{entry['full']['file']}"
+
+def main():
+    parser = argparse.ArgumentParser(description="生成知识库图片的缩略图、WebP和manifest")
+    parser.add_argument("--images", default=DEFAULT_IMAGE_DIR, help="图片目录（含子目录）")
+    parser.add_argument("--force", action="store_true", help="忽略已有manifest全部重新生成")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    manifest = build_manifest(args.images, force=args.force, workers=args.workers)
+    original = sum(entry["size"] for entry in manifest.values())
+    thumbs = sum(entry["thumb"]["size"] for entry in manifest.values())
+    full = sum(entry["full"]["size"] for entry in manifest.values())
+    print(f"图片数量: {len(manifest)}，原图 {original / 1e6:.1f} MB，"
+          f"缩略图 {thumbs / 1e6:.1f} MB，WebP原尺寸 {full / 1e6:.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -1,98 +1,328 @@
+"""
+导入课程正文到向量数据库
+
+导入是流式的：读取 → 分块 → 向量化 → 入库 四个阶段在各自的线程中运行，之间由有界队列
+连接（见 pipeline.py），文档逐行读取、按批向量化和插入，内存占用与文档规模无关。
+每插入一批后在 .cache/ingest/<集合名>.json 记录检查点，中断后再次运行时从检查点继续：
+删除检查点之后插入的文档块，已向量化的文档块不再重复向量化。源文件或配置变化、
+或指定 --restart 时重新导入。结束后输出各阶段的数量、吞吐和等待时间。
+
+用法:
+    python insert.py [--course 课程ID] [--no-dedup] [--restart]   导入课程（默认全部）
+    python insert.py --dir 文档目录 --collection 集合名            导入目录下全部 .md/.txt 文档
+"""
+import argparse
+import itertools
+import json
 import os
 import streamlit as st
 import logging
+from collections import deque
 from tqdm import tqdm
 import re
-from typing import List
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
 
 MAX_CHUNK_SIZE = 2000
+# 读取阶段每批的行数、向量化和插入每批的文档块数、每个队列容纳的批数
+READ_BLOCK_LINES = 1000
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+INSERT_BATCH_SIZE = int(os.getenv("INSERT_BATCH_SIZE", "256"))
+QUEUE_SIZE = 4
 
-from encoder import emb_text
 from milvus_utils import get_milvus_client, create_collection
+from compact_vectors import FullVectorWriter, encode_vector, full_vectors_path, normalize
+from courses import Course, load_courses, save_centroid
+from dedup import DEDUP_THRESHOLD, Deduplicator, back_references, format_report, write_report
+from kg_build import PROJECT_DIR, iter_lines
+from kg_layout import write_json_atomic
+from pipeline import StageStats, batched, run_pipeline
 from dotenv import load_dotenv
 
 load_dotenv()
-COLLECTION_NAME = os.getenv("COLLECTION_NAME")
 MILVUS_ENDPOINT = os.getenv("MILVUS_ENDPOINT")
 MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
+VECTOR_MODE = os.getenv("VECTOR_MODE", "float")
+CHECKPOINT_DIR = os.path.join(PROJECT_DIR, ".cache", "ingest")
+DOCUMENT_EXTENSIONS = (".md", ".txt")
 
-def split_text(content: str) -> List[str]:
-    """分割文本为块"""
-    img_pattern = r'!\[.*?\]\(images/.*?\)'
-    ref_pattern = r'图\d+\.\d+'
-    chunks = []
+IMG_PATTERN = re.compile(r'!\[.*?\]\(images/.*?\)')
+REF_PATTERN = re.compile(r'图\d+\.\d+')
+
+def iter_chunks(lines: Iterable[str]) -> Iterator[str]:
+    """逐行分块，只保留当前块和查找图片用的后两行"""
+    lines = iter(lines)
+    ahead = deque()
     current_chunk = []
     current_length = 0
-    
-    lines = content.split('\n')
-    for line in lines:
-        if re.search(ref_pattern, line):
-            img_found = False
-            for j in range(len(current_chunk), min(len(lines), len(current_chunk) + 3)):
-                if re.match(img_pattern, lines[j]):
-                    if current_chunk:
-                        chunks.append('\n'.join(current_chunk))
-                        current_chunk = []
-                    current_chunk.extend(lines[len(current_chunk):j+1])
-                    img_found = True
+
+    while True:
+        line = ahead.popleft() if ahead else next(lines, None)
+        if line is None:
+            break
+        if REF_PATTERN.search(line):
+            # 引用图片的行与其后两行内的图片放在同一块的开头
+            while len(ahead) < 2:
+                following = next(lines, None)
+                if following is None:
                     break
-            if not img_found:
+                ahead.append(following)
+            window = [line, *ahead]
+            img_at = next((j for j, l in enumerate(window) if IMG_PATTERN.match(l)), None)
+            if img_at is not None:
+                if current_chunk:
+                    yield '\n'.join(current_chunk)
+                current_chunk = window[:img_at + 1]
+                current_length = sum(len(l) for l in current_chunk)
+                for _ in range(img_at):
+                    ahead.popleft()
+            else:
                 current_chunk.append(line)
+                current_length += len(line)
         else:
             if current_length + len(line) > MAX_CHUNK_SIZE and current_chunk:
-                chunks.append('\n'.join(current_chunk))
+                yield '\n'.join(current_chunk)
                 current_chunk = []
                 current_length = 0
             current_chunk.append(line)
             current_length += len(line)
-    
+
     if current_chunk:
-        chunks.append('\n'.join(current_chunk))
-    
-    return chunks
+        yield '\n'.join(current_chunk)
+
+def split_text(content: str) -> List[str]:
+    """分割文本为块"""
+    return list(iter_chunks(content.split('\n')))
+
+def iter_file_chunks(path: str) -> Iterator[str]:
+    return iter_chunks(iter_lines(path))
 
 def get_text(test_file: str) -> List[str]:
     """加载测试文档并分块"""
     try:
-        with open(test_file, "r", encoding="utf-8") as file:
-            content = file.read()
-            return split_text(content)
+        return list(iter_file_chunks(test_file))
     except Exception as e:
         logging.error(f"Error reading {test_file}: {e}")
         return []
 
-milvus_client = get_milvus_client(uri=MILVUS_ENDPOINT, token=MILVUS_TOKEN)
+def list_documents(directory: str) -> List[str]:
+    """目录下（含子目录）的全部文档，按路径排序"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(DOCUMENT_EXTENSIONS))
+    return paths
+
+def checkpoint_path(collection_name: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"{collection_name}.json")
+
+def load_checkpoint(collection_name: str) -> Optional[Dict]:
+    try:
+        with open(checkpoint_path(collection_name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_checkpoint(collection_name: str, checkpoint: Dict) -> None:
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    write_json_atomic(checkpoint_path(collection_name), checkpoint)
+
+def ingest_settings(sources: List[str], dim: int, dedup: bool) -> Dict:
+    """检查点只在源文件和这些配置都未变化时有效"""
+    return {
+        "sources": [
+            {"path": os.path.abspath(path), "size": os.path.getsize(path), "mtime": os.path.getmtime(path)}
+            for path in sources
+        ],
+        "dim": dim,
+        "vector_mode": VECTOR_MODE,
+        "max_chunk_size": MAX_CHUNK_SIZE,
+        "dedup_threshold": DEDUP_THRESHOLD if dedup else None,
+    }
+
+def format_progress(stats: List[StageStats]) -> str:
+    return " | ".join(f"{s.name} {s.items}（{s.throughput:.1f}/s）" for s in stats)
 
-test_text = "测试文本"
-test_vector = emb_text(test_text)
-dim = len(test_vector)
-print(f"向量维度: {dim}")
+def ingest(milvus_client, collection_name: str, sources: List[str],
+           embed_texts: Callable[[List[str]], List[List[float]]], dim: int,
+           dedup: bool = True, restart: bool = False) -> int:
+    """
+    流式导入文档到集合（默认先去除近重复的文档块），中断后从检查点继续
 
-if milvus_client.has_collection(COLLECTION_NAME):
-    print(f"删除已存在的集合: {COLLECTION_NAME}")
-    milvus_client.drop_collection(COLLECTION_NAME)
+    Args:
+        sources: 按顺序导入的文档，文档块的 chunk 字段为在全部文档中的序号
+        embed_texts: 批量向量化函数
+        restart: 忽略检查点，重建集合
+    Returns:
+        集合中的文档块数量
+    """
+    settings = ingest_settings(sources, dim, dedup)
+    checkpoint = None if restart else load_checkpoint(collection_name)
+    if checkpoint and (checkpoint["settings"] != settings or not milvus_client.has_collection(collection_name)):
+        print("源文件或导入配置已变化，忽略检查点重新导入")
+        checkpoint = None
 
-create_collection(milvus_client=milvus_client, collection_name=COLLECTION_NAME, dim=dim)
-print(f"创建新的集合: {COLLECTION_NAME}, 维度: {dim}")
+    if checkpoint:
+        start = checkpoint["next_chunk"]
+        print(f"从检查点继续: 已导入 {checkpoint['count']} 个文档块（下一块序号 {start}）")
+        # 插入成功但未来得及记录检查点的文档块会再次插入，先删除
+        milvus_client.delete(collection_name=collection_name, filter=f"chunk >= {start}")
+    else:
+        if milvus_client.has_collection(collection_name):
+            print(f"删除已存在的集合: {collection_name}")
+            milvus_client.drop_collection(collection_name)
+        create_collection(milvus_client=milvus_client, collection_name=collection_name, dim=dim,
+                          vector_mode=VECTOR_MODE)
+        print(f"创建新的集合: {collection_name}, 维度: {dim}, 向量存储: {VECTOR_MODE}")
+        checkpoint = {"settings": settings, "next_chunk": 0, "count": 0, "vector_sum": [0.0] * dim}
+        save_checkpoint(collection_name, checkpoint)
+        start = 0
 
-test_file = "wz.md"
-text_chunks = get_text(test_file)
-print(f"文档分块数量: {len(text_chunks)}")
+    def iter_all_chunks() -> Iterator[Tuple[str, str]]:
+        for path in sources:
+            for chunk in iter_file_chunks(path):
+                yield path, chunk
+
+    # 近重复的文档块不再向量化，其序号记录在保留的文档块的 duplicates 字段中（见 dedup.py）。
+    # 代表先于重复的文档块插入，因此先扫描一遍（只分块不向量化）得到全部重复关系
+    duplicates: Dict[int, Tuple[int, float]] = {}
+    if dedup:
+        deduplicator = Deduplicator()
+        for _, chunk in tqdm(iter_all_chunks(), desc="去重预扫描", unit="块"):
+            deduplicator.add(chunk)
+        report = deduplicator.report(dim, VECTOR_MODE)
+        print(format_report(report))
+        print(f"重复簇已保存: {write_report(collection_name, report)}")
+        duplicates = deduplicator.duplicates
+        del deduplicator
+    references = back_references(duplicates)
+
+    full_vectors = None
+    if VECTOR_MODE != "float":
+        # 紧凑模式下全精度向量按批追加到磁盘，row 为其行号，检索时用于重排
+        full_vectors = FullVectorWriter(full_vectors_path(collection_name), dim, rows=checkpoint["count"])
+    vector_sum = np.array(checkpoint["vector_sum"], dtype=np.float64)
+
+    def read(_) -> Iterator[Tuple[str, List[str]]]:
+        for path in sources:
+            for lines in batched(iter_lines(path), READ_BLOCK_LINES):
+                yield path, lines
+
+    def chunk(blocks) -> Iterator[List[Dict]]:
+        def records():
+            seq = 0
+            for path, group in itertools.groupby(blocks, key=lambda block: block[0]):
+                source = os.path.relpath(os.path.abspath(path), PROJECT_DIR)
+                for text in iter_chunks(line for _, lines in group for line in lines):
+                    if seq >= start and seq not in duplicates:
+                        yield {"text": text, "chunk": seq, "source": source}
+                    seq += 1
+        return batched(records(), EMBED_BATCH_SIZE)
+
+    def embed(batches) -> Iterator[List[Dict]]:
+        for batch in batches:
+            vectors = embed_texts([record["text"] for record in batch])
+            for record, vector in zip(batch, vectors):
+                record["vector"] = vector
+                if record["chunk"] in references:
+                    record["duplicates"] = references[record["chunk"]]
+            yield batch
+
+    def insert(batches) -> Iterator[List[Dict]]:
+        nonlocal vector_sum
+        entities = (entity for batch in batches for entity in batch)
+        for batch in batched(entities, INSERT_BATCH_SIZE):
+            vectors = [entity["vector"] for entity in batch]
+            if full_vectors is not None:
+                first = full_vectors.append(vectors)
+                for k, entity in enumerate(batch):
+                    entity["vector"] = encode_vector(entity["vector"], VECTOR_MODE)
+                    entity["row"] = first + k
+            milvus_client.insert(collection_name=collection_name, data=batch)
+            vector_sum += normalize(vectors).sum(axis=0)
+            checkpoint["next_chunk"] = batch[-1]["chunk"] + 1
+            checkpoint["count"] += len(batch)
+            checkpoint["vector_sum"] = vector_sum.tolist()
+            save_checkpoint(collection_name, checkpoint)
+            yield batch
 
-data = []
-count = 0
-for chunk in tqdm(text_chunks, desc="创建文档向量"):
     try:
-        vector = emb_text(chunk)
-        data.append({"vector": vector, "text": chunk})
-        count += 1
-    except Exception as e:
-        logging.error(f"处理文档块时出错:\n{e}")
+        stats = run_pipeline(
+            [("读取", read, lambda block: len(block[1])), ("分块", chunk), ("向量化", embed), ("入库", insert)],
+            queue_size=QUEUE_SIZE,
+            on_progress=lambda stats: print(format_progress(stats))
+        )
+    except BaseException:
+        if full_vectors is not None:
+            full_vectors.close()
+        print(f"导入中断，已导入 {checkpoint['count']} 个文档块，再次运行从检查点继续")
+        raise
+
+    print("各阶段（读取按行计数，其余按文档块计数）:")
+    for stage_stats in stats:
+        print(f"  {stage_stats.summary()}")
+
+    count = checkpoint["count"]
+    if full_vectors is not None:
+        full_vectors.finish()
+        print(f"全精度向量已保存: {full_vectors_path(collection_name)}")
+    if count:
+        # 查询未指定课程时按质心选择课程（见 courses.py）
+        save_centroid(collection_name, vector_sum / count, count)
+    else:
+        print("没有数据可以插入")
+    os.remove(checkpoint_path(collection_name))
+    print("成功插入向量数据库的文档块数量:", count)
+    return count
+
+def ingest_course(milvus_client, course: Course, embed_texts, dim: int, dedup: bool = True,
+                  restart: bool = False) -> int:
+    """导入课程正文到课程的集合，返回插入的文档块数量"""
+    return ingest(milvus_client, course.collection_name, [course.content_path], embed_texts, dim,
+                  dedup=dedup, restart=restart)
+
+def main():
+    parser = argparse.ArgumentParser(description="导入课程正文到向量数据库")
+    parser.add_argument("--course", action="append", help="只导入指定课程，可重复；默认导入全部课程")
+    parser.add_argument("--dir", help="导入目录下全部文档（.md/.txt）到 --collection 指定的集合")
+    parser.add_argument("--collection", help="与 --dir 一起使用的集合名称")
+    parser.add_argument("--no-dedup", action="store_true", help="不去除近重复的文档块")
+    parser.add_argument("--restart", action="store_true", help="忽略检查点，重新导入")
+    args = parser.parse_args()
+
+    if args.dir:
+        if not args.collection:
+            raise SystemExit("--dir 需要同时指定 --collection")
+        sources = list_documents(args.dir)
+        if not sources:
+            raise SystemExit(f"{args.dir} 下没有 {'/'.join(DOCUMENT_EXTENSIONS)} 文档")
+    else:
+        courses = load_courses()
+        if args.course:
+            unknown = set(args.course) - set(courses)
+            if unknown:
+                raise SystemExit(f"未知课程: {', '.join(sorted(unknown))}")
+            courses = {course_id: courses[course_id] for course_id in args.course}
+
+    # 在此导入，其他模块复用 split_text 时无需加载嵌入模型
+    from encoder import emb_texts
+
+    milvus_client = get_milvus_client(uri=MILVUS_ENDPOINT, token=MILVUS_TOKEN)
+
+    test_text = "测试文本"
+    test_vector = emb_texts([test_text])[0]
+    dim = len(test_vector)
+    print(f"向量维度: {dim}")
+
+    if args.dir:
+        print(f"导入 {len(sources)} 个文档到集合 {args.collection}")
+        ingest(milvus_client, args.collection, sources, emb_texts, dim,
+               dedup=not args.no_dedup, restart=args.restart)
+        return
 
-print("成功处理的文档块数量:", count)
+    for course in courses.values():
+        print(f"导入课程: {course.title}（{course.id}）")
+        ingest_course(milvus_client, course, emb_texts, dim, dedup=not args.no_dedup, restart=args.restart)
 
-if data:
-    mr = milvus_client.insert(collection_name=COLLECTION_NAME, data=data)
-    print("成功插入向量数据库的文档块数量:", mr["insert_count"])
-else:
-    print("没有数据可以插入")
+if __name__ == "__main__":
+    main()
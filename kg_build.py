@@ -0,0 +1,265 @@
+"""
+课程知识图谱构建
+
+逐行读取 index.md（课程目录）和 wz.md（正文）生成 kg_data.json，并在文件中记录
+源文件的哈希、修改时间和大小。源文件未变化时跳过构建，结果先写临时文件再原子替换。
+构建信息另存一份到 .cache/ 下的小文件，页面每次检查是否过期时无需解析整个 kg_data.json。
+
+用法: python kg_build.py [--index index.md] [--content wz.md] [--kg pages/kg_data.json] [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from kg_layout import DEFAULT_KG_PATH, apply_layout, write_json_atomic
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_PATH = os.path.join(PROJECT_DIR, "index.md")
+DEFAULT_CONTENT_PATH = os.path.join(PROJECT_DIR, "wz.md")
+COURSE_TITLE = "三维动画设计原理"
+BUILD_INFO_DIR = os.path.join(PROJECT_DIR, ".cache")
+
+# kg_data.json 路径到（其修改时间和大小，构建信息）的缓存
+_build_info_cache: Dict[str, Tuple[Tuple[float, int], Optional[Dict]]] = {}
+
+def iter_lines(path: str) -> Iterator[str]:
+    """逐行读取文本文件，不一次性载入内存"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+def parse_index(lines: Iterable[str], title: str = COURSE_TITLE) -> Dict:
+    """解析课程目录：# 部分、## 章节、### 小节"""
+    sections = []
+    current_part = None
+    current_chapter = None
+
+    for line in lines:
+        if line.startswith('# '):
+            if current_part:
+                sections.append(current_part)
+            current_part = {"title": line.replace('# ', '').strip(), "chapters": []}
+
+        elif line.startswith('## '):
+            if current_chapter:
+                current_part["chapters"].append(current_chapter)
+            current_chapter = {"title": line.replace('## ', '').strip(), "sections": []}
+
+        elif line.startswith('### '):
+            section = line.replace('### ', '').strip()
+            current_chapter["sections"].append(section)
+
+    # 处理最后的部分和章节
+    if current_chapter:
+        current_part["chapters"].append(current_chapter)
+    if current_part:
+        sections.append(current_part)
+
+    return {"title": title, "parts": sections}
+
+def build_knowledge_graph(course: Dict, content_lines: Iterable[str]) -> Dict:
+    """由课程目录和正文中的 #### 知识点标题生成实体与关系"""
+    graph = {"entities": [], "relations": []}
+    added_entities: Set[str] = set()
+
+    def add_entity(entity_id: str, label: str, entity_type: str) -> None:
+        if entity_id not in added_entities:
+            graph["entities"].append({
+                "id": entity_id,
+                "label": label,
+                "type": entity_type
+            })
+            added_entities.add(entity_id)
+
+    # 添加课程结构
+    course_id = f"course_{course['title']}"
+    add_entity(course_id, course["title"], "课程")
+
+    for part in course["parts"]:
+        part_id = f"part_{part['title']}"
+        add_entity(part_id, part["title"], "部分")
+        graph["relations"].append({"from": course_id, "to": part_id, "label": "包含"})
+
+        for chapter in part["chapters"]:
+            chapter_id = f"chapter_{chapter['title']}"
+            add_entity(chapter_id, chapter["title"], "章节")
+            graph["relations"].append({"from": part_id, "to": chapter_id, "label": "包含"})
+
+            for section in chapter["sections"]:
+                section_id = f"section_{section}"
+                add_entity(section_id, section, "小节")
+                graph["relations"].append({"from": chapter_id, "to": section_id, "label": "包含"})
+
+    # 添加知识点
+    current_section = None
+    for line in content_lines:
+        if line.startswith('#### '):
+            topic = line.replace('#### ', '').strip()
+            topic_id = f"topic_{topic}"
+            add_entity(topic_id, topic, "知识点")
+            if current_section:
+                graph["relations"].append({"from": current_section, "to": topic_id, "label": "包含"})
+        elif line.startswith('### '):
+            current_section = f"section_{line.replace('### ', '').strip()}"
+
+    return graph
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def source_fingerprint(path: str) -> Dict:
+    stat = os.stat(path)
+    return {"sha256": file_sha256(path), "mtime": stat.st_mtime, "size": stat.st_size}
+
+def build_info_path(kg_path: str) -> str:
+    relative = os.path.relpath(os.path.abspath(kg_path), PROJECT_DIR)
+    name = os.path.splitext(relative)[0].replace(os.sep, "_").replace("..", "_")
+    return os.path.join(BUILD_INFO_DIR, f"{name}.build.json")
+
+def save_build_info(kg_path: str, build_info: Dict) -> None:
+    """记录构建信息及其对应的 kg_data.json 的修改时间和大小"""
+    stat = os.stat(kg_path)
+    key = (stat.st_mtime, stat.st_size)
+    os.makedirs(BUILD_INFO_DIR, exist_ok=True)
+    write_json_atomic(build_info_path(kg_path), {"kg": list(key), "build": build_info})
+    _build_info_cache[kg_path] = (key, build_info)
+
+def load_build_info(kg_path: str) -> Optional[Dict]:
+    """
+    读取构建信息：kg_data.json 未变化时直接使用缓存或 .cache/ 下的小文件；
+    kg_data.json 被替换（重新构建或检出）后才解析一次其中的 build 字段
+    """
+    try:
+        stat = os.stat(kg_path)
+    except OSError:
+        return None
+    key = (stat.st_mtime, stat.st_size)
+    cached = _build_info_cache.get(kg_path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    try:
+        with open(build_info_path(kg_path), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if tuple(saved["kg"]) == key:
+            _build_info_cache[kg_path] = (key, saved["build"])
+            return saved["build"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    try:
+        with open(kg_path, "r", encoding="utf-8") as f:
+            build_info = json.load(f).get("build")
+    except (OSError, ValueError):
+        return None
+    if build_info:
+        save_build_info(kg_path, build_info)
+    else:
+        _build_info_cache[kg_path] = (key, None)
+    return build_info
+
+def changed_sources(build_info: Optional[Dict], sources: Dict[str, str]) -> Dict[str, Dict]:
+    """
+    找出内容发生变化的源文件
+
+    修改时间和大小都未变时直接认为未变化；否则再比较内容哈希。
+
+    Args:
+        build_info: kg_data.json 中记录的构建信息
+        sources: 源文件名称到路径的映射
+
+    Returns:
+        源文件名称到最新指纹的映射，仅包含内容变化的文件；未记录过构建信息时包含全部文件
+    """
+    recorded = (build_info or {}).get("sources", {})
+    changed = {}
+    for name, path in sources.items():
+        stat = os.stat(path)
+        previous = recorded.get(name)
+        if previous and previous["mtime"] == stat.st_mtime and previous["size"] == stat.st_size:
+            continue
+        fingerprint = source_fingerprint(path)
+        if not previous or previous["sha256"] != fingerprint["sha256"]:
+            changed[name] = fingerprint
+    return changed
+
+def refresh_mtimes(kg_path: str, build_info: Dict, sources: Dict[str, str]) -> None:
+    """
+    内容未变但修改时间变化（如重新检出）时更新记录，之后的检查无需再计算哈希
+
+    只更新 .cache/ 下的构建信息，kg_data.json 不变，按其修改时间缓存的图谱无需重新加载。
+    """
+    recorded = build_info["sources"]
+    stats = {name: os.stat(path) for name, path in sources.items()}
+    if all(
+        recorded[name]["mtime"] == stat.st_mtime and recorded[name]["size"] == stat.st_size
+        for name, stat in stats.items()
+    ):
+        return
+    for name, stat in stats.items():
+        recorded[name].update(mtime=stat.st_mtime, size=stat.st_size)
+    save_build_info(kg_path, build_info)
+
+def is_stale(
+    kg_path: str = DEFAULT_KG_PATH,
+    index_path: str = DEFAULT_INDEX_PATH,
+    content_path: str = DEFAULT_CONTENT_PATH
+) -> bool:
+    """源文件内容是否变化；未变化时通常只需 os.stat kg_data.json 和两个源文件"""
+    sources = {"index": index_path, "content": content_path}
+    build_info = load_build_info(kg_path)
+    if changed_sources(build_info, sources):
+        return True
+    refresh_mtimes(kg_path, build_info, sources)
+    return False
+
+def build(
+    kg_path: str = DEFAULT_KG_PATH,
+    index_path: str = DEFAULT_INDEX_PATH,
+    content_path: str = DEFAULT_CONTENT_PATH,
+    title: str = COURSE_TITLE,
+    force: bool = False
+) -> bool:
+    """
+    源文件变化时重新生成知识图谱
+
+    Returns:
+        是否重新构建
+    """
+    sources = {"index": index_path, "content": content_path}
+    build_info = load_build_info(kg_path)
+    if not force and build_info and not changed_sources(build_info, sources):
+        refresh_mtimes(kg_path, build_info, sources)
+        return False
+
+    course = parse_index(iter_lines(index_path), title)
+    kg_data = build_knowledge_graph(course, iter_lines(content_path))
+    apply_layout(kg_data)
+    kg_data["build"] = {
+        "sources": {name: source_fingerprint(path) for name, path in sources.items()}
+    }
+    write_json_atomic(kg_path, kg_data)
+    save_build_info(kg_path, kg_data["build"])
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="构建课程知识图谱 kg_data.json")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="课程目录markdown")
+    parser.add_argument("--content", default=DEFAULT_CONTENT_PATH, help="课程正文markdown")
+    parser.add_argument("--kg", default=DEFAULT_KG_PATH, help="输出的知识图谱JSON")
+    parser.add_argument("--force", action="store_true", help="忽略源文件指纹强制重新构建")
+    args = parser.parse_args()
+
+    if build(args.kg, args.index, args.content, force=args.force):
+        print(f"知识图谱已重新构建: {args.kg}")
+    else:
+        print(f"源文件未变化，跳过构建: {args.kg}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+_FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend", "kg_graph")
+_kg_graph = components.declare_component("kg_graph", path=_FRONTEND_DIR)
+
+class GraphView:
+    """
+    发送到前端组件的图数据
+
+    节点和边只在首次渲染（或图变化）时发送一次，之后选择变化只发送需要高亮的id。
+    边按 (from, to) 建立索引，高亮时无需遍历全部边。
+    """
+
+    def __init__(
+        self,
+        nodes: List[Dict],
+        edges: List[Dict],
+        options: Dict,
+        default_edge_style: Dict,
+        highlight_edge_style: Dict
+    ):
+        self.edge_index: Dict[Tuple[str, str], str] = {}
+        for i, edge in enumerate(edges):
+            edge.setdefault("id", f"e{i}")
+            self.edge_index.setdefault((edge["from"], edge["to"]), edge["id"])
+        self.payload = {
+            "nodes": nodes,
+            "edges": edges,
+            "options": options,
+            "default_edge_style": default_edge_style,
+            "highlight_edge_style": highlight_edge_style,
+        }
+        serialized = json.dumps(self.payload, ensure_ascii=False, sort_keys=True)
+        self.version = hashlib.sha1(serialized.encode("utf-8")).hexdigest()[:16]
+
+    def edge_ids(self, pairs: Iterable[Tuple[str, str]]) -> List[str]:
+        """将 (from, to) 节点对转换为边id，反向的边同样匹配"""
+        ids = []
+        for a, b in pairs:
+            edge_id = self.edge_index.get((a, b)) or self.edge_index.get((b, a))
+            if edge_id is not None:
+                ids.append(edge_id)
+        return ids
+
+def render_kg_graph(
+    view: GraphView,
+    highlight_nodes: Iterable[str] = (),
+    highlight_edges: Iterable[str] = (),
+    height: int = 600,
+    key: str = "kg_graph"
+) -> Optional[Dict]:
+    """
+    渲染知识图谱组件
+
+    前端确认已加载某一版本后，后续重跑只发送高亮的节点和边id；
+    若前端重新挂载而丢失图数据，会回传 missing 请求重新下发。
+
+    Returns:
+        前端回传的值，包含已加载的版本号以及最近一次点击的节点
+    """
+    loaded_key = f"{key}_loaded_version"
+    value = st.session_state.get(key) or {}
+    if value.get("missing"):
+        st.session_state[loaded_key] = None
+    elif value.get("version"):
+        st.session_state[loaded_key] = value["version"]
+
+    send_graph = st.session_state.get(loaded_key) != view.version
+    return _kg_graph(
+        graph=view.payload if send_graph else None,
+        version=view.version,
+        highlight_nodes=list(highlight_nodes),
+        highlight_edges=list(highlight_edges),
+        height=height,
+        key=key,
+        default=None
+    )
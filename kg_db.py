@@ -0,0 +1,308 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from kg_store import normalize_label
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY,
+    norm_label TEXT NOT NULL UNIQUE,
+    label TEXT NOT NULL,
+    type TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 1,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS relations (
+    src INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    dst INTEGER NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (src, label, dst)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_relations_dst ON relations (dst, src);
+CREATE TABLE IF NOT EXISTS provenance (
+    id INTEGER PRIMARY KEY,
+    question TEXT NOT NULL,
+    question_key TEXT NOT NULL,
+    chunk_ids TEXT NOT NULL,
+    chunk_key TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_provenance_question ON provenance (question_key);
+CREATE INDEX IF NOT EXISTS idx_provenance_chunks ON provenance (chunk_key);
+CREATE TABLE IF NOT EXISTS provenance_entities (
+    prov_id INTEGER NOT NULL,
+    entity_id INTEGER NOT NULL,
+    PRIMARY KEY (prov_id, entity_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_provenance_entities ON provenance_entities (entity_id);
+CREATE TABLE IF NOT EXISTS provenance_relations (
+    prov_id INTEGER NOT NULL,
+    src INTEGER NOT NULL,
+    label TEXT NOT NULL,
+    dst INTEGER NOT NULL,
+    PRIMARY KEY (prov_id, src, label, dst)
+) WITHOUT ROWID;
+"""
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def question_key(question: str) -> str:
+    return _digest(normalize_label(question))
+
+def chunk_key(chunk_ids: Iterable) -> str:
+    return _digest(",".join(sorted(str(chunk_id) for chunk_id in chunk_ids)))
+
+class KnowledgeGraphDB:
+    """
+    跨会话持久化的知识图谱存储（SQLite）
+
+    实体按归一化名称去重，关系以 (src, label, dst) 为主键并建立反向索引，
+    每次抽取记录来源问题与检索块id，便于之后直接复用已抽取的子图。
+    """
+
+    def __init__(self, path: str = "kg_history.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def upsert(self, kg_data: Dict, question: str = "", chunk_ids: Iterable = ()) -> Optional[int]:
+        """
+        批量写入一次抽取结果及其来源
+
+        Args:
+            kg_data: extract_kg_from_text 返回的实体与关系
+            question: 触发本次抽取的用户问题
+            chunk_ids: 本次回答所用检索块的稳定标识（见 lookup）
+
+        Returns:
+            来源记录id，无有效实体时返回None
+        """
+        entities = [e for e in kg_data.get("entities", []) if isinstance(e, dict)]
+        if not entities:
+            return None
+        chunk_ids = [str(chunk_id) for chunk_id in chunk_ids]
+        now = time.time()
+
+        with self._lock, self._conn:
+            conn = self._conn
+            conn.executemany(
+                """
+                INSERT INTO entities (norm_label, label, type, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (norm_label) DO UPDATE SET
+                    hits = hits + 1, last_seen = excluded.last_seen
+                """,
+                [
+                    (normalize_label(e.get("label", "")), e.get("label", "未命名实体"),
+                     e.get("type", "未知类型"), now, now)
+                    for e in entities
+                ]
+            )
+
+            norm_labels = {normalize_label(e.get("label", "")) for e in entities}
+            row_ids = self._entity_ids(norm_labels)
+            local_ids = {
+                e.get("id", ""): row_ids[normalize_label(e.get("label", ""))]
+                for e in entities
+            }
+
+            relation_rows = set()
+            for relation in kg_data.get("relations", []):
+                if not isinstance(relation, dict):
+                    continue
+                src = local_ids.get(relation.get("from"))
+                dst = local_ids.get(relation.get("to"))
+                if src is not None and dst is not None:
+                    relation_rows.add((src, relation.get("label", "未知关系"), dst))
+            conn.executemany(
+                """
+                INSERT INTO relations (src, label, dst) VALUES (?, ?, ?)
+                ON CONFLICT (src, label, dst) DO UPDATE SET hits = hits + 1
+                """,
+                relation_rows
+            )
+
+            prov_id = conn.execute(
+                """
+                INSERT INTO provenance (question, question_key, chunk_ids, chunk_key, created)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (question, question_key(question), json.dumps(chunk_ids), chunk_key(chunk_ids), now)
+            ).lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO provenance_entities VALUES (?, ?)",
+                [(prov_id, entity_id) for entity_id in set(local_ids.values())]
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO provenance_relations VALUES (?, ?, ?, ?)",
+                [(prov_id, *row) for row in relation_rows]
+            )
+        return prov_id
+
+    def _entity_ids(self, norm_labels: Iterable[str]) -> Dict[str, int]:
+        norm_labels = list(norm_labels)
+        result = {}
+        # SQLite 单条语句的参数数量有限，分批查询
+        for start in range(0, len(norm_labels), 500):
+            batch = norm_labels[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for row in self._conn.execute(
+                f"SELECT id, norm_label FROM entities WHERE norm_label IN ({placeholders})", batch
+            ):
+                result[row["norm_label"]] = row["id"]
+        return result
+
+    def lookup(self, question: str, chunk_ids: Iterable = ()) -> Optional[Dict]:
+        """
+        查找之前针对同一问题、基于同一组检索块抽取过的子图
+
+        子图从LLM的回答中抽取，回答取决于问题和检索块，两者都相同时才复用。
+        chunk_ids 应为重新入库后不变的标识（如课程ID与文档块序号），而非 Milvus 自动生成的主键。
+
+        Returns:
+            与 extract_kg_from_text 格式相同的字典，未命中时返回None
+        """
+        chunk_ids = [str(chunk_id) for chunk_id in chunk_ids]
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT id FROM provenance WHERE question_key = ? AND chunk_key = ?
+                ORDER BY id DESC LIMIT 1
+                """,
+                (question_key(question), chunk_key(chunk_ids))
+            ).fetchone()
+            if row is None:
+                return None
+
+            entities = self._conn.execute(
+                """
+                SELECT e.id, e.label, e.type FROM provenance_entities p
+                JOIN entities e ON e.id = p.entity_id WHERE p.prov_id = ?
+                """,
+                (row["id"],)
+            ).fetchall()
+            relations = self._conn.execute(
+                "SELECT src, label, dst FROM provenance_relations WHERE prov_id = ?",
+                (row["id"],)
+            ).fetchall()
+        return {
+            "entities": [self._entity_dict(e) for e in entities],
+            "relations": [
+                {"from": f"e{r['src']}", "to": f"e{r['dst']}", "label": r["label"]}
+                for r in relations
+            ]
+        }
+
+    @staticmethod
+    def _entity_dict(row: sqlite3.Row) -> Dict:
+        return {"id": f"e{row['id']}", "label": row["label"], "type": row["type"]}
+
+    def find_entity(self, label: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, label, type FROM entities WHERE norm_label = ?",
+                (normalize_label(label),)
+            ).fetchone()
+        return self._entity_dict(row) if row else None
+
+    def search_prefix(self, prefix: str, limit: int = 20) -> List[Dict]:
+        """按名称前缀查找实体，利用 norm_label 上的唯一索引做范围扫描"""
+        prefix = normalize_label(prefix)
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT id, label, type FROM entities
+                WHERE norm_label >= ? AND norm_label < ?
+                ORDER BY norm_label LIMIT ?
+                """,
+                (prefix, prefix + "\U0010ffff", limit)
+            ).fetchall()
+        return [self._entity_dict(row) for row in rows]
+
+    def _adjacent(self, entity_ids: List[int]) -> List[sqlite3.Row]:
+        rows = []
+        for start in range(0, len(entity_ids), 400):
+            batch = entity_ids[start:start + 400]
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(self._conn.execute(
+                f"""
+                SELECT src, label, dst FROM relations WHERE src IN ({placeholders})
+                UNION
+                SELECT src, label, dst FROM relations WHERE dst IN ({placeholders})
+                """,
+                batch + batch
+            ))
+        return rows
+
+    def neighbors(self, label: str) -> Dict:
+        """实体的一跳邻居子图"""
+        return self.k_hop(label, 1)
+
+    def k_hop(self, label: str, k: int = 2, max_nodes: int = 200) -> Dict:
+        """
+        以实体为中心逐层扩展的k跳子图
+
+        Args:
+            label: 中心实体名称
+            k: 跳数
+            max_nodes: 子图节点上限
+        """
+        center = self.find_entity(label)
+        if center is None:
+            return {"entities": [], "relations": []}
+
+        seen = {int(center["id"][1:])}
+        frontier = list(seen)
+        relations = {}
+        with self._lock:
+            for _ in range(k):
+                if not frontier or len(seen) >= max_nodes:
+                    break
+                next_frontier = []
+                for row in self._adjacent(frontier):
+                    for node in (row["src"], row["dst"]):
+                        if node not in seen and len(seen) < max_nodes:
+                            seen.add(node)
+                            next_frontier.append(node)
+                    if row["src"] in seen and row["dst"] in seen:
+                        relations[(row["src"], row["label"], row["dst"])] = row
+                frontier = next_frontier
+
+            entities = []
+            ids = list(seen)
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                entities.extend(self._conn.execute(
+                    f"SELECT id, label, type FROM entities WHERE id IN ({placeholders})", batch
+                ))
+        return {
+            "entities": [self._entity_dict(e) for e in entities],
+            "relations": [
+                {"from": f"e{src}", "to": f"e{dst}", "label": rel_label}
+                for src, rel_label, dst in relations
+            ]
+        }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ("entities", "relations", "provenance")
+            }
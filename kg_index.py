@@ -0,0 +1,196 @@
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+Edge = Tuple[str, str]
+
+class HierarchyIndex:
+    """
+    课程层级（课程 → 部分 → 章节 → 小节 → 知识点）的祖先索引
+
+    从根节点按关系顺序做一次深度优先遍历得到父指针和深度，
+    并建立倍增表，任意两节点的最近公共祖先查询为 O(log n)。
+    同一知识点挂在多个小节下时，取深度优先遍历中最先到达的父节点，
+    与逐条路径搜索得到的第一条路径一致。
+    """
+
+    def __init__(self, kg_data: Dict, root: Optional[str] = None):
+        children: Dict[str, List[str]] = {}
+        for relation in kg_data["relations"]:
+            children.setdefault(relation["from"], []).append(relation["to"])
+
+        if root is None:
+            root = next(e["id"] for e in kg_data["entities"] if e["type"] == "课程")
+        self.root = root
+
+        self.ids: List[str] = []
+        self.position: Dict[str, int] = {}
+        parent: List[int] = []
+        depth: List[int] = []
+
+        self.ids.append(root)
+        self.position[root] = 0
+        parent.append(0)
+        depth.append(0)
+        stack = [(root, iter(children.get(root, ())))]
+        while stack:
+            node, it = stack[-1]
+            child = next(it, None)
+            if child is None:
+                stack.pop()
+                continue
+            if child in self.position:
+                continue
+            index = len(self.ids)
+            self.ids.append(child)
+            self.position[child] = index
+            parent.append(self.position[node])
+            depth.append(depth[self.position[node]] + 1)
+            stack.append((child, iter(children.get(child, ()))))
+
+        self.depth = depth
+        self.children: List[List[int]] = [[] for _ in self.ids]
+        for v in range(1, len(self.ids)):
+            self.children[parent[v]].append(v)
+        # 按层级从浅到深排列的节点，用于分层加载时按层截取
+        self.level_order = sorted(range(len(self.ids)), key=lambda v: depth[v])
+        # up[j][v] 为 v 的第 2^j 级祖先
+        self.up: List[List[int]] = [parent]
+        levels = max(depth).bit_length() if depth else 0
+        for _ in range(1, levels):
+            prev = self.up[-1]
+            self.up.append([prev[prev[v]] for v in range(len(prev))])
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.position
+
+    def child_count(self, node: str) -> int:
+        return len(self.children[self.position[node]])
+
+    def parent(self, node: str) -> Optional[str]:
+        v = self.position[node]
+        return None if v == 0 else self.ids[self.up[0][v]]
+
+    def _lca(self, a: int, b: int) -> int:
+        if self.depth[a] < self.depth[b]:
+            a, b = b, a
+        diff = self.depth[a] - self.depth[b]
+        j = 0
+        while diff:
+            if diff & 1:
+                a = self.up[j][a]
+            diff >>= 1
+            j += 1
+        if a == b:
+            return a
+        for j in range(len(self.up) - 1, -1, -1):
+            if self.up[j][a] != self.up[j][b]:
+                a = self.up[j][a]
+                b = self.up[j][b]
+        return self.up[0][a]
+
+    def lca(self, a: str, b: str) -> str:
+        return self.ids[self._lca(self.position[a], self.position[b])]
+
+    def path(self, ancestor: str, node: str) -> List[str]:
+        """从祖先节点到目标节点的路径（含两端）"""
+        top = self.position[ancestor]
+        v = self.position[node]
+        path = [v]
+        while v != top:
+            if v == 0:
+                return []
+            v = self.up[0][v]
+            path.append(v)
+        return [self.ids[v] for v in reversed(path)]
+
+    def path_from_root(self, node: str) -> List[str]:
+        return self.path(self.root, node)
+
+    def highlight_edges(self, selected: Iterable[str]) -> Set[Edge]:
+        """
+        选中节点需要高亮的边
+
+        单个节点时为根节点到该节点的路径；多个节点时为所有节点对
+        各自到最近公共祖先的路径之并，即连接所有选中节点的最小子树。
+        沿父指针向上走到公共祖先或已标记的节点为止，总代价与结果边数成正比。
+        """
+        nodes = [self.position[n] for n in selected if n in self.position]
+        if not nodes:
+            return set()
+        if len(nodes) == 1:
+            top = 0
+        else:
+            top = nodes[0]
+            for v in nodes[1:]:
+                top = self._lca(top, v)
+
+        parent = self.up[0]
+        edges: Set[Edge] = set()
+        visited = {top}
+        for v in nodes:
+            while v not in visited:
+                visited.add(v)
+                edges.add((self.ids[parent[v]], self.ids[v]))
+                v = parent[v]
+        return edges
+
+    def visible_nodes(
+        self,
+        expanded: Iterable[str] = (),
+        focus: Iterable[str] = (),
+        max_nodes: int = 500,
+        base_depth: int = 2,
+        neighborhood: int = 1
+    ) -> List[str]:
+        """
+        分层加载时需要渲染的节点
+
+        按优先级依次加入，达到 max_nodes 后停止：
+        1. 选中节点及其到根节点的路径
+        2. 选中节点向下 neighborhood 层以内的子节点
+        3. 已展开节点的祖先及其直接子节点
+        4. 深度不超过 base_depth 的节点（默认为课程、部分、章节）
+
+        代价与返回的节点数成正比，与整张图的大小无关。
+        """
+        result: Dict[int, None] = {}
+
+        def add(v: int) -> bool:
+            if v in result:
+                return True
+            if len(result) >= max_nodes:
+                return False
+            result.setdefault(v)
+            return True
+
+        def add_ancestors(v: int) -> bool:
+            chain = [v]
+            while v != 0:
+                v = self.up[0][v]
+                chain.append(v)
+            return all(add(u) for u in reversed(chain))
+
+        focus = [self.position[n] for n in focus if n in self.position]
+        for v in focus:
+            if not add_ancestors(v):
+                return [self.ids[u] for u in result]
+        for v in focus:
+            frontier = [v]
+            for _ in range(neighborhood):
+                frontier = [c for u in frontier for c in self.children[u]]
+                for c in frontier:
+                    if not add(c):
+                        return [self.ids[u] for u in result]
+
+        for node in expanded:
+            if node not in self.position:
+                continue
+            v = self.position[node]
+            if not add_ancestors(v):
+                break
+            if not all(add(c) for c in self.children[v]):
+                break
+
+        for v in self.level_order:
+            if self.depth[v] > base_depth or not add(v):
+                break
+        return [self.ids[u] for u in result]
@@ -0,0 +1,155 @@
+"""
+知识图谱离线布局
+
+按 课程 → 部分 → 章节 → 小节 → 知识点 的层级计算径向树布局，坐标写回 kg_data.json，
+页面渲染时关闭物理模拟直接使用固定坐标。图结构不变时不会重新计算。
+
+用法: python kg_layout.py [--kg pages/kg_data.json] [--force]
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import tempfile
+from typing import Dict, List, Tuple
+
+from kg_index import HierarchyIndex
+
+LAYOUT_ALGORITHM = "radial_tree_v1"
+RING_SPACING = 300
+LEAF_SPACING = 60
+
+DEFAULT_KG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages", "kg_data.json")
+
+def graph_hash(kg_data: Dict) -> str:
+    """只对节点和边计算哈希，坐标变化不影响结果"""
+    structure = {
+        "entities": [[e["id"], e["label"], e["type"]] for e in kg_data["entities"]],
+        "relations": [[r["from"], r["to"], r["label"]] for r in kg_data["relations"]],
+    }
+    serialized = json.dumps(structure, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+def compute_layout(kg_data: Dict) -> Dict[str, Tuple[float, float]]:
+    """
+    径向树布局
+
+    叶子节点在最外层圆周上等角度排列，内部节点取其子树角度范围的中点，
+    半径与层级深度成正比。最外层半径保证相邻叶子间距不小于 LEAF_SPACING。
+    """
+    index = HierarchyIndex(kg_data)
+    children = index.children
+
+    # index.ids 为深度优先先序，逆序遍历即可保证子节点先于父节点处理
+    leaves = [v for v in range(len(index.ids)) if not children[v]]
+    leaf_slot = {v: i for i, v in enumerate(leaves)}
+    span: List[Tuple[float, float]] = [(0.0, 0.0)] * len(index.ids)
+    for v in range(len(index.ids) - 1, -1, -1):
+        if children[v]:
+            span[v] = (span[children[v][0]][0], span[children[v][-1]][1])
+        else:
+            span[v] = (leaf_slot[v], leaf_slot[v])
+
+    max_depth = max(index.depth) or 1
+    outer_radius = max(RING_SPACING * max_depth, len(leaves) * LEAF_SPACING / (2 * math.pi))
+    step = 2 * math.pi / max(len(leaves), 1)
+
+    positions: Dict[str, Tuple[float, float]] = {}
+    for v, node in enumerate(index.ids):
+        angle = (span[v][0] + span[v][1]) / 2 * step
+        radius = outer_radius * index.depth[v] / max_depth
+        positions[node] = (round(radius * math.cos(angle), 1), round(radius * math.sin(angle), 1))
+
+    # 不在层级树中的节点放在最外层之外
+    orphans = [e["id"] for e in kg_data["entities"] if e["id"] not in positions]
+    for i, node in enumerate(orphans):
+        angle = 2 * math.pi * i / len(orphans)
+        radius = outer_radius + RING_SPACING
+        positions[node] = (round(radius * math.cos(angle), 1), round(radius * math.sin(angle), 1))
+    return positions
+
+def apply_layout(kg_data: Dict, force: bool = False) -> bool:
+    """
+    为图数据写入坐标
+
+    Returns:
+        是否重新计算了布局
+    """
+    current_hash = graph_hash(kg_data)
+    layout = kg_data.get("layout", {})
+    if not force and layout.get("graph_hash") == current_hash and layout.get("algorithm") == LAYOUT_ALGORITHM:
+        return False
+
+    positions = compute_layout(kg_data)
+    for entity in kg_data["entities"]:
+        entity["x"], entity["y"] = positions[entity["id"]]
+    kg_data["layout"] = {"algorithm": LAYOUT_ALGORITHM, "graph_hash": current_hash}
+    return True
+
+def has_layout(kg_data: Dict) -> bool:
+    return "layout" in kg_data and all("x" in e for e in kg_data["entities"])
+
+def write_json_atomic(path: str, data: Dict) -> None:
+    """先写临时文件再替换，避免读到写了一半的文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def update_layout_file(kg_path: str = DEFAULT_KG_PATH, force: bool = False) -> bool:
+    with open(kg_path, "r", encoding="utf-8") as f:
+        kg_data = json.load(f)
+    if not apply_layout(kg_data, force=force):
+        return False
+    write_json_atomic(kg_path, kg_data)
+    return True
+
+def place_new_nodes(nodes: Dict[str, Dict], neighbors: Dict[str, List[str]], spacing: float = 120) -> None:
+    """
+    为尚无坐标的节点增量分配位置，已有节点的坐标保持不变
+
+    新节点放在已定位邻居周围的小圆上，没有已定位邻居时沿螺旋线向外排列。
+
+    Args:
+        nodes: 节点id到节点数据的映射，坐标写入其 x、y 字段
+        neighbors: 节点id到相邻节点id列表的映射
+    """
+    golden_angle = math.pi * (3 - math.sqrt(5))
+    placed = sum(1 for node in nodes.values() if "x" in node)
+    for node_id, node in nodes.items():
+        if "x" in node:
+            continue
+        anchor = next(
+            (nodes[n] for n in neighbors.get(node_id, ()) if n in nodes and "x" in nodes[n]),
+            None
+        )
+        angle = placed * golden_angle
+        if anchor is not None:
+            node["x"] = round(anchor["x"] + spacing * math.cos(angle), 1)
+            node["y"] = round(anchor["y"] + spacing * math.sin(angle), 1)
+        else:
+            radius = spacing * math.sqrt(placed)
+            node["x"] = round(radius * math.cos(angle), 1)
+            node["y"] = round(radius * math.sin(angle), 1)
+        placed += 1
+
+def main():
+    parser = argparse.ArgumentParser(description="计算知识图谱布局并写回 kg_data.json")
+    parser.add_argument("--kg", default=DEFAULT_KG_PATH, help="知识图谱JSON路径")
+    parser.add_argument("--force", action="store_true", help="忽略哈希强制重新计算")
+    args = parser.parse_args()
+
+    if update_layout_file(args.kg, force=args.force):
+        print(f"布局已更新: {args.kg}")
+    else:
+        print(f"图结构未变化，跳过布局计算: {args.kg}")
+
+if __name__ == "__main__":
+    main()
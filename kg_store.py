@@ -0,0 +1,135 @@
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+EVICT_OLDEST = "oldest"
+EVICT_LOWEST_DEGREE = "degree"
+
+RelationKey = Tuple[str, str, str]
+
+def normalize_label(label: str) -> str:
+    """实体名称归一化：全角转半角、去除首尾空白、合并连续空白、忽略大小写"""
+    label = unicodedata.normalize("NFKC", str(label))
+    return re.sub(r"\s+", " ", label).strip().lower()
+
+class SessionKnowledgeGraph:
+    """
+    会话级知识图谱存储
+
+    - 每次抽取结果的实体id（如 entity_1）只在本次抽取内有效，合并时映射为全局节点id
+    - 实体按归一化名称建立哈希索引，同名实体合并为同一节点
+    - 关系以 (from, label, to) 为键去重
+    - 节点数超过上限时按最久未出现或度数最低的策略淘汰
+    """
+
+    def __init__(self, max_nodes: int = 300, eviction: str = EVICT_OLDEST):
+        if eviction not in (EVICT_OLDEST, EVICT_LOWEST_DEGREE):
+            raise ValueError(f"未知的淘汰策略: {eviction}")
+        self.max_nodes = max_nodes
+        self.eviction = eviction
+        self.extraction_count = 0
+        self.version = 0
+        # 节点按最近出现顺序排列，最久未出现的在最前
+        self.nodes: "OrderedDict[str, Dict]" = OrderedDict()
+        self.label_index: Dict[str, str] = {}
+        self.relations: "OrderedDict[RelationKey, Dict]" = OrderedDict()
+        self.adjacency: Dict[str, Set[RelationKey]] = {}
+        self._next_node = 0
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def _touch_entity(self, entity: Dict, touched: Set[str]) -> str:
+        key = normalize_label(entity.get("label", ""))
+        node_id = self.label_index.get(key)
+        if node_id is None:
+            self._next_node += 1
+            node_id = f"n{self._next_node}"
+            self.label_index[key] = node_id
+            self.adjacency[node_id] = set()
+            self.nodes[node_id] = {
+                "id": node_id,
+                "label": entity.get("label", "未命名实体"),
+                "type": entity.get("type", "未知类型"),
+            }
+        else:
+            self.nodes.move_to_end(node_id)
+        touched.add(node_id)
+        return node_id
+
+    def merge(self, kg_data: Dict) -> Dict[str, int]:
+        """
+        合并一次抽取结果
+
+        Args:
+            kg_data: extract_kg_from_text 返回的实体与关系
+
+        Returns:
+            新增节点数、新增关系数和淘汰节点数
+        """
+        self.extraction_count += 1
+        namespace = f"x{self.extraction_count}"
+        local_ids: Dict[str, str] = {}
+        touched: Set[str] = set()
+        nodes_before = len(self.nodes)
+        added_relations = 0
+
+        for entity in kg_data.get("entities", []):
+            if not isinstance(entity, dict):
+                continue
+            node_id = self._touch_entity(entity, touched)
+            local_ids[f"{namespace}/{entity.get('id', '')}"] = node_id
+
+        for relation in kg_data.get("relations", []):
+            if not isinstance(relation, dict):
+                continue
+            src = local_ids.get(f"{namespace}/{relation.get('from', '')}")
+            dst = local_ids.get(f"{namespace}/{relation.get('to', '')}")
+            if src is None or dst is None:
+                continue
+            key = (src, relation.get("label", "未知关系"), dst)
+            if key in self.relations:
+                continue
+            self.relations[key] = {"from": src, "to": dst, "label": key[1]}
+            self.adjacency[src].add(key)
+            self.adjacency[dst].add(key)
+            added_relations += 1
+
+        added_nodes = len(self.nodes) - nodes_before
+        evicted = self._evict(protected=touched)
+        if added_nodes or added_relations or evicted:
+            self.version += 1
+        return {"nodes": added_nodes, "relations": added_relations, "evicted": evicted}
+
+    def _pick_victim(self, protected: Set[str]) -> Optional[str]:
+        candidates = (node_id for node_id in self.nodes if node_id not in protected)
+        if self.eviction == EVICT_OLDEST:
+            return next(candidates, None)
+        # 度数相同时淘汰较早出现的节点
+        return min(candidates, key=lambda node_id: len(self.adjacency[node_id]), default=None)
+
+    def _evict(self, protected: Set[str]) -> int:
+        evicted = 0
+        while len(self.nodes) > self.max_nodes:
+            victim = self._pick_victim(protected)
+            if victim is None:
+                break
+            self.remove_node(victim)
+            evicted += 1
+        return evicted
+
+    def remove_node(self, node_id: str) -> None:
+        node = self.nodes.pop(node_id)
+        del self.label_index[normalize_label(node["label"])]
+        for key in self.adjacency.pop(node_id):
+            self.relations.pop(key, None)
+            other = key[2] if key[0] == node_id else key[0]
+            if other in self.adjacency:
+                self.adjacency[other].discard(key)
+
+    def entities(self) -> List[Dict]:
+        return list(self.nodes.values())
+
+    def relation_list(self) -> List[Dict]:
+        return list(self.relations.values())
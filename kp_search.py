@@ -0,0 +1,239 @@
+"""
+知识点搜索索引
+
+由 kg_data.json 中的知识点一次性构建：
+- 单字与双字的倒排索引，用于子串匹配
+- 按名称排序的列表，用于前缀匹配（名称本身以及去掉"知识点X"编号后的标题）
+- 双字（短查询为单字）重叠召回 + 编辑距离，容忍错别字和漏字
+- 安装了 pypinyin 时支持拼音前缀匹配
+
+结果按 完全匹配 > 标题前缀 > 名称前缀 > 拼音前缀 > 子串 > 模糊匹配 排序，
+同一档内名称越短越靠前；每个查询串的结果会被缓存。
+"""
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from kg_store import normalize_label
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+# 去掉 "知识点一 " 之类的编号前缀
+TOPIC_PREFIX = re.compile(r"^知识点[一二三四五六七八九十百零\d]+\s*")
+
+TIER_EXACT = 0
+TIER_TITLE_PREFIX = 1
+TIER_LABEL_PREFIX = 2
+TIER_PINYIN_PREFIX = 3
+TIER_SUBSTRING = 4
+TIER_FUZZY = 5
+
+PREFIX_SCAN_LIMIT = 64
+FUZZY_SCAN_LIMIT = 2000
+FUZZY_CANDIDATES = 50
+FUZZY_BLOCK = 256
+
+def bigrams(text: str) -> List[str]:
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+def substring_edit_distance(pattern: str, text: str) -> int:
+    """
+    pattern 与 text 中任意子串之间的最小编辑距离
+
+    Myers 位并行算法，用整数的每一位表示动态规划表的一列差值，
+    每个文本字符只需常数次位运算。
+    """
+    m = len(pattern)
+    if m == 0:
+        return 0
+    peq: Dict[str, int] = {}
+    for i, c in enumerate(pattern):
+        peq[c] = peq.get(c, 0) | (1 << i)
+    full = (1 << m) - 1
+    top = 1 << (m - 1)
+    pv, mv, score = full, 0, m
+    best = m
+    for c in text:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & full) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & full
+        mh = pv & xh
+        if ph & top:
+            score += 1
+        elif mh & top:
+            score -= 1
+        # 子串匹配允许从文本任意位置开始，移位时不补1
+        ph = (ph << 1) & full
+        mh = (mh << 1) & full
+        pv = (mh | ~(xv | ph)) & full
+        mv = ph & xv
+        if score < best:
+            best = score
+    return best
+
+class KnowledgePointIndex:
+    def __init__(self, entities: List[Dict], cache_size: int = 2048):
+        # 文档id按(名称长度, 原顺序)分配，倒排表按id递增即按名称长度排序
+        ordered = sorted(enumerate(entities), key=lambda item: (len(item[1]["label"]), item[0]))
+        self.entities = [entity for _, entity in ordered]
+        self.labels = [normalize_label(e["label"]) for e in self.entities]
+        self.titles = [TOPIC_PREFIX.sub("", label) for label in self.labels]
+
+        self.exact: Dict[str, List[int]] = {}
+        postings: Dict[str, List[int]] = {}
+        for doc, (label, title) in enumerate(zip(self.labels, self.titles)):
+            self.exact.setdefault(label, []).append(doc)
+            if title != label:
+                self.exact.setdefault(title, []).append(doc)
+            for gram in set(label) | set(bigrams(label)):
+                postings.setdefault(gram, []).append(doc)
+        self.postings = postings
+        # 模糊匹配用 searchsorted 批量统计候选与查询共享的单字/双字数
+        self.posting_arrays: Dict[str, np.ndarray] = {
+            gram: np.array(docs, dtype=np.int32) for gram, docs in postings.items()
+        }
+
+        self.sorted_titles: List[Tuple[str, int]] = sorted((t, doc) for doc, t in enumerate(self.titles))
+        self.sorted_labels: List[Tuple[str, int]] = sorted((l, doc) for doc, l in enumerate(self.labels))
+        self.sorted_pinyin: Optional[List[Tuple[str, int]]] = None
+        if lazy_pinyin is not None:
+            self.sorted_pinyin = sorted(
+                ("".join(lazy_pinyin(title)).lower(), doc) for doc, title in enumerate(self.titles)
+            )
+
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, int], Tuple[Dict, ...]]" = OrderedDict()
+        # 索引在所有会话间共享，多个线程会同时查询
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_kg_data(cls, kg_data: Dict, entity_type: str = "知识点") -> "KnowledgePointIndex":
+        return cls([e for e in kg_data["entities"] if e["type"] == entity_type])
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def search(self, query: str, limit: int = 5) -> Tuple[Dict, ...]:
+        """按相关度返回最多 limit 个知识点实体"""
+        key = (normalize_label(query), limit)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+        result = tuple(self.entities[doc] for doc in self._search(key[0], limit))
+        with self._lock:
+            self._cache[key] = result
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _prefix_scan(sorted_keys: List[Tuple[str, int]], prefix: str) -> List[int]:
+        docs = []
+        start = bisect_left(sorted_keys, (prefix, -1))
+        for key, doc in sorted_keys[start:start + PREFIX_SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            docs.append(doc)
+        # 同一档内按文档id（即名称长度）排序
+        return sorted(docs)
+
+    def _search(self, query: str, limit: int) -> List[int]:
+        if not query:
+            return []
+        found: Dict[int, int] = {}
+
+        def collect(docs, tier) -> bool:
+            for doc in docs:
+                if doc not in found:
+                    found[doc] = tier
+                    if len(found) >= limit:
+                        return True
+            return False
+
+        if collect(self.exact.get(query, ()), TIER_EXACT):
+            return list(found)
+        if collect(self._prefix_scan(self.sorted_titles, query), TIER_TITLE_PREFIX):
+            return list(found)
+        if collect(self._prefix_scan(self.sorted_labels, query), TIER_LABEL_PREFIX):
+            return list(found)
+        if self.sorted_pinyin is not None and query.isascii():
+            if collect(self._prefix_scan(self.sorted_pinyin, query.replace(" ", "")), TIER_PINYIN_PREFIX):
+                return list(found)
+
+        # 子串匹配：从最短的倒排表出发逐个校验，倒排表已按名称长度排序，凑够即停止
+        grams = bigrams(query) or [query]
+        lists = [self.postings.get(gram) for gram in grams]
+        if all(lists):
+            rarest = min(lists, key=len)
+            if collect((doc for doc in rarest if query in self.labels[doc]), TIER_SUBSTRING):
+                return list(found)
+
+        if len(query) >= 2:
+            collect(self._fuzzy(query, found, limit - len(found)), TIER_FUZZY)
+        return list(found)
+
+    def _fuzzy(self, query: str, exclude: Dict[int, int], limit: int) -> List[int]:
+        """
+        按共享双字召回候选，再用编辑距离过滤排序
+
+        每处编辑最多破坏查询中的两个双字，满足距离要求的名称至少包含
+        len(双字) - 2 * max_distance 个查询双字；由抽屉原理，它必然出现在
+        最稀有的 2 * max_distance + 1 个倒排表之一中，只需扫描这些表。
+        短查询的错字可能破坏全部双字（如三字查询中间的错字），此时改用单字：
+        每处编辑最多去掉一个查询单字。候选按文档id（名称长度）顺序校验，找到 limit 个即停止。
+        """
+        max_distance = 1 if len(query) < 8 else 2
+        query_grams = list(set(bigrams(query)))
+        min_overlap = len(query_grams) - 2 * max_distance
+        if min_overlap <= 0:
+            query_grams = list(set(query))
+            min_overlap = max(1, len(query_grams) - max_distance)
+        empty = np.empty(0, dtype=np.int32)
+        postings = sorted((self.posting_arrays.get(gram, empty) for gram in query_grams), key=len)
+
+        scanned = np.sort(np.concatenate(
+            [posting[:FUZZY_SCAN_LIMIT] for posting in postings[:len(query_grams) - min_overlap + 1]]
+        ))
+        if not len(scanned):
+            return []
+        candidates = scanned[np.r_[True, scanned[1:] != scanned[:-1]]][:FUZZY_SCAN_LIMIT]
+
+        scored = []
+        checked = 0
+        # 先统计文档id最小的一段的重叠数，多数查询在这一段内就凑够结果，其余一次统计
+        for block in (candidates[:FUZZY_BLOCK], candidates[FUZZY_BLOCK:]):
+            if not len(block):
+                break
+            overlap = np.zeros(len(block), dtype=np.int32)
+            for posting in postings:
+                # 只在该段文档id范围内的一截倒排表中查找
+                lo, hi = np.searchsorted(posting, (block[0], block[-1] + 1))
+                if lo < hi:
+                    part = posting[lo:hi]
+                    positions = np.minimum(np.searchsorted(part, block), len(part) - 1)
+                    overlap += part[positions] == block
+            for doc in block[overlap >= min_overlap].tolist():
+                if doc in exclude:
+                    continue
+                checked += 1
+                distance = substring_edit_distance(query, self.titles[doc])
+                if distance <= max_distance:
+                    scored.append((distance, doc))
+                    if len(scored) >= limit:
+                        break
+                if checked >= FUZZY_CANDIDATES:
+                    break
+            if len(scored) >= limit or checked >= FUZZY_CANDIDATES:
+                break
+        scored.sort()
+        return [doc for _, doc in scored]
@@ -0,0 +1,389 @@
+"""
+离线回放压测
+
+按设定的并发数或到达速率回放一组问题，经过与 home.py 相同的 RAGService 查询流程
+（向量化 → 检索 → 流式回答 → 知识图谱抽取），后端可替换为本地替身：
+- FakeOllamaServer：本地 HTTP 服务，模拟 Ollama /api/chat 的流式输出，
+  可设定首个token延迟、token速率、并行生成数和出错概率
+- InMemoryVectorStore：内存向量库，提供与 MilvusClient.search 相同的接口
+- HashingEmbedder：字符n-gram哈希向量，无需加载嵌入模型
+
+每个请求的追踪记录写入 --trace-out，结束时输出吞吐、失败率和各阶段 p50/p95/p99；
+设置 --max-p99-ms / --max-error-rate 时超出阈值以非零状态退出，可用于 CI。
+
+用法:
+    python loadtest.py --requests 200 --concurrency 8
+    python loadtest.py --rate 5 --duration 60 --token-rate 40 --ollama-parallel 2
+    python loadtest.py --questions questions.txt --store milvus --milvus-uri ./loadtest.db
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ask_llm import OllamaAPI
+from insert import split_text
+from kg_build import DEFAULT_CONTENT_PATH
+from kg_db import KnowledgeGraphDB
+from kg_layout import DEFAULT_KG_PATH
+from kp_search import TOPIC_PREFIX
+from rag_service import RAGService
+from tracing import finish_trace, iter_records, start_trace, summarize
+
+LOADTEST_COLLECTION = "loadtest_chunks"
+
+class HashingEmbedder:
+    """把字符单字和双字哈希到固定维度并归一化，相近文本得到相近向量"""
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def __call__(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        grams = list(text) + [text[i:i + 2] for i in range(len(text) - 1)]
+        for gram in grams:
+            vector[zlib.crc32(gram.encode("utf-8")) % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+class InMemoryVectorStore:
+    """按余弦相似度暴力检索的内存向量库，接口与 MilvusClient 的 insert/search 一致"""
+
+    def __init__(self):
+        self.collections: Dict[str, Dict] = {}
+
+    def insert(self, collection_name: str, data: List[Dict]) -> Dict:
+        collection = self.collections.setdefault(collection_name, {"vectors": [], "rows": []})
+        for row in data:
+            vector = np.asarray(row["vector"], dtype=np.float32)
+            collection["vectors"].append(vector / (np.linalg.norm(vector) or 1.0))
+            fields = {key: value for key, value in row.items() if key != "vector"}
+            fields["id"] = len(collection["rows"])
+            collection["rows"].append(fields)
+        collection["matrix"] = np.vstack(collection["vectors"])
+        return {"insert_count": len(data)}
+
+    def search(self, collection_name: str, data: List, limit: int = 10,
+               search_params: Optional[Dict] = None, output_fields: Optional[List[str]] = None, **kwargs) -> List[List[Dict]]:
+        collection = self.collections[collection_name]
+        results = []
+        for query in data:
+            query = np.asarray(query, dtype=np.float32)
+            scores = collection["matrix"] @ (query / (np.linalg.norm(query) or 1.0))
+            top = np.argpartition(-scores, min(limit, len(scores)) - 1)[:limit]
+            top = top[np.argsort(-scores[top])]
+            hits = []
+            for index in top:
+                row = collection["rows"][index]
+                entity = {field: row[field] for field in (output_fields or []) if field in row}
+                hits.append({"id": row["id"], "distance": float(scores[index]), "entity": entity})
+            results.append(hits)
+        return results
+
+class FakeOllamaServer:
+    """
+    模拟 Ollama /api/chat 的本地 HTTP 服务
+
+    流式请求：等待 ttft 秒后按 token_rate 逐个输出回答（取自上下文内容），最后一条消息带
+    eval_count/eval_duration；非流式请求（知识图谱抽取）等待 kg_latency 秒后返回由回答
+    生成的实体关系 JSON。parallel 限制同时生成的请求数，其余请求排队，与 Ollama 的
+    OLLAMA_NUM_PARALLEL 行为一致。error_rate 概率返回错误，用于触发抽取重试。
+    """
+
+    def __init__(self, token_rate: float = 50.0, ttft: float = 0.2, answer_tokens: int = 200,
+                 kg_latency: float = 0.5, parallel: int = 4, error_rate: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.token_rate = token_rate
+        self.ttft = ttft
+        self.answer_tokens = answer_tokens
+        self.kg_latency = kg_latency
+        self.error_rate = error_rate
+        self.slots = threading.Semaphore(parallel)
+        self.random = random.Random(0)
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _answer_tokens(self, prompt: str) -> List[str]:
+        text = re.sub(r"\s+", "", prompt) or "回答"
+        tokens = [text[i:i + 2] for i in range(0, len(text), 2)]
+        return [tokens[i % len(tokens)] for i in range(self.answer_tokens)]
+
+    @staticmethod
+    def _kg_content(text: str) -> str:
+        phrases = [p for p in re.split(r"[，。；：、,.;:\s]+", text) if p][:5]
+        entities = [
+            {"id": f"entity_{i + 1}", "label": phrase[:8], "type": "概念"}
+            for i, phrase in enumerate(phrases)
+        ]
+        relations = [
+            {"from": entities[i]["id"], "to": entities[i + 1]["id"], "label": "相关"}
+            for i in range(len(entities) - 1)
+        ]
+        return json.dumps({"entities": entities, "relations": relations}, ensure_ascii=False)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if not payload.get("messages"):
+                    # 预加载模型的请求（见 OllamaAPI.preload）
+                    self._send_json(200, {"model": payload.get("model"), "done": True,
+                                          "done_reason": "load", "load_duration": 0})
+                    return
+                prompt = payload["messages"][-1]["content"]
+                with fake.slots:
+                    try:
+                        if fake.random.random() < fake.error_rate:
+                            self._send_json(500, {"error": "fake ollama error"})
+                        elif payload.get("stream"):
+                            self._stream(prompt)
+                        else:
+                            time.sleep(fake.kg_latency)
+                            self._send_json(200, {
+                                "model": payload.get("model"),
+                                "message": {"role": "assistant", "content": fake._kg_content(prompt)},
+                                "done": True
+                            })
+                    except (BrokenPipeError, ConnectionResetError):
+                        # 客户端提前断开（如取消生成），与 Ollama 一样直接结束
+                        pass
+
+            def _send_json(self, status: int, body: Dict) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, prompt: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                time.sleep(fake.ttft)
+                start = time.perf_counter()
+                tokens = fake._answer_tokens(prompt)
+                for token in tokens:
+                    line = {"message": {"role": "assistant", "content": token}, "done": False}
+                    self.wfile.write(json.dumps(line, ensure_ascii=False).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                    time.sleep(1 / fake.token_rate)
+                done = {
+                    "message": {"role": "assistant", "content": ""},
+                    "done": True,
+                    "eval_count": len(tokens),
+                    "eval_duration": int((time.perf_counter() - start) * 1e9)
+                }
+                self.wfile.write(json.dumps(done).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+        return Handler
+
+def load_questions(path: Optional[str]) -> List[str]:
+    """
+    读取问题集：.jsonl 文件取每行的 question 字段（追踪记录需开启 RAG_TRACE_QUESTIONS），
+    其他文件每行一个问题；未指定时由 kg_data.json 中的知识点生成
+    """
+    if path is None:
+        with open(DEFAULT_KG_PATH, "r", encoding="utf-8") as f:
+            kg_data = json.load(f)
+        return [
+            f"请解释{TOPIC_PREFIX.sub('', entity['label'])}"
+            for entity in kg_data["entities"] if entity["type"] == "知识点"
+        ]
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("question"):
+                    questions.append(record["question"])
+            else:
+                questions.append(line)
+    return questions
+
+def build_store(kind: str, embed, content_path: str, milvus_uri: Optional[str]):
+    chunks = split_text(open(content_path, "r", encoding="utf-8").read())
+    data = [{"vector": embed(chunk), "text": chunk, "chunk": i} for i, chunk in enumerate(chunks)]
+    if kind == "memory":
+        store = InMemoryVectorStore()
+    else:
+        from milvus_utils import create_collection, get_milvus_client
+        store = get_milvus_client(uri=milvus_uri)
+        create_collection(store, LOADTEST_COLLECTION, dim=len(data[0]["vector"]))
+    store.insert(collection_name=LOADTEST_COLLECTION, data=data)
+    return store, len(chunks)
+
+def run_load(service: RAGService, questions: List[str], trace_path: str, concurrency: int,
+             total: int, rate: float = 0.0, duration: float = 0.0, seed: int = 0) -> float:
+    """
+    回放问题集，返回实际耗时（秒）
+
+    rate > 0 时为开环压测：按泊松过程到达，排队等待线程的时间记为 queue 阶段；
+    否则为闭环压测：concurrency 个线程依次发送 total 个请求。
+    """
+    rng = random.Random(seed)
+
+    def job(question: str, scheduled: Optional[float]) -> None:
+        trace = start_trace(question_chars=len(question), loadtest=True)
+        if trace is not None and scheduled is not None:
+            trace.add_span("queue", (time.perf_counter() - scheduled) * 1000)
+        try:
+            service.query(question)
+        except Exception as e:
+            finish_trace(trace, status="error", error=str(e), path=trace_path)
+        else:
+            finish_trace(trace, path=trace_path)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        if rate > 0:
+            deadline = start + duration if duration else None
+            sent = 0
+            next_at = start
+            while (deadline is None and sent < total) or (deadline is not None and next_at < deadline):
+                delay = next_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(job, rng.choice(questions), next_at)
+                sent += 1
+                next_at += rng.expovariate(rate)
+        else:
+            for i in range(total):
+                pool.submit(job, questions[i % len(questions)], None)
+    return time.perf_counter() - start
+
+def report(records: List[Dict], elapsed: float) -> Dict:
+    errors = sum(1 for record in records if record["status"] != "ok")
+    return {
+        "requests": len(records),
+        "errors": errors,
+        "error_rate": errors / len(records) if records else 0.0,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(records) / elapsed, 3) if elapsed else 0.0,
+        "stages": summarize(records),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG查询流程离线回放压测")
+    parser.add_argument("--questions", help="问题集（.txt每行一个，或含question字段的.jsonl）")
+    parser.add_argument("--requests", type=int, default=100, help="闭环压测的请求总数")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=0.0, help="开环压测的到达速率（请求/秒），0为闭环")
+    parser.add_argument("--duration", type=float, default=0.0, help="开环压测持续时间（秒），0时发送--requests个请求")
+    parser.add_argument("--embed", choices=["hash", "model"], default="hash", help="hash为哈希向量，model为bge模型")
+    parser.add_argument("--store", choices=["memory", "milvus"], default="memory")
+    parser.add_argument("--milvus-uri", default="./loadtest.db", help="--store milvus 时的地址（本地.db路径即Milvus Lite）")
+    parser.add_argument("--ollama-url", help="使用真实Ollama服务，不指定时启动本地替身")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="替身每秒输出的token数")
+    parser.add_argument("--ttft", type=float, default=0.2, help="替身首个token延迟（秒）")
+    parser.add_argument("--answer-tokens", type=int, default=200)
+    parser.add_argument("--kg-latency", type=float, default=0.5, help="替身知识图谱抽取耗时（秒）")
+    parser.add_argument("--ollama-parallel", type=int, default=4, help="替身同时生成的请求数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="替身返回错误的概率")
+    parser.add_argument("--trace-out", default="loadtest_traces.jsonl")
+    parser.add_argument("--json", help="把汇总结果写入JSON文件")
+    parser.add_argument("--max-p99-ms", type=float, help="总耗时p99超过该值时以非零状态退出")
+    parser.add_argument("--max-error-rate", type=float, help="失败率超过该值时以非零状态退出")
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    if not questions:
+        sys.exit("问题集为空")
+
+    if args.embed == "hash":
+        embed = HashingEmbedder()
+    else:
+        from encoder import emb_text as embed
+    store, chunk_count = build_store(args.store, embed, DEFAULT_CONTENT_PATH, args.milvus_uri)
+
+    fake = None
+    if args.ollama_url:
+        base_url = args.ollama_url
+    else:
+        fake = FakeOllamaServer(
+            token_rate=args.token_rate, ttft=args.ttft, answer_tokens=args.answer_tokens,
+            kg_latency=args.kg_latency, parallel=args.ollama_parallel, error_rate=args.error_rate
+        ).start()
+        base_url = fake.base_url
+
+    if os.path.exists(args.trace_out):
+        os.remove(args.trace_out)
+    kg_dir = tempfile.mkdtemp(prefix="loadtest_kg_")
+    service = RAGService(
+        embed=embed,
+        store=store,
+        llm=OllamaAPI(base_url),
+        kg_db=KnowledgeGraphDB(os.path.join(kg_dir, "kg_history.db")),
+        collection_name=LOADTEST_COLLECTION,
+        max_workers=args.concurrency
+    )
+    print(f"问题数: {len(questions)}，文档块: {chunk_count}，Ollama: {base_url}")
+
+    try:
+        elapsed = run_load(service, questions, args.trace_out, args.concurrency,
+                           args.requests, args.rate, args.duration)
+    finally:
+        if fake is not None:
+            fake.stop()
+
+    result = report(list(iter_records(args.trace_out)), elapsed)
+    print(f"请求数: {result['requests']}，失败: {result['errors']}（{result['error_rate']:.1%}），"
+          f"耗时 {result['elapsed_s']:.1f} s，吞吐 {result['throughput_rps']:.2f} 请求/秒")
+    print(f"{'阶段/指标':<22} {'count':>7} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for name, stats in result["stages"].items():
+        print(f"{name:<24} {stats['count']:>7} {stats['p50']:>10.1f} "
+              f"{stats['p95']:>10.1f} {stats['p99']:>10.1f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    failures = []
+    total = result["stages"].get("total")
+    if args.max_p99_ms is not None and total and total["p99"] > args.max_p99_ms:
+        failures.append(f"总耗时p99 {total['p99']:.1f} ms 超过 {args.max_p99_ms} ms")
+    if args.max_error_rate is not None and result["error_rate"] > args.max_error_rate:
+        failures.append(f"失败率 {result['error_rate']:.1%} 超过 {args.max_error_rate:.1%}")
+    if failures:
+        sys.exit("；".join(failures))
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,29 @@
-from pymilvus import MilvusClient
+from typing import Optional
+
+from pymilvus import DataType, MilvusClient
+
+from compact_vectors import RERANK_CANDIDATES, FullVectorStore, encode_vector
+
+# 紧凑模式的向量字段类型、索引和检索参数（见 compact_vectors.py）
+COMPACT_VECTOR_TYPES = {
+    "float16": DataType.FLOAT16_VECTOR,
+    "binary": DataType.BINARY_VECTOR,
+}
+COMPACT_INDEX_PARAMS = {
+    "float16": {"metric_type": "COSINE", "index_type": "HNSW", "params": {"M": 16, "efConstruction": 200}},
+    "binary": {"metric_type": "HAMMING", "index_type": "BIN_IVF_FLAT", "params": {"nlist": 128}},
+}
+COMPACT_SEARCH_PARAMS = {
+    "float16": {"metric_type": "COSINE", "params": {"ef": 64}},
+    "binary": {"metric_type": "HAMMING", "params": {"nprobe": 32}},
+}
 
 def get_milvus_client(uri: str, token: str = None) -> MilvusClient:
     return MilvusClient(uri=uri, token=token)
 
 def create_collection(
-    milvus_client: MilvusClient, collection_name: str, dim: int, drop_old: bool = True
+    milvus_client: MilvusClient, collection_name: str, dim: int, drop_old: bool = True,
+    vector_mode: str = "float"
 ):
     if milvus_client.has_collection(collection_name) and drop_old:
         milvus_client.drop_collection(collection_name)
@@ -12,6 +31,8 @@ def create_collection(
         raise RuntimeError(
             f"Collection {collection_name} already exists. Set drop_old=True to create a new one instead."
         )
+    if vector_mode != "float":
+        return create_compact_collection(milvus_client, collection_name, dim, vector_mode)
     index_params = {
         "metric_type": "COSINE",
         "index_type": "HNSW",
@@ -28,7 +49,28 @@ def create_collection(
         auto_id=True,
     )
 
-def get_search_results(milvus_client, collection_name, query_vector, output_fields):
+def create_compact_collection(milvus_client: MilvusClient, collection_name: str, dim: int, vector_mode: str):
+    """与默认集合字段相同（id、vector、动态字段），另有 row 字段记录全精度向量的行号"""
+    schema = MilvusClient.create_schema(auto_id=True, enable_dynamic_field=True)
+    schema.add_field("id", DataType.INT64, is_primary=True)
+    schema.add_field("vector", COMPACT_VECTOR_TYPES[vector_mode], dim=dim)
+    schema.add_field("row", DataType.INT64)
+    index_params = milvus_client.prepare_index_params()
+    index_params.add_index(field_name="vector", **COMPACT_INDEX_PARAMS[vector_mode])
+    return milvus_client.create_collection(
+        collection_name=collection_name,
+        schema=schema,
+        index_params=index_params,
+        consistency_level="Eventually",
+    )
+
+def get_search_results(milvus_client, collection_name, query_vector, output_fields,
+                       vector_mode: str = "float", full_vectors: Optional[FullVectorStore] = None,
+                       limit: int = 3):
+    if vector_mode != "float":
+        return get_compact_search_results(
+            milvus_client, collection_name, query_vector, output_fields, vector_mode, full_vectors, limit
+        )
     search_params = {
         "metric_type": "COSINE",
         "params": {
@@ -38,8 +80,22 @@ def get_search_results(milvus_client, collection_name, query_vector, output_fiel
     search_res = milvus_client.search(
         collection_name=collection_name,
         data=[query_vector],
-        limit=3,
+        limit=limit,
         search_params=search_params,
         output_fields=output_fields,
     )
     return search_res
+
+def get_compact_search_results(milvus_client, collection_name, query_vector, output_fields,
+                               vector_mode: str, full_vectors: Optional[FullVectorStore], limit: int = 3):
+    """按量化向量取候选集，有全精度向量时精确重排，返回格式与 get_search_results 相同"""
+    search_res = milvus_client.search(
+        collection_name=collection_name,
+        data=[encode_vector(query_vector, vector_mode)],
+        limit=max(limit, RERANK_CANDIDATES) if full_vectors is not None else limit,
+        search_params=COMPACT_SEARCH_PARAMS[vector_mode],
+        output_fields=list(output_fields) + ["row"],
+    )
+    if full_vectors is None:
+        return search_res
+    return [full_vectors.rerank(query_vector, hits, limit) for hits in search_res]
@@ -2,54 +2,41 @@ import streamlit as st
 import json
 from typing import Dict, List
 import os
-import re
+
+from content_index import ContentIndex
+from courses import MAX_CACHED_COURSES, load_courses
+from kp_search import KnowledgePointIndex
+from render import display_content_with_images
 
 # 初始化
 st.set_page_config(layout="wide", page_title="knowledge_point")
 
-# 加载图谱数据
-@st.cache_resource
-def load_kg_data() -> Dict:
-    kg_path = os.path.join(os.path.dirname(__file__), "kg_data.json")
+# 加载知识点搜索索引，按课程 kg_data.json 的路径和修改时间缓存，图谱重建后自动重建索引
+@st.cache_resource(max_entries=MAX_CACHED_COURSES)
+def load_search_index(kg_path: str, mtime: float) -> KnowledgePointIndex:
     with open(kg_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        return KnowledgePointIndex.from_kg_data(json.load(f))
 
-# 加载原文内容
-@st.cache_resource
-def load_wz_content() -> str:
-    parent_dir = os.path.dirname(os.path.dirname(__file__))
-    wz_path = os.path.join(parent_dir, "wz.md")
-    with open(wz_path, "r", encoding="utf-8") as f:
-        return f.read()
+# 加载原文偏移索引，按正文路径和修改时间缓存，正文变化后自动重建
+@st.cache_resource(max_entries=MAX_CACHED_COURSES)
+def load_content_index(content_path: str, mtime: float) -> ContentIndex:
+    return ContentIndex(content_path)
 
-# 知识点搜索
-def search_knowledge_points(kg_data: Dict, query: str) -> List[Dict]:
-    return [entity for entity in kg_data["entities"] 
-            if entity["type"] == "知识点" and query.lower() in entity["label"].lower()]
+# 知识点搜索，按相关度排序并容忍错别字
+def search_knowledge_points(search_index: KnowledgePointIndex, query: str) -> List[Dict]:
+    return list(search_index.search(query, limit=5))
 
 # 获取知识点内容
-def get_knowledge_point_content(wz_content: str, point_label: str) -> str:
-    pattern = rf"#### {re.escape(point_label)}(.*?)(?=\n#### |\Z)"
-    match = re.search(pattern, wz_content, re.DOTALL)
-    return match.group(1).strip() if match else "未找到相关内容"
-
-def display_content_with_images(text: str) -> None:
-    """显示包含图片的文本内容"""
-    pattern = r'!\[(.*?)\]\((images/.*?)\)'
-    parts = re.split(pattern, text)
-    
-    for i in range(0, len(parts), 3):
-        if parts[i]:
-            st.write(parts[i])
-        if i + 2 < len(parts):
-            image_path = parts[i + 2]
-            if os.path.exists(image_path):
-                st.image(image_path, caption=parts[i + 1])
+def get_knowledge_point_content(content_index: ContentIndex, point_label: str) -> str:
+    content = content_index.get(point_label)
+    return content if content is not None else "未找到相关内容"
 
 # 主页面
 def main():
-    kg_data = load_kg_data()
-    wz_content = load_wz_content()
+    courses = load_courses()
+    if not courses:
+        st.error("没有可用的课程")
+        return
     
     # 页面布局
     st.markdown("""
@@ -60,12 +47,21 @@ def main():
     left_col, right_col = st.columns([1, 3])
     
     with left_col:
+        course = next(iter(courses.values()))
+        if len(courses) > 1:
+            course = courses[st.selectbox("课程", list(courses), format_func=lambda c: courses[c].title)]
+        if not os.path.exists(course.kg_path):
+            st.warning("该课程的知识图谱尚未构建，请运行 python courses.py build")
+            return
+        search_index = load_search_index(course.kg_path, os.path.getmtime(course.kg_path))
+        content_index = load_content_index(course.content_path, os.path.getmtime(course.content_path))
+
         # 搜索栏
         search_query = st.text_input("搜索知识点", "", placeholder="输入知识点名称...")
         
         # 搜索建议
         if search_query:
-            suggestions = [p["label"] for p in search_knowledge_points(kg_data, search_query)]
+            suggestions = [p["label"] for p in search_knowledge_points(search_index, search_query)]
             if suggestions:
                 st.markdown("**搜索建议：**")
                 for suggestion in suggestions[:5]:
@@ -75,12 +71,12 @@ def main():
     with right_col:
         # 显示选中的知识点
         if search_query:
-            points = search_knowledge_points(kg_data, search_query)
+            points = search_knowledge_points(search_index, search_query)
             if points:
                 point = points[0]
                 # 展示内容
                 with st.expander(f"知识点详情：{point['label']}", expanded=True):
-                    content = get_knowledge_point_content(wz_content, point["label"])
+                    content = get_knowledge_point_content(content_index, point["label"])
                     display_content_with_images(content)
             else:
                 st.info("未找到相关知识点")
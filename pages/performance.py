@@ -0,0 +1,128 @@
+import streamlit as st
+import pandas as pd
+from typing import List, Tuple, Dict
+
+from ask_llm import OllamaAPI
+from tracing import TRACE_ENABLED, TRACE_PATH, TraceAggregator
+
+# 初始化
+st.set_page_config(layout="wide", page_title="performance")
+
+STAGES = ["total", "embed", "route", "search", "context", "llm_ttft", "llm_stream", "kg_extract",
+          "render_retrieval", "render_graph"]
+STAGE_NAMES = {
+    "total": "总耗时",
+    "embed": "向量化",
+    "route": "课程路由",
+    "search": "向量检索",
+    "context": "上下文构建",
+    "llm_ttft": "首个token",
+    "llm_stream": "流式生成",
+    "kg_extract": "图谱抽取",
+    "render_retrieval": "检索结果渲染",
+    "render_graph": "图谱渲染",
+}
+CACHE_NAMES = {"embed": "向量化缓存", "kg": "图谱抽取缓存"}
+WINDOWS = {"最近15分钟": 15, "最近1小时": 60, "最近6小时": 360, "最近24小时": 1440}
+
+# 聚合器在所有会话间共享，每次刷新只读取日志新增的部分
+@st.cache_resource
+def get_aggregator(path: str) -> TraceAggregator:
+    return TraceAggregator(path)
+
+def to_frame(rows: List[Tuple[int, Dict[str, float]]], columns: List[str] = None) -> pd.DataFrame:
+    frame = pd.DataFrame(
+        [values for _, values in rows],
+        index=pd.to_datetime([minute * 60 for minute, _ in rows], unit="s", utc=True).tz_convert(None)
+    )
+    if columns is not None:
+        frame = frame[[c for c in columns if c in frame.columns]]
+    return frame
+
+def main():
+    st.markdown("""
+        <h3 style="text-align: center;">系统性能监控</h3>
+    """, unsafe_allow_html=True)
+
+    if not TRACE_ENABLED:
+        st.info("请求追踪已关闭（RAG_TRACE=0），以下仅显示已有记录")
+
+    aggregator = get_aggregator(TRACE_PATH)
+    aggregator.poll()
+
+    cols = st.columns([2, 2, 1])
+    with cols[0]:
+        window = WINDOWS[st.selectbox("时间范围", list(WINDOWS), index=1)]
+    with cols[1]:
+        p = st.radio("百分位", [50, 95, 99], index=1, horizontal=True, format_func=lambda v: f"p{v}")
+    with cols[2]:
+        st.button("刷新", use_container_width=True)
+
+    totals = aggregator.totals(window)
+    if not totals.requests:
+        st.info(f"所选时间范围内没有请求记录（{TRACE_PATH}）")
+        return
+
+    extractions = totals.hits.get("kg", [0, 0])[1] - totals.hits.get("kg", [0, 0])[0]
+    metric_cols = st.columns(5)
+    metric_cols[0].metric("请求数", totals.requests)
+    metric_cols[1].metric("失败率", f"{totals.errors / totals.requests:.1%}")
+    total_p = totals.histograms["total"].percentile(p)
+    metric_cols[2].metric(f"总耗时 p{p}", f"{total_p / 1000:.2f} s")
+    metric_cols[3].metric(
+        "图谱抽取重试/失败",
+        f"{totals.counters.get('kg_retries', 0):.0f} / {totals.counters.get('kg_failures', 0):.0f}",
+        help=f"共调用LLM抽取 {extractions} 次"
+    )
+    metric_cols[4].metric(
+        "Ollama 当前排队",
+        OllamaAPI.in_flight(),
+        help=f"时间范围内单个请求观察到的最大并发: {totals.gauges.get('ollama_in_flight', 0):.0f}"
+    )
+
+    st.markdown(f"**各阶段耗时 p{p}（毫秒，按分钟）**")
+    stages = st.multiselect(
+        "阶段", STAGES, default=["total", "embed", "search", "llm_ttft", "kg_extract"],
+        format_func=lambda name: STAGE_NAMES.get(name, name), label_visibility="collapsed"
+    )
+    series = to_frame(aggregator.series(window, p), stages)
+    st.line_chart(series.rename(columns=STAGE_NAMES))
+
+    left_col, right_col = st.columns(2)
+    rates = to_frame(aggregator.rates(window))
+    with left_col:
+        st.markdown("**缓存命中率**")
+        hit_columns = [c for c in rates.columns if c.endswith("_hit_rate")]
+        if hit_columns:
+            st.line_chart(rates[hit_columns].rename(
+                columns=lambda c: CACHE_NAMES.get(c[:-len("_hit_rate")], c)
+            ))
+            st.dataframe(pd.DataFrame([
+                {"缓存": CACHE_NAMES.get(name, name), "命中": hits, "总数": total, "命中率": f"{hits / total:.1%}"}
+                for name, (hits, total) in totals.hits.items()
+            ]), hide_index=True, use_container_width=True)
+        else:
+            st.info("暂无缓存命中记录")
+    with right_col:
+        st.markdown("**失败率、图谱抽取重试与 Ollama 并发**")
+        st.line_chart(rates[[c for c in ("error_rate", "kg_retries", "kg_failures", "ollama_in_flight")
+                             if c in rates.columns]])
+
+    st.markdown("**各阶段汇总**")
+    st.dataframe(pd.DataFrame([
+        {
+            "阶段/指标": STAGE_NAMES.get(name, name),
+            "次数": histogram.count,
+            "p50": histogram.percentile(50),
+            "p95": histogram.percentile(95),
+            "p99": histogram.percentile(99),
+        }
+        for name, histogram in sorted(
+            totals.histograms.items(),
+            key=lambda item: STAGES.index(item[0]) if item[0] in STAGES else len(STAGES)
+        )
+    ]).round(1), hide_index=True, use_container_width=True)
+    st.caption(f"已读取 {aggregator.lines_read} 条记录，日志偏移 {aggregator.offset} 字节")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+有界队列连接的多阶段流水线
+
+每个阶段是一个把输入迭代器变换为输出迭代器的生成器函数，在单独的线程中运行，相邻阶段之间
+用容量为 queue_size 的队列连接：下游处理不过来时上游阻塞在写队列处，同时在内存中的数据量
+不超过各队列容量之和，与输入规模无关。某个阶段出错或主线程被中断时，所有阶段尽快停止，
+错误在 run_pipeline 中重新抛出。
+
+每个阶段统计产出数量（默认按 len 计数，即每批的条数）、处理耗时、等待上游和等待下游的耗时，用于定位瓶颈：等待上游多说明上游慢，等待下游多说明下游慢。
+"""
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+# 队列中表示上游已结束
+_END = object()
+# 阻塞读写队列时检查停止标志的间隔（秒）
+_POLL_INTERVAL = 0.1
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.wait_in_s = 0.0
+        self.wait_out_s = 0.0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def elapsed_s(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def busy_s(self) -> float:
+        return max(self.elapsed_s - self.wait_in_s - self.wait_out_s, 0.0)
+
+    @property
+    def throughput(self) -> float:
+        """每秒产出数量"""
+        return self.items / self.elapsed_s if self.elapsed_s else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.name:<8} {self.items:>9} {self.throughput:>10.1f}/s "
+                f"处理 {self.busy_s:>7.1f} s  等待上游 {self.wait_in_s:>7.1f} s  等待下游 {self.wait_out_s:>7.1f} s")
+
+# (名称, 生成器函数) 或 (名称, 生成器函数, 计数函数)
+Stage = Union[Tuple[str, Callable[[Iterator], Iterator]], Tuple[str, Callable[[Iterator], Iterator], Callable]]
+
+def run_pipeline(
+    stages: List[Stage],
+    queue_size: int = 4,
+    on_progress: Optional[Callable[[List[StageStats]], None]] = None,
+    progress_interval: float = 10
+) -> List[StageStats]:
+    """
+    运行流水线直到最后一个阶段结束
+
+    Args:
+        stages: 阶段列表；第一个阶段的输入为空迭代器，最后一个阶段的产出被丢弃
+        queue_size: 每个队列的容量（批数）
+        on_progress: 运行期间每隔 progress_interval 秒调用一次
+    Returns:
+        各阶段的统计
+    """
+    stats = [StageStats(stage[0]) for stage in stages]
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def get(q: queue.Queue, stage_stats: StageStats) -> Iterator:
+        while True:
+            start = time.perf_counter()
+            while True:
+                if stop.is_set():
+                    return
+                try:
+                    item = q.get(timeout=_POLL_INTERVAL)
+                    break
+                except queue.Empty:
+                    continue
+            stage_stats.wait_in_s += time.perf_counter() - start
+            if item is _END:
+                return
+            yield item
+
+    def put(q: queue.Queue, item, stage_stats: Optional[StageStats]) -> bool:
+        start = time.perf_counter()
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=_POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        if stage_stats is not None:
+            stage_stats.wait_out_s += time.perf_counter() - start
+        return not stop.is_set()
+
+    def run(index: int) -> None:
+        _, fn, *rest = stages[index]
+        count = rest[0] if rest else len
+        stage_stats = stats[index]
+        stage_stats.started_at = time.perf_counter()
+        items = get(queues[index - 1], stage_stats) if index else iter(())
+        try:
+            for item in fn(items):
+                stage_stats.items += count(item)
+                if not put(queues[index], item, stage_stats):
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            stage_stats.finished_at = time.perf_counter()
+            put(queues[index], _END, None)
+
+    threads = [
+        threading.Thread(target=run, args=(i,), name=f"pipeline-{stage[0]}", daemon=True)
+        for i, stage in enumerate(stages)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        last_report = time.perf_counter()
+        # 取走最后一个阶段的产出，使其不被队列阻塞
+        while not stop.is_set():
+            try:
+                item = queues[-1].get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                item = None
+            if item is _END:
+                break
+            if on_progress is not None and time.perf_counter() - last_report >= progress_interval:
+                on_progress(stats)
+                last_report = time.perf_counter()
+    except BaseException:
+        # 中断（如 Ctrl+C）时通知各阶段停止，已写入的检查点保证可以继续
+        stop.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return stats
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,81 @@
+"""
+RAG 查询服务客户端
+
+设置 RAG_API_URL 后，Streamlit 页面通过本客户端调用 api_server.py，接口与
+RAGService.query_events 一致，页面代码无需区分本地执行还是远程调用。
+"""
+import json
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+class RemoteRAGService:
+    def __init__(self, base_url: str, timeout: float = 300):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        # 复用连接，避免每次查询重新建立TCP连接
+        self.session = requests.Session()
+
+    def _headers(self, request_id: Optional[str]) -> Dict[str, str]:
+        return {"X-Request-ID": request_id} if request_id else {}
+
+    def warm_up(self, timeout: float = 300, interval: float = 1) -> str:
+        """等待服务端预热完成（模型、集合和 Ollama 均由服务端加载）"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                response = self.session.get(f"{self.base_url}/ready", timeout=10)
+                status = response.json()
+            except (requests.RequestException, ValueError):
+                status = None
+            if status is not None:
+                if status["ready"]:
+                    return "查询服务已就绪"
+                if status["done"]:
+                    failed = {name: task.get("error") for name, task in status["tasks"].items()
+                              if task["state"] == "error"}
+                    raise RuntimeError(f"查询服务预热失败: {failed}")
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"查询服务 {timeout:.0f} 秒内未就绪")
+            time.sleep(interval)
+
+    def course_list(self) -> List[Dict]:
+        response = self.session.get(f"{self.base_url}/api/courses", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()["courses"]
+
+    def retrieve(self, question: str, request_id: Optional[str] = None,
+                 course: Optional[str] = None) -> List[Dict]:
+        response = self.session.post(
+            f"{self.base_url}/api/search", json={"question": question, "course": course},
+            headers=self._headers(request_id), timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["hits"]
+
+    def query_events(self, question: str, with_kg: bool = True, request_id: Optional[str] = None,
+                     course: Optional[str] = None) -> Iterator[Tuple[str, object]]:
+        """读取服务端的 server-sent events，事件与 RAGService.query_events 相同"""
+        with self.session.post(
+            f"{self.base_url}/api/query", json={"question": question, "kg": with_kg, "course": course},
+            headers=self._headers(request_id), stream=True, timeout=self.timeout
+        ) as response:
+            response.raise_for_status()
+            event, data = None, []
+            # 只按换行符分行，回答中的 \u2028 等字符不应被当作行分隔
+            for raw in response.iter_lines(delimiter=b"\n"):
+                line = raw.decode("utf-8").rstrip("\r")
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    data.append(line[len("data:"):].strip())
+                elif not line and event:
+                    payload = json.loads("\n".join(data)) if data else None
+                    if event == "error":
+                        raise RuntimeError(f"查询服务出错: {payload['message']}")
+                    if event == "token":
+                        payload = payload["content"]
+                    if event != "done":
+                        yield event, payload
+                    event, data = None, []
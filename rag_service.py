@@ -0,0 +1,276 @@
+"""
+RAG 查询流程
+
+向量化 → 选择课程 → 向量检索 → 构建上下文 → 流式生成回答 → 抽取知识图谱。
+向量化函数、向量库客户端、LLM 客户端和图谱存储均可注入，默认使用
+encoder.emb_text、Milvus、Ollama 和 kg_history.db；压测时可替换为本地替身（见 loadtest.py）。
+多课程时每门课程有独立的集合，未指定课程时按质心选择（见 courses.py）。
+各阶段耗时记录在当前请求的追踪中（见 tracing.py）。
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from ask_llm import OllamaAPI, stream_llm_answer, extract_kg_from_text
+from compact_vectors import FullVectorStore, hamming_similarity, open_full_vectors
+from courses import DEFAULT_COURSE_ID, Course, CourseRouter, default_course
+from kg_db import KnowledgeGraphDB
+from milvus_utils import get_milvus_client, get_search_results
+from tracing import current_trace, set_metric, span
+
+load_dotenv()
+COLLECTION_NAME = os.getenv("COLLECTION_NAME")
+MILVUS_ENDPOINT = os.getenv("MILVUS_ENDPOINT")
+MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+KG_DB_PATH = os.getenv("KG_DB_PATH", "kg_history.db")
+VECTOR_MODE = os.getenv("VECTOR_MODE", "float")
+SEARCH_LIMIT = 3
+
+def default_embed(text: str) -> List[float]:
+    # 延迟导入，替换向量化函数时无需加载嵌入模型
+    from encoder import emb_text
+    return emb_text(text)
+
+def chunk_ref(hit: Dict) -> str:
+    """重新入库后不变的文档块标识：课程ID与文档块在正文中的序号（未记录序号的旧数据用主键）"""
+    chunk = hit.get("chunk")
+    return f"{hit['course']}:{hit['id'] if chunk is None else chunk}"
+
+class RAGService:
+    def __init__(
+        self,
+        embed: Optional[Callable[[str], List[float]]] = None,
+        store=None,
+        llm: Optional[OllamaAPI] = None,
+        kg_db: Optional[KnowledgeGraphDB] = None,
+        collection_name: Optional[str] = COLLECTION_NAME,
+        max_workers: int = 8,
+        embed_cache: Optional[Dict] = None,
+        vector_mode: str = VECTOR_MODE,
+        full_vectors: Optional[FullVectorStore] = None,
+        courses: Optional[Dict[str, Course]] = None,
+        router: Optional[CourseRouter] = None
+    ):
+        """
+        Args:
+            embed: 文本向量化函数
+            store: 提供 MilvusClient.search 接口的向量库客户端，默认在首次使用时连接 Milvus
+            llm: OllamaAPI 或兼容接口的客户端
+            kg_db: 知识图谱存储，用于复用已抽取过的图谱
+            collection_name: 向量集合名称，未提供 courses 时作为唯一课程的集合
+            embed_cache: 向量化函数使用的缓存，提供时记录缓存命中情况
+            vector_mode: 集合的向量存储方式（见 compact_vectors.py）
+            full_vectors: collection_name 在紧凑模式下用于重排的全精度向量，默认按集合名称查找
+            courses: 课程ID到课程的映射（见 courses.load_courses），每门课程检索各自的集合
+            router: 未指定课程时选择课程，默认按 courses 的质心
+        """
+        self.embed = embed or default_embed
+        self._store = store
+        self._store_lock = threading.Lock()
+        self.llm = llm or OllamaAPI(OLLAMA_URL)
+        self.kg_db = kg_db if kg_db is not None else KnowledgeGraphDB(KG_DB_PATH)
+        self.collection_name = collection_name
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.embed_cache = embed_cache
+        self.vector_mode = vector_mode
+        self.courses = courses or {DEFAULT_COURSE_ID: default_course(collection_name)}
+        self.router = router if router is not None else CourseRouter(self.courses)
+        self._full_vectors: Dict[str, FullVectorStore] = (
+            {collection_name: full_vectors} if full_vectors is not None else {}
+        )
+
+    def connect_store(self, connect: Optional[Callable[[], object]] = None):
+        """
+        返回向量库客户端，尚未连接时用 connect（默认直接连接 MILVUS_ENDPOINT）创建
+
+        创建服务时不连接，Milvus 暂不可用（如晚于页面启动）时服务仍可创建，连接失败在预热任务
+        或查询中报告，下次使用时重新连接。
+        """
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    self._store = (connect or (lambda: get_milvus_client(uri=MILVUS_ENDPOINT, token=MILVUS_TOKEN)))()
+        return self._store
+
+    @property
+    def store(self):
+        return self.connect_store()
+
+    def warm_up(self) -> None:
+        """加载嵌入模型"""
+        self.embed("测试")
+
+    def embed_question(self, question: str) -> List[float]:
+        if self.embed_cache is not None:
+            set_metric("embed_cache_hit", question in self.embed_cache)
+        with span("embed"):
+            return self.embed(question)
+
+    def full_vectors_for(self, collection_name: str) -> Optional[FullVectorStore]:
+        """只缓存已存在的全精度向量，文件缺失时每次重新检查，服务运行期间导入后即可重排"""
+        full_vectors = self._full_vectors.get(collection_name)
+        if full_vectors is None:
+            full_vectors = open_full_vectors(collection_name, self.vector_mode)
+            if full_vectors is not None:
+                self._full_vectors[collection_name] = full_vectors
+        return full_vectors
+
+    def course_list(self) -> List[Dict]:
+        return [course.to_dict() for course in self.courses.values()]
+
+    def route(self, query_vector: List[float], course: Optional[str] = None) -> List[str]:
+        """指定课程时只检索该课程；否则按质心选择，没有质心时检索全部课程"""
+        if course is not None:
+            if course not in self.courses:
+                raise ValueError(f"未知课程: {course}")
+            return [course]
+        if len(self.courses) == 1:
+            return list(self.courses)
+        with span("route"):
+            course_ids = self.router.route(query_vector)
+        set_metric("routed_courses", len(course_ids))
+        return course_ids or list(self.courses)
+
+    def search(self, query_vector: List[float], course_ids: Optional[List[str]] = None) -> List[Dict]:
+        """
+        在所选课程的集合中检索相关文档块，返回 id、course、chunk、text、distance、similarity
+
+        distance 为集合原始的度量值，similarity 为余弦相似度（HAMMING 距离换算为估计值），
+        各课程的集合可能有的已重排、有的没有，合并时按 similarity 排序
+        """
+        if course_ids is None:
+            course_ids = self.route(query_vector)
+        hits = []
+        with span("search"):
+            for course_id in course_ids:
+                collection_name = self.courses[course_id].collection_name
+                full_vectors = self.full_vectors_for(collection_name)
+                # 二值向量未重排时 distance 为汉明距离（越小越相似），其余为余弦相似度
+                hamming = self.vector_mode == "binary" and full_vectors is None
+                results = get_search_results(
+                    self.store, collection_name, query_vector, ["text", "chunk"],
+                    vector_mode=self.vector_mode, full_vectors=full_vectors, limit=SEARCH_LIMIT
+                )
+                hits.extend(
+                    {
+                        "id": res["id"],
+                        "course": course_id,
+                        "chunk": res["entity"].get("chunk"),
+                        "text": res["entity"]["text"],
+                        "distance": res["distance"],
+                        "similarity": (hamming_similarity(res["distance"], len(query_vector)) if hamming
+                                       else res["distance"]),
+                    }
+                    for res in results[0]
+                )
+        if len(course_ids) > 1:
+            hits = sorted(hits, key=lambda hit: hit["similarity"], reverse=True)[:SEARCH_LIMIT]
+        return hits
+
+    def retrieve(self, question: str, course: Optional[str] = None) -> List[Dict]:
+        query_vector = self.embed_question(question)
+        return self.search(query_vector, self.route(query_vector, course))
+
+    async def run_in_executor(self, fn, *args):
+        # 复制当前上下文，线程池中记录的耗时也归入当前请求
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(context.run, fn, *args))
+
+    async def aretrieve(self, question: str, course: Optional[str] = None) -> List[Dict]:
+        query_vector = await self.run_in_executor(self.embed_question, question)
+        return await self.run_in_executor(self.search, query_vector, self.route(query_vector, course))
+
+    @staticmethod
+    def build_context(hits: List[Dict]) -> str:
+        with span("context"):
+            return "\n\n".join([
+                f"相关内容 {i+1}：\n{hit['text']}"
+                for i, hit in enumerate(hits)
+            ])
+
+    def stream_answer(self, question: str, context: str) -> Iterator[str]:
+        """逐段返回回答内容，同时记录首个token耗时、生成耗时和token吞吐"""
+        start = time.perf_counter()
+        first_token_at = None
+        try:
+            for line in stream_llm_answer(self.llm, context, question):
+                try:
+                    response_data = json.loads(line)
+                except ValueError:
+                    continue
+                if "error" in response_data:
+                    raise RuntimeError(f"Ollama 返回错误: {response_data['error']}")
+                if "message" in response_data:
+                    content = response_data["message"]["content"]
+                    if content:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        yield content
+                if response_data.get("done") and response_data.get("eval_duration"):
+                    # Ollama 在最后一条消息中给出生成的token数和耗时（纳秒）
+                    set_metric("eval_count", response_data.get("eval_count", 0))
+                    set_metric("tokens_per_sec", round(
+                        response_data.get("eval_count", 0) / (response_data["eval_duration"] / 1e9), 2
+                    ))
+        finally:
+            trace = current_trace()
+            if trace is not None and first_token_at is not None:
+                trace.add_span("llm_ttft", (first_token_at - start) * 1000)
+                trace.add_span("llm_stream", (time.perf_counter() - first_token_at) * 1000)
+
+    def extract_kg(self, question: str, answer: str, chunk_ids: List) -> Dict:
+        """同一问题基于同一组检索块已抽取过时直接复用，避免再次调用LLM"""
+        with span("kg_extract"):
+            kg_data = self.kg_db.lookup(question, chunk_ids)
+            set_metric("kg_cache_hit", kg_data is not None)
+            if kg_data is None:
+                kg_data = extract_kg_from_text(self.llm, answer)
+                self.kg_db.upsert(kg_data, question, chunk_ids)
+        return kg_data
+
+    def query_events(self, question: str, with_kg: bool = True, request_id: Optional[str] = None,
+                     course: Optional[str] = None) -> Iterator[Tuple[str, object]]:
+        """
+        逐步执行查询并产生事件，供页面和 HTTP 接口流式展示
+
+        与 rag_client.RemoteRAGService 接口一致；本地执行时耗时已记入当前追踪，不使用 request_id。
+        course 为课程ID，未指定时按问题选择课程。
+
+        Yields:
+            ("stage", 阶段名)、("courses", 检索的课程)、("hits", 检索结果)、("token", 回答片段)、
+            ("answer", 完整回答)、("kg", 知识图谱)
+        """
+        yield "stage", "embed"
+        query_vector = self.embed_question(question)
+        yield "stage", "search"
+        course_ids = self.route(query_vector, course)
+        yield "courses", [self.courses[course_id].to_dict() for course_id in course_ids]
+        hits = self.search(query_vector, course_ids)
+        yield "hits", hits
+        yield "stage", "answer"
+        answer = ""
+        for content in self.stream_answer(question, self.build_context(hits)):
+            answer += content
+            yield "token", content
+        yield "answer", answer
+        if with_kg:
+            yield "stage", "kg"
+            yield "kg", self.extract_kg(question, answer, [chunk_ref(hit) for hit in hits])
+
+    def query(self, question: str) -> Dict:
+        """完整执行一次查询（不流式输出），返回检索结果、回答和知识图谱"""
+        result = {}
+        for event, data in self.query_events(question):
+            if event in ("hits", "answer", "kg"):
+                result[event] = data
+        return {"hits": result["hits"], "answer": result["answer"], "kg_data": result["kg"]}
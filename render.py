@@ -0,0 +1,68 @@
+"""
+检索结果与知识点正文的渲染
+
+正文在首次展示时被切分为类型化的渲染片段：
+    {"type": "text", "text": ...}
+    {"type": "image", "path": "images/xxx.jpg", "caption": ...}
+片段按文本内容缓存在进程内，所有会话共享；片段可由文本还原，不随文档块存入 Milvus，
+避免每个文档块的正文在库中和检索结果中存两份。
+"""
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Sequence, Tuple
+
+import streamlit as st
+
+from image_cache import MANIFEST_PATH, ImageCache
+
+IMAGE_PATTERN = re.compile(r'!\[(.*?)\]\((images/.*?)\)')
+
+def split_segments(text: str) -> Tuple[Dict, ...]:
+    """把 markdown 文本切分为文本片段和图片片段，空白文本片段不保留"""
+    segments = []
+    position = 0
+    for match in IMAGE_PATTERN.finditer(text):
+        if text[position:match.start()].strip():
+            segments.append({"type": "text", "text": text[position:match.start()]})
+        segments.append({"type": "image", "path": match.group(2), "caption": match.group(1)})
+        position = match.end()
+    if text[position:].strip():
+        segments.append({"type": "text", "text": text[position:]})
+    return tuple(segments)
+
+@lru_cache(maxsize=4096)
+def cached_segments(text: str) -> Tuple[Dict, ...]:
+    return split_segments(text)
+
+# 图片缩略图缓存，按 manifest 修改时间缓存，重新生成派生文件后自动重建
+@st.cache_resource(max_entries=1)
+def load_image_cache(mtime: float) -> ImageCache:
+    return ImageCache(MANIFEST_PATH)
+
+def render_image(image_cache: ImageCache, image_path: str, caption: str) -> None:
+    """以缩略图展示图片，原图点击链接后加载"""
+    thumbnail = image_cache.thumbnail(image_path)
+    if thumbnail is not None:
+        data, entry = thumbnail
+        st.image(data, caption=caption)
+        st.markdown(
+            f'<a href="{image_cache.full_url(image_path)}" target="_blank">'
+            f'查看原图（{entry["width"]}×{entry["height"]}）</a>',
+            unsafe_allow_html=True
+        )
+    elif os.path.exists(image_path):
+        # 未生成派生文件的图片仍按原图显示
+        st.image(image_path, caption=caption)
+
+def render_segments(segments: Sequence[Dict]) -> None:
+    image_cache = load_image_cache(os.path.getmtime(MANIFEST_PATH) if os.path.exists(MANIFEST_PATH) else 0)
+    for segment in segments:
+        if segment["type"] == "text":
+            st.markdown(segment["text"])
+        else:
+            render_image(image_cache, segment["path"], segment["caption"])
+
+def display_content_with_images(text: str) -> None:
+    """显示包含图片的文本内容，渲染片段按文本解析并缓存"""
+    render_segments(cached_segments(text))
@@ -0,0 +1,234 @@
+"""
+向量索引快照
+
+把集合中的文档块（文本、文档块序号等字段）、全精度向量和嵌入模型信息导出为一个 zip 文件:
+    manifest.json   版本、集合、模型名称与版本、向量维度、文档块数量、语料哈希
+    chunks.jsonl    每行一个文档块的字段（不含 id 和向量）
+    vectors.npy     float32 向量，行号与 chunks.jsonl 对应
+
+新节点导入快照时直接批量写入 Milvus（或 Milvus Lite 本地文件），不需要重新分块和向量化，
+也不需要加载嵌入模型。快照中的模型与当前配置（EMBEDDING_MODEL）不一致时拒绝导入，
+否则查询向量与库中向量不在同一空间。
+
+用法:
+    python snapshot.py export [--output snapshots/xxx.zip]
+    python snapshot.py import snapshots/xxx.zip [--uri ./milvus.db] [--force]
+    多课程时用 --course 课程ID 选择集合（见 courses.py）
+"""
+import argparse
+import io
+import json
+import os
+import time
+import zipfile
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from compact_vectors import FullVectorStore, encode_vector, full_vectors_path, normalize
+from courses import load_courses, save_centroid
+from encoder import EMBEDDING_MODEL, EMBEDDING_MODEL_REVISION
+from kg_build import DEFAULT_CONTENT_PATH, PROJECT_DIR, file_sha256
+from milvus_utils import create_collection, get_milvus_client
+
+load_dotenv()
+COLLECTION_NAME = os.getenv("COLLECTION_NAME")
+MILVUS_ENDPOINT = os.getenv("MILVUS_ENDPOINT")
+MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
+VECTOR_MODE = os.getenv("VECTOR_MODE", "float")
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DIR = os.path.join(PROJECT_DIR, "snapshots")
+BATCH_SIZE = 1000
+
+def write_snapshot(path: str, chunks: List[Dict], vectors, collection_name: str,
+                   corpus_path: Optional[str] = DEFAULT_CONTENT_PATH) -> Dict:
+    """写入快照文件，返回 manifest"""
+    vectors = normalize(vectors)
+    if len(chunks) != len(vectors):
+        raise ValueError(f"文档块数量 {len(chunks)} 与向量数量 {len(vectors)} 不一致")
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "collection": collection_name,
+        "model": EMBEDDING_MODEL,
+        "model_revision": EMBEDDING_MODEL_REVISION,
+        "dim": int(vectors.shape[1]),
+        "count": len(chunks),
+        "corpus_sha256": file_sha256(corpus_path) if corpus_path and os.path.exists(corpus_path) else None,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with zipfile.ZipFile(tmp_path, "w") as zf:
+        zf.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+        zf.writestr(
+            "chunks.jsonl",
+            "".join(json.dumps(chunk, ensure_ascii=False) + "\n" for chunk in chunks),
+            compress_type=zipfile.ZIP_DEFLATED,
+        )
+        # 向量几乎无法压缩，直接存储，读取时省去解压
+        buffer = io.BytesIO()
+        np.save(buffer, vectors)
+        zf.writestr("vectors.npy", buffer.getvalue(), compress_type=zipfile.ZIP_STORED)
+    os.replace(tmp_path, path)
+    return manifest
+
+def read_manifest(path: str) -> Dict:
+    with zipfile.ZipFile(path) as zf:
+        return json.loads(zf.read("manifest.json"))
+
+def read_snapshot(path: str) -> Tuple[Dict, List[Dict], np.ndarray]:
+    with zipfile.ZipFile(path) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        if manifest["version"] > SNAPSHOT_VERSION:
+            raise ValueError(f"快照版本 {manifest['version']} 高于当前支持的版本 {SNAPSHOT_VERSION}")
+        chunks = [json.loads(line) for line in zf.read("chunks.jsonl").decode("utf-8").splitlines() if line]
+        with zf.open("vectors.npy") as f:
+            vectors = np.load(f)
+    if len(chunks) != len(vectors) or len(chunks) != manifest["count"]:
+        raise ValueError("快照中文档块数量与向量数量不一致")
+    return manifest, chunks, vectors
+
+def iter_snapshot(path: str, batch_size: int = BATCH_SIZE) -> Iterator[Tuple[List[Dict], np.ndarray]]:
+    """按批读取文档块和向量，导入大快照时内存占用与批大小相关而不是与快照大小相关"""
+    with zipfile.ZipFile(path) as zf:
+        with zf.open("chunks.jsonl") as chunk_file, zf.open("vectors.npy") as vector_file:
+            lines = io.TextIOWrapper(chunk_file, encoding="utf-8")
+            if np.lib.format.read_magic(vector_file) == (1, 0):
+                shape, _, dtype = np.lib.format.read_array_header_1_0(vector_file)
+            else:
+                shape, _, dtype = np.lib.format.read_array_header_2_0(vector_file)
+            dim = shape[1]
+            for start in range(0, shape[0], batch_size):
+                count = min(batch_size, shape[0] - start)
+                chunks = [json.loads(lines.readline()) for _ in range(count)]
+                vectors = np.frombuffer(vector_file.read(count * dim * dtype.itemsize), dtype=dtype)
+                yield chunks, vectors.reshape(count, dim)
+
+def check_model(manifest: Dict) -> None:
+    """快照的嵌入模型必须与当前查询使用的模型相同"""
+    if manifest["model"] != EMBEDDING_MODEL:
+        raise ValueError(f"快照使用的模型为 {manifest['model']}，当前配置为 {EMBEDDING_MODEL}")
+    if manifest["model_revision"] and EMBEDDING_MODEL_REVISION \
+            and manifest["model_revision"] != EMBEDDING_MODEL_REVISION:
+        raise ValueError(
+            f"快照使用的模型版本为 {manifest['model_revision']}，当前配置为 {EMBEDDING_MODEL_REVISION}"
+        )
+
+def export_collection(milvus_client, collection_name: str, path: str,
+                      vector_mode: str = VECTOR_MODE, corpus_path: Optional[str] = DEFAULT_CONTENT_PATH) -> Dict:
+    """导出集合；紧凑模式下库中只有量化向量，从磁盘上的全精度向量按 row 取回"""
+    full_vectors = None
+    if vector_mode != "float":
+        full_vectors = FullVectorStore(full_vectors_path(collection_name))
+        if not full_vectors.exists():
+            raise FileNotFoundError(f"找不到全精度向量 {full_vectors.path}，无法导出紧凑模式的集合")
+    chunks, vectors = [], []
+    milvus_client.load_collection(collection_name)
+    iterator = milvus_client.query_iterator(
+        collection_name=collection_name, batch_size=BATCH_SIZE, output_fields=["*"]
+    )
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            for entity in batch:
+                entity = dict(entity)
+                entity.pop("id", None)
+                vector = entity.pop("vector")
+                if full_vectors is not None:
+                    vector = full_vectors.vectors()[entity.pop("row")]
+                chunks.append(entity)
+                vectors.append(np.asarray(vector, dtype=np.float32))
+    finally:
+        iterator.close()
+    if not chunks:
+        raise ValueError(f"集合 {collection_name} 为空")
+    return write_snapshot(path, chunks, np.stack(vectors), collection_name, corpus_path)
+
+def import_snapshot(milvus_client, path: str, collection_name: Optional[str] = None,
+                    vector_mode: str = VECTOR_MODE, force: bool = False) -> Dict:
+    """
+    导入快照，重建集合并批量写入
+
+    Args:
+        collection_name: 目标集合，默认使用快照中的集合名称
+        force: 嵌入模型不一致时仍然导入
+    """
+    manifest = read_manifest(path)
+    if manifest["version"] > SNAPSHOT_VERSION:
+        raise ValueError(f"快照版本 {manifest['version']} 高于当前支持的版本 {SNAPSHOT_VERSION}")
+    if not force:
+        check_model(manifest)
+    collection_name = collection_name or manifest["collection"]
+    create_collection(milvus_client, collection_name, manifest["dim"], vector_mode=vector_mode)
+
+    full_vectors = []
+    vector_sum = np.zeros(manifest["dim"], dtype=np.float64)
+    row = 0
+    for chunks, vectors in iter_snapshot(path):
+        vector_sum += vectors.sum(axis=0)
+        batch = []
+        for entity, vector in zip(chunks, vectors):
+            if vector_mode == "float":
+                entity["vector"] = vector.tolist()
+            else:
+                entity["vector"] = encode_vector(vector, vector_mode)
+                entity["row"] = row
+            batch.append(entity)
+            row += 1
+        milvus_client.insert(collection_name=collection_name, data=batch)
+        if vector_mode != "float":
+            full_vectors.append(vectors)
+    if row != manifest["count"]:
+        raise ValueError(f"快照中只有 {row} 个文档块，manifest 记录为 {manifest['count']}")
+    if full_vectors:
+        FullVectorStore.write(full_vectors_path(collection_name), np.concatenate(full_vectors))
+    if row:
+        # 快照中的向量已归一化，均值即课程质心（见 courses.py）
+        save_centroid(collection_name, vector_sum / row, row)
+    milvus_client.load_collection(collection_name)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="向量索引快照导出/导入")
+    parser.add_argument("--uri", default=MILVUS_ENDPOINT, help="Milvus 地址，或 Milvus Lite 本地文件")
+    parser.add_argument("--collection", help="默认为 COLLECTION_NAME")
+    parser.add_argument("--course", help="按课程ID选择集合（见 courses.py）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("--output")
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--force", action="store_true", help="嵌入模型不一致时仍然导入")
+    args = parser.parse_args()
+
+    corpus_path = DEFAULT_CONTENT_PATH
+    if args.course:
+        courses = load_courses()
+        if args.course not in courses:
+            raise SystemExit(f"未知课程: {args.course}")
+        args.collection = args.collection or courses[args.course].collection_name
+        corpus_path = courses[args.course].content_path
+    else:
+        args.collection = args.collection or COLLECTION_NAME
+
+    milvus_client = get_milvus_client(uri=args.uri, token=MILVUS_TOKEN)
+    start = time.perf_counter()
+    if args.command == "export":
+        output = args.output or os.path.join(
+            SNAPSHOT_DIR, f"{args.collection}-{datetime.now():%Y%m%d-%H%M%S}.zip"
+        )
+        manifest = export_collection(milvus_client, args.collection, output, corpus_path=corpus_path)
+        print(f"已导出 {manifest['count']} 个文档块到 {output}（{os.path.getsize(output) / 2**20:.1f} MB）")
+    else:
+        manifest = import_snapshot(milvus_client, args.path, args.collection, force=args.force)
+        print(f"已导入 {manifest['count']} 个文档块到集合 {args.collection or manifest['collection']}"
+              f"（模型 {manifest['model']}，创建于 {manifest['created_at']}）")
+    print(f"耗时 {time.perf_counter() - start:.1f} s")
+
+if __name__ == "__main__":
+    main()
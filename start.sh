@@ -2,11 +2,18 @@
 # 启动 Docker 服务
 docker-compose up -d
 
-# 等待 Milvus 完全启动
-sleep 30
+# 等待 Milvus 可以连接（不再固定等待 30 秒）
+python warmup.py --wait-milvus
 
-# 初始化数据库
+# 初始化数据库（每门课程一个集合，见 courses.py）
 python insert.py
 
-# 启动 Streamlit 应用
-streamlit run app.py --server.port 8501 --server.address 0.0.0.0 
\ No newline at end of file
+# 课程内容变化时重新构建各课程的知识图谱（含布局）和正文偏移索引，避免首次访问页面时构建
+python courses.py build
+python image_cache.py
+
+# 并行预热：加载集合并检索、预加载 Ollama 模型、构建课程图谱，全部就绪后再启动应用
+python warmup.py || echo "部分预热任务未完成，详见 python warmup.py --status"
+
+# 启动 Streamlit 应用，首个会话在页面进程内预热嵌入模型（状态见 python warmup.py --status）
+streamlit run home.py --server.port 8501 --server.address 0.0.0.0
@@ -0,0 +1,49 @@
+import os
+
+from PIL import Image
+
+from image_cache import ImageCache, build_manifest
+
+def make_image(path, color, size=(640, 320)):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new("RGB", size, color).save(path)
+
+def build(project, image_dir):
+    return build_manifest(
+        os.path.join(project, image_dir),
+        derived_dir=os.path.join(project, "static", "images"),
+        manifest_path=os.path.join(project, ".cache", "images.manifest.json"),
+        workers=1,
+        root=str(project),
+    )
+
+def derived_files(project):
+    return set(os.listdir(os.path.join(project, "static", "images")))
+
+def test_subdirectory_images_get_thumbnails(tmp_path):
+    make_image(os.path.join(tmp_path, "images", "a.png"), "red")
+    make_image(os.path.join(tmp_path, "images", "course1", "b.png"), "blue")
+
+    manifest = build(tmp_path, "images")
+    assert set(manifest) == {"images/a.png", "images/course1/b.png"}
+
+    cache = ImageCache(os.path.join(tmp_path, ".cache", "images.manifest.json"),
+                       os.path.join(tmp_path, "static", "images"))
+    data, entry = cache.thumbnail("images/course1/b.png")
+    assert data and entry["thumb"]["width"] == 480
+
+def test_building_one_subdirectory_keeps_other_entries(tmp_path):
+    make_image(os.path.join(tmp_path, "images", "a.png"), "red")
+    make_image(os.path.join(tmp_path, "images", "course1", "b.png"), "blue")
+    build(tmp_path, "images")
+    before = derived_files(tmp_path)
+
+    os.remove(os.path.join(tmp_path, "images", "course1", "b.png"))
+    make_image(os.path.join(tmp_path, "images", "course1", "c.png"), "green")
+    manifest = build(tmp_path, os.path.join("images", "course1"))
+
+    assert set(manifest) == {"images/a.png", "images/course1/c.png"}
+    a_files = {manifest["images/a.png"][variant]["file"] for variant in ("thumb", "full")}
+    assert a_files <= derived_files(tmp_path)
+    # 被删除图片的派生文件已清理
+    assert len(before - derived_files(tmp_path)) == 2
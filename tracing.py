@@ -0,0 +1,346 @@
+"""
+查询请求的分阶段耗时追踪
+
+每个查询对应一条 Trace，记录各阶段耗时（向量化、检索、上下文构建、首个token、
+流式生成、知识图谱抽取、渲染）以及 token 吞吐、抽取重试次数等指标，请求结束时
+以 JSON 行追加写入 RAG_TRACE_PATH（默认 rag_requests.jsonl）。
+
+当前请求通过 contextvars 传递，调用方只需 `with span("embed"): ...`。
+RAG_TRACE=0 时 start_trace 返回 None，span 等函数直接返回，几乎没有额外开销。
+
+用法: python tracing.py [--path rag_requests.jsonl] [--last 1000]
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+TRACE_ENABLED = os.getenv("RAG_TRACE", "1") not in ("0", "false", "False")
+TRACE_PATH = os.getenv("RAG_TRACE_PATH", "rag_requests.jsonl")
+# 是否在记录中保存问题原文（供 loadtest.py 回放），默认只记录长度
+TRACE_QUESTIONS = os.getenv("RAG_TRACE_QUESTIONS", "0") == "1"
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("rag_trace", default=None)
+_write_lock = threading.Lock()
+_NULL_SPAN = nullcontext()
+
+class Trace:
+    def __init__(self, request_id: Optional[str] = None, **attrs):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.ts = time.time()
+        self.started = time.perf_counter()
+        self.attrs = attrs
+        self.spans: Dict[str, float] = {}
+        self.metrics: Dict[str, float] = {}
+        self.finished = False
+
+    def add_span(self, name: str, elapsed_ms: float) -> None:
+        # 同名阶段多次出现时累加
+        self.spans[name] = self.spans.get(name, 0.0) + elapsed_ms
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, (time.perf_counter() - start) * 1000)
+
+    def to_record(self, status: str, error: Optional[str]) -> Dict:
+        record = {
+            "request_id": self.request_id,
+            "ts": round(self.ts, 3),
+            "status": status,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "spans": {name: round(ms, 3) for name, ms in self.spans.items()},
+            "metrics": self.metrics,
+        }
+        record.update(self.attrs)
+        if error:
+            record["error"] = error
+        return record
+
+def start_trace(request_id: Optional[str] = None, **attrs) -> Optional[Trace]:
+    """开始追踪一个请求并设为当前请求，追踪关闭时返回 None；request_id 用于关联客户端与服务端的记录"""
+    if not TRACE_ENABLED:
+        return None
+    trace = Trace(request_id, **attrs)
+    _current.set(trace)
+    return trace
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+def span(name: str):
+    trace = _current.get()
+    return trace.span(name) if trace is not None else _NULL_SPAN
+
+def add_span(name: str, elapsed_ms: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.add_span(name, elapsed_ms)
+
+def set_metric(name: str, value) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.metrics[name] = value
+
+def set_max(name: str, value: float) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.metrics[name] = max(trace.metrics.get(name, value), value)
+
+def incr(name: str, amount: int = 1) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.metrics[name] = trace.metrics.get(name, 0) + amount
+
+def finish_trace(trace: Optional[Trace], status: str = "ok", error: Optional[str] = None,
+                 path: str = TRACE_PATH) -> None:
+    """写出请求记录并清除当前请求"""
+    if trace is None or trace.finished:
+        return
+    trace.finished = True
+    line = json.dumps(trace.to_record(status, error), ensure_ascii=False) + "\n"
+    with _write_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    if _current.get() is trace:
+        _current.set(None)
+
+def iter_records(path: str = TRACE_PATH) -> Iterator[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩法百分位数，sorted_values 需已排序"""
+    index = max(0, min(len(sorted_values) - 1, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(records: List[Dict]) -> Dict[str, Dict[str, float]]:
+    """按阶段汇总 count/p50/p95/p99，包括总耗时和数值指标"""
+    values: Dict[str, List[float]] = {}
+    for record in records:
+        values.setdefault("total", []).append(record["total_ms"])
+        for name, ms in record["spans"].items():
+            values.setdefault(name, []).append(ms)
+        for name, value in record.get("metrics", {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values.setdefault(name, []).append(value)
+    summary = {}
+    for name, items in values.items():
+        items.sort()
+        summary[name] = {
+            "count": len(items),
+            "p50": percentile(items, 50),
+            "p95": percentile(items, 95),
+            "p99": percentile(items, 99),
+        }
+    return summary
+
+# 直方图桶按 2% 的相对宽度划分，百分位数的相对误差不超过约 1%
+HISTOGRAM_GROWTH = math.log(1.02)
+
+class Histogram:
+    """对数分桶直方图，内存与样本数无关"""
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+
+    def add(self, value: float) -> None:
+        key = int(math.floor(math.log(max(value, 1e-3)) / HISTOGRAM_GROWTH))
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+
+    def merge(self, other: "Histogram") -> None:
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.count += other.count
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(p / 100 * self.count))
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen >= rank:
+                # 取桶的几何中点
+                return math.exp((key + 0.5) * HISTOGRAM_GROWTH)
+        return None
+
+class MinuteBucket:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.histograms: Dict[str, Histogram] = {}
+        # 计数类指标：数值求和；缓存命中类指标：[命中数, 总数]
+        self.counters: Dict[str, float] = {}
+        self.hits: Dict[str, List[int]] = {}
+        self.gauges: Dict[str, float] = {}
+
+class TraceAggregator:
+    """
+    增量读取追踪记录文件，按分钟聚合
+
+    每次 poll 只从上次读到的字节偏移继续读取新增的完整行；文件被截断或替换时从头读取。
+    首次打开大文件时只读取最后 initial_bytes 字节，超过 retention_minutes 的分钟桶会被丢弃。
+    """
+
+    COUNTER_METRICS = ("kg_retries", "kg_failures")
+    GAUGE_METRICS = ("ollama_in_flight",)
+
+    def __init__(self, path: str = TRACE_PATH, retention_minutes: int = 24 * 60,
+                 initial_bytes: int = 64 * 1024 * 1024):
+        self.path = path
+        self.retention_minutes = retention_minutes
+        self.initial_bytes = initial_bytes
+        self.offset = 0
+        self.inode = None
+        self.minutes: Dict[int, MinuteBucket] = {}
+        self.lines_read = 0
+        self._lock = threading.Lock()
+
+    def poll(self, chunk_size: int = 8 * 1024 * 1024) -> int:
+        """读取新增记录，返回本次读取的行数"""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                return 0
+            reset = self.inode != stat.st_ino or stat.st_size < self.offset
+            if reset:
+                self.inode = stat.st_ino
+                self.minutes.clear()
+                self.offset = max(0, stat.st_size - self.initial_bytes)
+            if stat.st_size == self.offset:
+                return 0
+
+            count = 0
+            with open(self.path, "rb") as f:
+                if reset and self.offset:
+                    # 从文件中间开始时，前一个字节不是换行符说明第一行不完整，丢弃
+                    f.seek(self.offset - 1)
+                    if f.read(1) != b"\n":
+                        self.offset += len(f.readline())
+                f.seek(self.offset)
+                # 只处理完整的行，末尾未写完的行留到下次
+                while self.offset < stat.st_size:
+                    data = f.read(min(chunk_size, stat.st_size - self.offset))
+                    end = data.rfind(b"\n") + 1
+                    if end == 0:
+                        break
+                    for line in data[:end].splitlines():
+                        try:
+                            self._add(json.loads(line))
+                        except (ValueError, KeyError, TypeError):
+                            continue
+                        count += 1
+                    self.offset += end
+                    f.seek(self.offset)
+            self.lines_read += count
+            self._expire()
+            return count
+
+    def _add(self, record: Dict) -> None:
+        bucket = self.minutes.setdefault(int(record["ts"] // 60), MinuteBucket())
+        bucket.requests += 1
+        if record["status"] != "ok":
+            bucket.errors += 1
+        bucket.histograms.setdefault("total", Histogram()).add(record["total_ms"])
+        for name, ms in record["spans"].items():
+            bucket.histograms.setdefault(name, Histogram()).add(ms)
+        for name, value in record.get("metrics", {}).items():
+            if name.endswith("_cache_hit"):
+                hit = bucket.hits.setdefault(name[:-len("_cache_hit")], [0, 0])
+                hit[0] += bool(value)
+                hit[1] += 1
+            elif name in self.COUNTER_METRICS:
+                bucket.counters[name] = bucket.counters.get(name, 0) + value
+            elif name in self.GAUGE_METRICS:
+                bucket.gauges[name] = max(bucket.gauges.get(name, 0), value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                bucket.histograms.setdefault(name, Histogram()).add(value)
+
+    def _expire(self) -> None:
+        if not self.minutes:
+            return
+        cutoff = max(self.minutes) - self.retention_minutes
+        for minute in [m for m in self.minutes if m < cutoff]:
+            del self.minutes[minute]
+
+    def _window(self, minutes: int) -> List[Tuple[int, MinuteBucket]]:
+        cutoff = int(time.time() // 60) - minutes
+        return sorted(((m, b) for m, b in self.minutes.items() if m > cutoff), key=lambda item: item[0])
+
+    def series(self, minutes: int, p: float) -> List[Tuple[int, Dict[str, float]]]:
+        """最近 minutes 分钟内每分钟各阶段/指标的第 p 百分位数"""
+        with self._lock:
+            return [
+                (minute, {name: h.percentile(p) for name, h in bucket.histograms.items()})
+                for minute, bucket in self._window(minutes)
+            ]
+
+    def rates(self, minutes: int) -> List[Tuple[int, Dict[str, float]]]:
+        """每分钟的请求数、失败率、抽取重试/失败次数、缓存命中率和 Ollama 并发数"""
+        with self._lock:
+            rows = []
+            for minute, bucket in self._window(minutes):
+                row = {"requests": bucket.requests, "error_rate": bucket.errors / bucket.requests}
+                row.update(bucket.counters)
+                row.update(bucket.gauges)
+                for name, (hits, total) in bucket.hits.items():
+                    row[f"{name}_hit_rate"] = hits / total
+                rows.append((minute, row))
+            return rows
+
+    def totals(self, minutes: int) -> MinuteBucket:
+        """最近 minutes 分钟合并后的统计"""
+        merged = MinuteBucket()
+        with self._lock:
+            for _, bucket in self._window(minutes):
+                merged.requests += bucket.requests
+                merged.errors += bucket.errors
+                for name, histogram in bucket.histograms.items():
+                    merged.histograms.setdefault(name, Histogram()).merge(histogram)
+                for name, value in bucket.counters.items():
+                    merged.counters[name] = merged.counters.get(name, 0) + value
+                for name, (hits, total) in bucket.hits.items():
+                    hit = merged.hits.setdefault(name, [0, 0])
+                    hit[0] += hits
+                    hit[1] += total
+                for name, value in bucket.gauges.items():
+                    merged.gauges[name] = max(merged.gauges.get(name, 0), value)
+        return merged
+
+def main():
+    parser = argparse.ArgumentParser(description="按阶段汇总请求耗时的 p50/p95/p99")
+    parser.add_argument("--path", default=TRACE_PATH, help="追踪记录文件")
+    parser.add_argument("--last", type=int, default=0, help="只统计最近N条请求，0为全部")
+    args = parser.parse_args()
+
+    records = list(deque(iter_records(args.path), maxlen=args.last or None))
+    errors = sum(1 for record in records if record["status"] != "ok")
+    print(f"请求数: {len(records)}，失败: {errors}")
+    print(f"{'阶段/指标':<22} {'count':>7} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for name, stats in summarize(records).items():
+        print(f"{name:<24} {stats['count']:>7} {stats['p50']:>10.1f} "
+              f"{stats['p95']:>10.1f} {stats['p99']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+启动预热
+
+并行执行各项预热任务，记录每项的状态和耗时，并写入就绪状态文件（RAG_READINESS_PATH），
+页面和 start.sh 据此等待服务就绪：
+    milvus   等待 Milvus 可连接并加载各课程的集合（见 courses.py）
+    search   集合加载后执行若干次检索，使索引进入内存
+    ollama   按 OLLAMA_KEEP_ALIVE 预加载模型（见 ask_llm.py）
+    graph    各课程知识图谱过期时重新构建，并构建初始图视图（见 course_graph.py）
+页面进程另外预热嵌入模型和 pyvis 模板（见 home.py），api_server.py 通过 /ready 提供状态。
+
+用法:
+    python warmup.py [--timeout 300]   预热以上各项，全部就绪后退出（失败或超时返回 1）
+    python warmup.py --wait-milvus     只等待 Milvus 可连接（导入数据之前）
+    python warmup.py --status          显示最近一次预热的状态
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+import kg_build
+from compact_vectors import FullVectorStore, normalize, open_full_vectors
+from courses import load_courses
+from kg_layout import write_json_atomic
+from milvus_utils import get_milvus_client, get_search_results
+
+load_dotenv()
+MILVUS_ENDPOINT = os.getenv("MILVUS_ENDPOINT")
+MILVUS_TOKEN = os.getenv("MILVUS_TOKEN")
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+VECTOR_MODE = os.getenv("VECTOR_MODE", "float")
+READINESS_PATH = os.getenv(
+    "RAG_READINESS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "readiness.json")
+)
+WARM_UP_TIMEOUT = float(os.getenv("WARM_UP_TIMEOUT", "300"))
+SEARCH_ROUNDS = 8
+
+# 任务之间的依赖：检索需要集合已加载
+DEPENDS = {"search": ["milvus"]}
+
+class WarmUp:
+    """在后台线程中并行执行预热任务，任务返回的字符串作为状态说明"""
+
+    def __init__(
+        self,
+        tasks: Dict[str, Callable[[], Optional[str]]],
+        depends: Optional[Dict[str, List[str]]] = None,
+        status_path: Optional[str] = READINESS_PATH,
+        source: str = "cli"
+    ):
+        self.tasks = tasks
+        self.depends = {name: deps for name, deps in (depends or DEPENDS).items() if name in tasks}
+        self.status_path = status_path
+        self.source = source
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self._tasks: Dict[str, Dict] = {name: {"state": "pending"} for name in tasks}
+        self._finished = {name: threading.Event() for name in tasks}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(self) -> "WarmUp":
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self._write_status()
+        executor = ThreadPoolExecutor(max_workers=max(len(self.tasks), 1), thread_name_prefix="warmup")
+        futures = [executor.submit(self._run, name) for name in self.tasks]
+        executor.shutdown(wait=False)
+        threading.Thread(target=self._finish, args=(futures,), daemon=True).start()
+        return self
+
+    def _finish(self, futures: List[Future]) -> None:
+        for future in futures:
+            future.exception()
+        self.finished_at = datetime.now().isoformat(timespec="seconds")
+        self._write_status()
+        self._done.set()
+
+    def _update(self, name: str, **fields) -> None:
+        with self._lock:
+            self._tasks[name] = fields
+        self._write_status()
+
+    def _run(self, name: str) -> None:
+        try:
+            self._run_task(name)
+        finally:
+            self._finished[name].set()
+
+    def _run_task(self, name: str) -> None:
+        for dependency in self.depends.get(name, ()):
+            # 线程数与任务数相同，等待依赖的任务不会占满线程池
+            self._finished[dependency].wait()
+            if self._tasks[dependency]["state"] != "ok":
+                self._update(name, state="error", error=f"{dependency} 未就绪")
+                return
+        self._update(name, state="running")
+        start = time.perf_counter()
+        try:
+            detail = self.tasks[name]()
+        except Exception as e:
+            logging.error(f"预热任务 {name} 失败: {e}")
+            self._update(name, state="error", ms=round((time.perf_counter() - start) * 1000), error=str(e))
+        else:
+            self._update(name, state="ok", ms=round((time.perf_counter() - start) * 1000), detail=detail)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return all(task["state"] == "ok" for task in self._tasks.values())
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待全部任务结束，返回是否全部成功"""
+        self._done.wait(timeout)
+        return self.ready
+
+    def failed(self) -> Dict[str, str]:
+        with self._lock:
+            return {name: task["error"] for name, task in self._tasks.items() if task["state"] == "error"}
+
+    def status(self) -> Dict:
+        with self._lock:
+            tasks = {name: dict(task) for name, task in self._tasks.items()}
+        return {
+            "ready": all(task["state"] == "ok" for task in tasks.values()),
+            "done": self.finished_at is not None,
+            "source": self.source,
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "tasks": tasks,
+        }
+
+    def _write_status(self) -> None:
+        if not self.status_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.status_path)), exist_ok=True)
+            write_json_atomic(self.status_path, self.status())
+        except OSError as e:
+            logging.warning(f"写入就绪状态失败: {e}")
+
+def read_status(path: str = READINESS_PATH) -> Optional[Dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def wait_for_milvus(uri: str = MILVUS_ENDPOINT, token: Optional[str] = MILVUS_TOKEN,
+                    timeout: float = WARM_UP_TIMEOUT, interval: float = 2):
+    """Milvus 刚启动时连接会失败，重试直到可以列出集合"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            client = get_milvus_client(uri=uri, token=token)
+            client.list_collections()
+            return client
+        except Exception as e:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"{timeout:.0f} 秒内无法连接 Milvus（{uri}）: {e}")
+            time.sleep(interval)
+
+def warm_milvus(client, collection_names: List[str]) -> str:
+    row_count = 0
+    for collection_name in collection_names:
+        if not client.has_collection(collection_name):
+            raise RuntimeError(f"集合 {collection_name} 不存在，请先运行 insert.py")
+        client.load_collection(collection_name)
+        row_count += int(client.get_collection_stats(collection_name).get("row_count", 0))
+    return f"{len(collection_names)} 个集合已加载，{row_count} 个文档块"
+
+def warm_search(client, collections: Dict[str, Optional[FullVectorStore]], vector_mode: str = VECTOR_MODE,
+                rounds: int = SEARCH_ROUNDS) -> str:
+    """
+    用随机向量在每个集合中检索若干次，使索引和重排用的全精度向量进入内存
+
+    Args:
+        collections: 集合名称到其全精度向量（非紧凑模式为 None）的映射
+    """
+    rng = np.random.default_rng()
+    start = time.perf_counter()
+    for collection_name, full_vectors in collections.items():
+        fields = client.describe_collection(collection_name)["fields"]
+        dim = next(field["params"]["dim"] for field in fields if field["name"] == "vector")
+        for _ in range(rounds):
+            query_vector = normalize(rng.standard_normal(dim))[0].tolist()
+            get_search_results(client, collection_name, query_vector, ["text"],
+                               vector_mode=vector_mode, full_vectors=full_vectors)
+    searches = rounds * len(collections)
+    return f"平均检索 {(time.perf_counter() - start) * 1000 / max(searches, 1):.1f} ms"
+
+def warm_ollama(llm) -> str:
+    result = llm.preload()
+    return f"模型加载 {result.get('load_duration', 0) / 1e6:.0f} ms"
+
+def warm_course_graph() -> str:
+    # 在此导入，api_server.py 等不需要课程图谱的进程不加载前端组件
+    from course_graph import get_course_graph
+    entities = 0
+    courses = load_courses()
+    for course in courses.values():
+        if kg_build.is_stale(course.kg_path, course.index_path, course.content_path):
+            kg_build.build(course.kg_path, course.index_path, course.content_path, title=course.title)
+        course_graph = get_course_graph(course.kg_path)
+        course_graph.initial_view()
+        entities += len(course_graph.kg_data["entities"])
+    return f"{len(courses)} 门课程，{entities} 个节点"
+
+def service_tasks(service) -> Dict[str, Callable[[], Optional[str]]]:
+    """本进程内 RAGService 的预热任务（嵌入模型、集合、检索、Ollama）"""
+    def warm_embedding() -> str:
+        service.warm_up()
+        return "嵌入模型已加载"
+
+    collection_names = [course.collection_name for course in service.courses.values()]
+    return {
+        "embed": warm_embedding,
+        # 服务创建时不连接 Milvus，这里等待其可连接
+        "milvus": lambda: warm_milvus(service.connect_store(wait_for_milvus), collection_names),
+        "search": lambda: warm_search(
+            service.store, {name: service.full_vectors_for(name) for name in collection_names}, service.vector_mode
+        ),
+        "ollama": lambda: warm_ollama(service.llm),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="启动预热")
+    parser.add_argument("--timeout", type=float, default=WARM_UP_TIMEOUT)
+    parser.add_argument("--wait-milvus", action="store_true", help="只等待 Milvus 可连接")
+    parser.add_argument("--status", action="store_true", help="显示最近一次预热的状态")
+    args = parser.parse_args()
+
+    if args.status:
+        status = read_status()
+        print(json.dumps(status, ensure_ascii=False, indent=2) if status else "尚无预热记录")
+        return
+    if args.wait_milvus:
+        start = time.perf_counter()
+        wait_for_milvus(timeout=args.timeout)
+        print(f"Milvus 已就绪（{time.perf_counter() - start:.1f} s）")
+        return
+
+    from ask_llm import OllamaAPI
+    collection_names = [course.collection_name for course in load_courses().values()]
+    warm_up = WarmUp({
+        "milvus": lambda: warm_milvus(wait_for_milvus(timeout=args.timeout), collection_names),
+        "search": lambda: warm_search(
+            get_milvus_client(uri=MILVUS_ENDPOINT, token=MILVUS_TOKEN),
+            {name: open_full_vectors(name, VECTOR_MODE) for name in collection_names}, VECTOR_MODE
+        ),
+        "ollama": lambda: warm_ollama(OllamaAPI(OLLAMA_URL)),
+        "graph": warm_course_graph,
+    }).start()
+    ready = warm_up.wait(args.timeout)
+    for name, task in warm_up.status()["tasks"].items():
+        print(f"{name:>8} {task['state']:>8} {task.get('ms', ''):>8} {task.get('detail') or task.get('error', '')}")
+    if not ready:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()